@@ -7,6 +7,8 @@ Bozorlik ilovasi (Streamlit): Reja → Xarid → Tahlil
 
 Talablar: streamlit, pandas (altair ixtiyoriy)
 Ishga tushirish:  $ streamlit run app_bozorlik.py
+
+Biznes-mantiq `bozorlik.core` da — bu fayl faqat UI.
 """
 
 # --- Streamlit config (must be FIRST) ---
@@ -14,282 +16,439 @@ import streamlit as st
 st.set_page_config(page_title="Bozorlik | Reja → Xarid → Tahlil", page_icon="🛒", layout="wide")
 
 # --- Imports ---
-import io
+import os
+import uuid
+
 import pandas as pd
 
-# Altair optional (charts)
-try:
-    import altair as alt
-    ALTAIR_OK = True
-except Exception:
-    ALTAIR_OK = False
-
-# --- Constants & helpers ---
-DEFAULT_QQS = 12.0  # %
-UNITS_FLOAT = {"kg", "litr"}
-UNITS_INT = {"dona", "karobka"}
-ALL_UNITS = ["kg", "litr", "dona", "karobka", "bog'", "qadoq", "pachka"]
-
-DEFAULT_CATEGORIES = [
-    "Meva-sabzavot",
-    "Quruq oziq-ovqat",
-    "Ichimliklar",
-    "Go'sht mahsulotlari",
-    "Sut mahsulotlari",
-    "Shirinliklar",
-    "Non & bakery",
-    "Uy-ro'zg'or",
-    "Boshqa",
-]
-
-# Tez tanlash uchun bir nechta tayyor mahsulotlar (unit + default category)
-COMMON_ITEMS = {
-    # --- Meva-sabzavotlar ---
-    "piyoz": ("kg", "Meva-sabzavot"),
-    "sabzi (qizil)": ("kg", "Meva-sabzavot"),
-    "sabzi (sariq)": ("kg", "Meva-sabzavot"),
-    "qovoq": ("dona", "Meva-sabzavot"),
-    "baqlajon": ("kg", "Meva-sabzavot"),
-    "kabachki": ("kg", "Meva-sabzavot"),
-    "bolgarskiy (qizil)": ("kg", "Meva-sabzavot"),
-    "bolgarskiy (yashil)": ("kg", "Meva-sabzavot"),
-    "pomidor": ("kg", "Meva-sabzavot"),
-    "zelen (ko'kat)": ("bog'", "Meva-sabzavot"),
-    "chesnok": ("kg", "Meva-sabzavot"),
-    "karam": ("dona", "Meva-sabzavot"),
-    "kartoshka": ("kg", "Meva-sabzavot"),
-
-    # --- Don va quruq oziq-ovqat ---
-    "makaron": ("kg", "Quruq oziq-ovqat"),
-    "guruch (alanga)": ("kg", "Quruq oziq-ovqat"),
-    "grechka": ("kg", "Quruq oziq-ovqat"),
-    "mosh": ("kg", "Quruq oziq-ovqat"),
-    "un (1-sort)": ("kg", "Quruq oziq-ovqat"),
-    "shakar": ("kg", "Quruq oziq-ovqat"),
-    "tuz": ("kg", "Quruq oziq-ovqat"),
-
-    # --- Yog', ichimlik va boshqa mahsulotlar ---
-    "moy (o'simlik)": ("litr", "Ichimliklar"),
-    "kofe": ("qadoq", "Ichimliklar"),
-    "choy": ("pachka", "Ichimliklar"),
-    "suv": ("litr", "Ichimliklar"),
-    "sut": ("karobka", "Sut mahsulotlari"),
-
-    # --- Mevalar ---
-    "olma": ("kg", "Meva-sabzavot"),
-    "nok": ("kg", "Meva-sabzavot"),
-    "anor": ("kg", "Meva-sabzavot"),
-    "mango": ("dona", "Meva-sabzavot"),
-    "xurmo (dates)": ("kg", "Meva-sabzavot"),
-    "uzum": ("kg", "Meva-sabzavot"),
-    "limon": ("kg", "Meva-sabzavot"),
-    "mandarin": ("kg", "Meva-sabzavot"),
-    "banan": ("kg", "Meva-sabzavot"),
-
-    # --- Yeryong‘oq va yong‘oqlar ---
-    "yong'oq (mag'iz)": ("kg", "Quruq oziq-ovqat"),
-    "bodom (mag'iz)": ("kg", "Quruq oziq-ovqat"),
-    "mayiz": ("kg", "Quruq oziq-ovqat"),
-    "yeryong'oq": ("kg", "Quruq oziq-ovqat"),
-
-    # --- Hayvoniy mahsulotlar ---
-    "tuxum": ("dona", "Go'sht mahsulotlari"),
-
-    # --- Qo‘shimcha asosiylar ---
-    "non": ("dona", "Non & bakery"),
-    "shokolad": ("dona", "Shirinliklar"),
-}
-
-
-PLAN_COLS = ["item", "category", "unit", "plan_qty"]
-BUY_COLS = PLAN_COLS + ["bought", "actual_qty", "unit_price_gross", "line_gross", "line_net", "line_vat"]
-
-@st.cache_data(show_spinner=False)
-def example_plan_df():
-    rows = []
-    for name, (unit, cat) in COMMON_ITEMS.items():
-        rows.append({
-            "item": name.title(),
-            "category": cat,
-            "unit": unit,
-            "plan_qty": 1.0 if unit in UNITS_FLOAT else 1,
-        })
-    return pd.DataFrame(rows, columns=PLAN_COLS)
-
-# --- Utils ---
-# Aqlli tahmin: mahsulot nomiga qarab birlik/kategoriya
-UNIT_KEYWORDS = [
-    ("litr", ["suv", "yog'", "yog ", "sirka", "vinegar", "sok", "sharbat"]),
-    ("dona", ["non", "tuxum", "shokolad", "konserva", "qadoq", "pachka", "pachkasi"]),
-    ("karobka", ["sut", "sok karobka", "quti", "qutisi"]),
-    ("kg",   ["go'sht", "gosht", "kolbasa", "guruch", "shakar", "tuz", "piyoz", "kartoshka", "un", "sabzi", "anor", "olma", "uzum", "shaftoli", "banan", "olcha", "bodring", "pamidor", "pomidor"]) 
-]
-
-CATEGORY_KEYWORDS = [
-    ("Ichimliklar", ["suv", "sok", "sharbat", "cola", "choy", "qahva", "kofe"]),
-    ("Non & bakery", ["non", "bulochka", "baget", "pita"]),
-    ("Shirinliklar", ["shokolad", "konfet", "pechenye", "wafer", "vafli"]),
-    ("Sut mahsulotlari", ["sut", "qatiq", "smetana", "tvorog", "pishloq", "sir"]),
-    ("Go'sht mahsulotlari", ["go'sht", "gosht", "mol", "qoy", "tovuq", "kolbasa", "farsh"]),
-    ("Quruq oziq-ovqat", ["guruch", "grechka", "makaron", "shakar", "tuz", "ziravor", "murch", "zira", "qum shakar", "qand"]),
-    ("Meva-sabzavot", ["olma", "anor", "uzum", "shaftoli", "banan", "piyoz", "kartoshka", "sabzi", "bodring", "pomidor", "pamidor", "ko'kat", "kokat"]),
-]
-
-def infer_unit(name: str) -> str:
-    n = (name or "").lower()
-    for unit, keys in UNIT_KEYWORDS:
-        if any(k in n for k in keys):
-            return unit
-    return "kg"
-
-def infer_category(name: str) -> str:
-    n = (name or "").lower()
-    for cat, keys in CATEGORY_KEYWORDS:
-        if any(k in n for k in keys):
-            return cat
-    return "Boshqa"
-
-def parse_bulk_lines(text: str):
-    """
-    Qatorlar misollar:
-      - "Guruch 3 kg Quruq oziq-ovqat"
-      - "Zira; 0.05; kg; Quruq oziq-ovqat"
-      - "Kolbasa, 2, dona" (kategoriya avtomatik)
-      - "Suv | 1.5 | litr | Ichimliklar"
-    Qaytadi: list[dict(item, unit, category, plan_qty)]
-    """
-    import re
-    rows = []
-    if not text:
-        return rows
-    for raw in text.splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        parts = re.split(r"[;,|\t]", line)
-        parts = [p.strip() for p in parts if p.strip()]
-        item, unit, cat, qty = None, None, None, None
-        if len(parts) >= 3:
-            def is_num(x):
-                try:
-                    float(x.replace(",", ".")); return True
-                except Exception:
-                    return False
-            p0, p1, p2 = parts[0], parts[1], parts[2]
-            if is_num(p1):  # item, qty, unit, [cat]
-                item, qty = p0, float(p1.replace(",", "."))
-                unit = p2.lower()
-                cat = parts[3] if len(parts) > 3 else None
-            elif is_num(p2):  # item, unit, qty, [cat]
-                item = p0
-                unit = p1.lower()
-                qty = float(p2.replace(",", "."))
-                cat = parts[3] if len(parts) > 3 else None
-            else:
-                item = p0
-                unit = p1.lower()
-                qty = None
-                cat = p2
-        else:
-            # Erkin gapdan ajratish: "Guruch 3 kg ..." ko‘rinishida
-            tokens = line.split()
-            num_idx = next((i for i, t in enumerate(tokens)
-                            if re.match(r"^\d+[\.,]?\d*$", t)), None)
-            if num_idx is not None and num_idx + 1 < len(tokens):
-                item = " ".join(tokens[:num_idx])
-                qty = float(tokens[num_idx].replace(",", "."))
-                unit = tokens[num_idx + 1].lower()
-                cat = " ".join(tokens[num_idx + 2:]) or None
-            else:
-                item = line
-        item = (item or "").strip()
-        if not item:
-            continue
-        unit = unit or infer_unit(item)
-        cat = cat or infer_category(item)
-        if qty is None:
-            qty = 1.0 if unit in UNITS_FLOAT else 1
-        if unit in UNITS_FLOAT:
-            qty = round(float(qty), 3)
-        else:
-            qty = int(round(float(qty)))
-        rows.append({"item": item.title(), "category": cat, "unit": unit, "plan_qty": qty})
-    return rows
+# pandas 2.x: copy-on-write — .copy() o'rniga dangasa nusxalar (3.0 da doim yoqilgan)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# --- Core (Streamlit'siz biznes-mantiq) ---
+from bozorlik import charts, columnar
+from bozorlik.core import (
+    ALL_UNITS,
+    BUY_COLS,
+    BUY_INPUT_COLS,
+    COMMON_ITEM_NAMES,
+    COMMON_ITEMS,
+    DEFAULT_CATEGORIES,
+    DEFAULT_QQS,
+    PAGE_SIZES,
+    PLAN_COLS,
+    UNITS_FLOAT,
+    apply_buy_schema,
+    apply_plan_schema,
+    bulk_plan_frame,
+    buy_frame_from_plan,
+    buy_totals,
+    category_totals_df,
+    filter_row_ids,
+    fmt_money,
+    frame_hash,
+    infer_category,
+    infer_unit,
+    merge_view_edits,
+    money_totals,
+    next_row_id,
+    page_bounds,
+    price_deviation,
+    recompute_buy_df,
+    summary_df,
+    sync_buy_from_plan,
+    view_frame,
+)
+from bozorlik.editlog import EditLog
+from bozorlik.importer import excel_available, import_plan
+from bozorlik.jobs import DONE, FAILED, QUEUED, RUNNING, ArtifactCache, JobQueue
+from bozorlik.names import NameIndex, canonicalize_items, dedupe_names, merge_plan_duplicates
+from bozorlik.profiling import CAPTURE_MODES, RollingStats, RunProfiler, append_jsonl
+from bozorlik.reports import (
+    ReportCache,
+    columnar_bytes,
+    columnar_report_bytes,
+    csv_bytes,
+    excel_report_bytes,
+    report_key,
+)
+from bozorlik.shared import SharedStore, apply_changes, diff_rows
+from bozorlik.storage import TripStore, price_key
+from bozorlik.templates import BUILTIN_NAME, HISTORY_TRIPS, apply_history, attach, builtin_template, freeze, scale_plan
+
+
+@st.cache_resource(show_spinner=False)
+def plan_template(name: str = BUILTIN_NAME, version: int = 0):
+    """Shablon bir marta quriladi va barcha sessiyalarga umumiy (o'zgarmas; sessiyalar attach() bilan oladi)."""
+    if name == BUILTIN_NAME and version == 0:
+        return freeze(builtin_template())
+    return freeze(store.load_template(name, version))
+
+
+@st.cache_resource(show_spinner=False, max_entries=64, ttl=600)
+def scaled_template(name: str, version: int, factor: float, history: bool):
+    """Miqyoslangan variant: (shablon, koeffitsient, tarix) bo'yicha umumiy; tarix yangilanishi uchun ttl."""
+    tpl = plan_template(name, version)
+    if history and store is not None:
+        return freeze(apply_history(tpl, typical_quantities(), factor))
+    return freeze(scale_plan(tpl, factor))
+
+
+@st.cache_data(show_spinner=False, ttl=600)
+def typical_quantities():
+    return store.typical_quantities(HISTORY_TRIPS)
+
+
+@st.cache_resource(show_spinner=False)
+def report_cache():
+    # Kalit — mazmun xeshi, shuning uchun kesh sessiyalar orasida xavfsiz ulashiladi
+    return ReportCache(max_entries=64, max_bytes=64 * 1024 * 1024)
+
+
+EXPORT_DIR = os.environ.get("BOZORLIK_EXPORT_DIR", "exports")
+EXPORT_POLL_S = 1  # fon eksportlari holatini tekshirish oralig'i (sekund)
+
+
+@st.cache_resource(show_spinner=False)
+def export_queue():
+    # Eksportlar fon oqimlarida quriladi (skript oqimi kutmaydi); tayyorlari diskda, hajmi chegaralangan
+    try:
+        return JobQueue(max_workers=2, cache=ArtifactCache(EXPORT_DIR, max_bytes=256 * 1024 * 1024))
+    except OSError:
+        return None
+
 
-def fmt_money(x: float) -> str:
+@st.cache_resource(show_spinner=False)
+def trip_store():
+    # Bitta jarayon — bitta ulanish (WAL), sessiyalar orasida ulashiladi
     try:
-        return f"{int(round(float(x))):,}".replace(",", " ") + " so'm"
+        return TripStore()
     except Exception:
-        return "—"
+        return None
 
 
-def coerce_qty(val, unit: str):
-    if pd.isna(val) or val == "":
-        return 0
+@st.cache_resource(show_spinner=False)
+def shared_store():
+    # Umumiy ro'yxatlar — shu jarayondagi barcha sessiyalar uchun bitta xizmat
     try:
-        if unit in UNITS_FLOAT:
-            v = float(val)
-            return max(0.0, round(v, 3))
-        else:
-            v = int(float(val))
-            return max(0, v)
+        return SharedStore()
     except Exception:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def catalog_index():
+    return NameIndex(k.title() for k in COMMON_ITEMS)
+
+
+@st.cache_resource(show_spinner=False, ttl=600)
+def name_index():
+    # Katalog + saqlangan safarlardagi nomlar (har biri vakil nomi bilan) — yozilish xatolari shularga tortiladi
+    idx = catalog_index().copy()
+    s = trip_store()
+    if s is not None:
+        names = s.item_names()
+        for rep in dict.fromkeys(dedupe_names(names.index, idx, weights=names.to_numpy()).values()):
+            idx.add(rep)
+    return idx
+
+
+def known_name(name: str):
+    """Erkin kiritilgan nom uchun katalog/tarixdagi vakil nom; farq qilsa izoh chiqadi."""
+    known = name_index().match(name) if name.strip() else None
+    if known and known != name.strip():
+        st.caption(f"💡 Ro'yxatda bor: **{known}** — shu nom bilan qo'shiladi")
+    return known
+
+
+# Grafiklar — altair bo'lsa (ixtiyoriy)
+CHARTS_OK = charts.available()
+
+# Parquet / Arrow IPC — pyarrow bo'lsa (Streamlit bilan birga o'rnatiladi)
+COLUMNAR_OK = columnar.available()
+EXPORT_FORMATS = ["csv", *columnar.FORMATS] if COLUMNAR_OK else ["csv"]
+UPLOAD_TYPES = ["csv", "parquet", "arrow", "feather"] if COLUMNAR_OK else ["csv"]
+# Reja importi: Excel — openpyxl bo'lsa
+PLAN_UPLOAD_TYPES = UPLOAD_TYPES + (["xlsx"] if excel_available() else [])
+
+
+def export_button(label: str, key: str, build, *args, file_name: str, mime: str, widget_key: str | None = None) -> int:
+    """
+    Eksport fon navbatida quriladi (`key` — ma'lumot versiyasi): tayyor bo'lsa yuklab olish
+    tugmasi, bo'lmasa holati. Qaytadi: tayyor fayl hajmi (bayt), hali tayyor bo'lmasa 0.
+    """
+    jobs = export_queue()
+    if jobs is None:  # disk keshi ochilmadi — avvalgidek skript oqimida
+        data = build(*args)
+        st.download_button(label, data=data, file_name=file_name, mime=mime, key=widget_key)
+        return len(data)
+    slot = widget_key or file_name
+    prev = st.session_state.export_jobs.get(slot)
+    if prev and prev != key:
+        jobs.cancel(prev)  # ma'lumot o'zgardi — eski versiya hali navbatda bo'lsa kerak emas
+    st.session_state.export_jobs[slot] = key
+    job = jobs.submit(key, build, *args, name=file_name)
+    if job.status == DONE:
+        # Baytlar bosilganda diskdan o'qiladi (keshdan chiqib ketgan bo'lsa — qayta quriladi)
+        st.download_button(label, data=lambda: jobs.result(key) or build(*args), file_name=file_name, mime=mime,
+                           key=widget_key)
+        return job.size
+    if job.status == FAILED:
+        st.error(f"{label}: {job.error}")
         return 0
+    st.session_state.export_waiting.add(key)
+    st.button(f"⏳ {label} — {job.status} ({job.elapsed:.1f} s)", disabled=True, key=f"{slot}_wait")
+    return 0
+
+
+@st.fragment(run_every=EXPORT_POLL_S)
+def export_watch():
+    # Kutilayotgan eksport tugagan bo'lsa sahifa qayta chiziladi — yuklab olish tugmasi chiqadi
+    jobs = export_queue()
+    if any((job := jobs.get(k)) is None or job.status not in (QUEUED, RUNNING) for k in st.session_state.export_waiting):
+        st.rerun(scope="app")
+
+
+def table_download(label: str, df: pd.DataFrame, stem: str, key: str) -> int:
+    """Format tanlagich + yuklab olish tugmasi; qaytadi: fayl hajmi (bayt)."""
+    fmt = st.radio("Format", EXPORT_FORMATS, format_func=str.upper, horizontal=True, key=f"{key}_fmt",
+                   label_visibility="collapsed") if len(EXPORT_FORMATS) > 1 else "csv"
+    if fmt == "csv":
+        build, ext, mime = csv_bytes, ".csv", "text/csv"
+        args = (df,)
+    else:
+        build, (ext, mime) = columnar_bytes, columnar.FORMATS[fmt]
+        args = (df, fmt)
+    return export_button(f"{label} ({fmt.upper()})", report_key(fmt, df), build, *args,
+                         file_name=stem + ext, mime=mime, widget_key=key)
+
+
+def price_refs(df: pd.DataFrame, shop: str) -> list:
+    """
+    Qatorlar uchun tarixiy narx agregatlari (yo'q bo'lsa None). Sessiya keshida saqlanadi:
+    shu sessiyada kiritilgan narxlar tavsiyani (va editor ma'lumotini) o'zgartirmasin.
+    """
+    keys = [(price_key(i), str(u)) for i, u in zip(df["item"], df["unit"])]
+    cache = st.session_state.setdefault("price_refs", {})
+    missing = list({k for k in keys if (shop, *k) not in cache})
+    if missing and store is not None:
+        found = store.price_lookup(missing, shop)
+        for k in missing:
+            cache[(shop, *k)] = found.get(k)
+    return [cache.get((shop, *k)) for k in keys]
+
+
+SHARED_POLL_S = 3  # umumiy ro'yxat versiyasini tekshirish oralig'i (sekund)
+
+
+def shared_sync(sync: dict) -> int:
+    """
+    Umumiy ro'yxat bilan sinxronlash: mahalliy tahrirlar (bo'lsa) katak darajasida yuboriladi,
+    so'ng sessiya ko'rgan versiyadan keyingi o'zgarishlar buy_df ga qo'llanadi (faqat o'sha
+    qatorlar, yig'indilar delta bilan). Hech kim yozmagan bo'lsa — bitta PK o'qish.
+    Qaytadi: lentadagi qatorlar soni.
+    """
+    drop = ()
+    if st.session_state.buy_df is not sync["df"]:
+        edits, added, deleted = diff_rows(sync["df"], st.session_state.buy_df)
+        if edits or len(added) or len(deleted):  # bo'lmasa faqat jadval obyekti almashgan (qayta hisob)
+            res = shared.commit(sync["id"], sync["version"], edits, added, deleted, editor=session_uid)
+            if res["conflicts"]:
+                st.toast(f"{res['conflicts']} ta katakni boshqa foydalanuvchi o'zgartirgan — uning qiymati qoldi")
+        drop = added.index  # yangi qatorlar lentada server ID si bilan qaytadi
+    n = 0
+    if len(drop) or shared.version(sync["id"]) != sync["version"]:
+        feed, sync["version"] = shared.changes(sync["id"], sync["version"])
+        buy_df = st.session_state.buy_df
+        calc = st.session_state.get("buy_calc")
+        valid = calc is not None and calc["df"] is buy_df and calc["rate"] == st.session_state.qqs_rate
+        buy_df = apply_changes(buy_df, feed, st.session_state.qqs_rate, calc["totals"] if valid else None, drop=drop)
+        if valid:
+            calc["df"] = buy_df
+        st.session_state.buy_df = buy_df
+        n = len(feed)
+    sync["df"] = st.session_state.buy_df  # keyingi farq shu holatga nisbatan
+    return n
+
+
+SNAPSHOT_EVERY = 20  # shuncha jurnal qadamidan keyin safar to'liq snapshot bilan yoziladi
+
+
+def new_edit_log() -> EditLog:
+    return EditLog({"plan": (st.session_state.plan_df, PLAN_COLS), "buy": (st.session_state.buy_df, BUY_INPUT_COLS)})
+
+
+def record_edits(label: str = "") -> bool:
+    """Joriy reja/chek holatini jurnalga bitta qadam sifatida yozadi (o'zgarish bo'lsa)."""
+    return st.session_state.edit_log.record(
+        {"plan": st.session_state.plan_df, "buy": st.session_state.buy_df}, label or "Tahrir"
+    )
+
+
+def restore_edits() -> None:
+    """Undo/redo/tarixdan so'ng: jurnal holati sessiyaga (chek TAB2 da to'liq qayta hisoblanadi)."""
+    log = st.session_state.edit_log
+    st.session_state.plan_df = apply_plan_schema(log.state["plan"])
+    st.session_state.buy_df = log.state["buy"]
+    st.session_state.pop("history_sel", None)
 
 
-def split_vat_from_gross(gross: float, rate_percent: float):
-    r = float(rate_percent)
-    if gross <= 0 or r < 0:
-        return 0.0, 0.0
-    vat = gross * (r / (100.0 + r))
-    net = gross - vat
-    return net, vat
-
-
-def recompute_buy_df(df: pd.DataFrame, qqs_rate: float) -> pd.DataFrame:
-    out = df.copy()
-    for idx, row in out.iterrows():
-        unit = row["unit"]
-        out.at[idx, "plan_qty"] = coerce_qty(row["plan_qty"], unit)
-        out.at[idx, "bought"] = bool(row.get("bought", False))
-        out.at[idx, "actual_qty"] = coerce_qty(row.get("actual_qty", 0), unit)
-        up = float(row.get("unit_price_gross", 0) or 0)
-        out.at[idx, "unit_price_gross"] = max(0.0, up)
-
-        line_gross = (out.at[idx, "actual_qty"] * up) if out.at[idx, "bought"] else 0.0
-        net, vat = split_vat_from_gross(line_gross, qqs_rate)
-        out.at[idx, "line_gross"] = line_gross
-        out.at[idx, "line_net"] = net
-        out.at[idx, "line_vat"] = vat
-    return out
-
-
-def plan_download_bytes(df: pd.DataFrame) -> bytes:
-    buf = io.StringIO()
-    df.to_csv(buf, index=False)
-    return buf.getvalue().encode("utf-8")
-
-
-def purchases_excel_bytes(buy_df: pd.DataFrame, summary_df: pd.DataFrame, cat_df: pd.DataFrame) -> bytes:
-    bio = io.BytesIO()
-    with pd.ExcelWriter(bio, engine="xlsxwriter") as xw:
-        buy_df.to_excel(xw, sheet_name="Purchases", index=False)
-        summary_df.to_excel(xw, sheet_name="Summary", index=False)
-        cat_df.to_excel(xw, sheet_name="ByCategory", index=False)
-    bio.seek(0)
-    return bio.read()
+def shared_join(list_id: int) -> None:
+    meta = shared.meta(list_id)
+    buy_df, version = shared.snapshot(list_id)
+    st.session_state.buy_df = buy_df
+    st.session_state.qqs_rate = meta["qqs_rate"]
+    st.session_state.shared = {"id": list_id, "name": meta["name"], "version": version, "df": buy_df}
+
+
+@st.fragment(run_every=SHARED_POLL_S)
+def shared_watch():
+    # Boshqa sessiya yozgan bo'lsa butun sahifa qayta ishlaydi (lenta rerun boshida olinadi;
+    # to'liq rerunda versiya allaqachon mos — qayta chaqiruv takrorlanmaydi)
+    sync = st.session_state.get("shared")
+    if sync and shared.version(sync["id"]) != sync["version"]:
+        st.rerun(scope="app")
+
+
+def page_window(n_rows: int, page_size: int, key: str):
+    """Sahifa tanlagich; qaytadi: joriy sahifaning (start, stop) pozitsiyalari."""
+    n_pages = page_bounds(n_rows, 1, page_size)[2]
+    if st.session_state.get(key, 1) > n_pages:
+        st.session_state[key] = n_pages  # filtr/o'chirishdan so'ng chegaradan chiqmasin
+    c1, c2 = st.columns([1, 5])
+    page = c1.number_input("Sahifa", min_value=1, max_value=n_pages, step=1, key=key, label_visibility="collapsed")
+    start, stop, _ = page_bounds(n_rows, page, page_size)
+    c2.caption(f"{n_rows} qator · sahifa {page}/{n_pages} · {start + 1 if n_rows else 0}–{stop}")
+    return start, stop
+
+
+# --- Profil: har rerun bosqichlari (BOZORLIK_PROFILE_LOG — JSON-lines log,
+# BOZORLIK_PROFILE_CAPTURE=cprofile|tracemalloc — BOZORLIK_PROFILE_DIR ga dump) ---
+PROFILE_LOG = os.environ.get("BOZORLIK_PROFILE_LOG")
+PROFILE_DIR = os.environ.get("BOZORLIK_PROFILE_DIR", "profiles")
+_capture = st.session_state.get("profile_capture") or os.environ.get("BOZORLIK_PROFILE_CAPTURE")
+prof = RunProfiler(capture=_capture if _capture in CAPTURE_MODES else None, out_dir=PROFILE_DIR)
 
 # --- State init ---
 if "plan_df" not in st.session_state:
-    st.session_state.plan_df = example_plan_df()
+    st.session_state.plan_df = attach(plan_template())
 if "buy_df" not in st.session_state:
-    df0 = st.session_state.plan_df.copy()
-    for c in ["bought", "actual_qty", "unit_price_gross", "line_gross", "line_net", "line_vat"]:
-        df0[c] = 0
-    df0["bought"] = False
-    st.session_state.buy_df = df0[BUY_COLS].copy()
+    st.session_state.buy_df = buy_frame_from_plan(st.session_state.plan_df)
 if "qqs_rate" not in st.session_state:
     st.session_state.qqs_rate = DEFAULT_QQS
+if "edit_log" not in st.session_state:
+    st.session_state.edit_log = new_edit_log()
+st.session_state.setdefault("export_jobs", {})  # joy -> oxirgi yuborilgan eksport kaliti
+st.session_state.export_waiting = set()          # shu rerunda hali tayyor bo'lmagan eksportlar
+
+# --- Sidebar: saqlangan safarlar (SQLite) ---
+store = trip_store()
+shared = shared_store()
+session_uid = st.session_state.setdefault("session_uid", uuid.uuid4().hex)
+
+# Umumiy ro'yxat: boshqa sessiyalar o'zgartirgan qatorlar (widgetlar chizilishidan oldin)
+if shared is not None and st.session_state.get("shared"):
+    with prof.span("shared_pull") as sp:
+        sp["rows"] = shared_sync(st.session_state.shared)
+        record_edits("👥 Umumiy ro'yxatdan")
+
+with st.sidebar, prof.span("sidebar"):
+    st.subheader("💾 Safarlar")
+    if store is None:
+        st.warning("Ma'lumotlar bazasini ochib bo'lmadi — saqlash o'chirilgan")
+    else:
+        if st.session_state.get("trip_id"):
+            st.caption(f"Joriy safar: **{st.session_state.trip_name}** — avtomatik saqlanadi")
+        else:
+            trip_name = st.text_input("Safar nomi", value=f"Bozorlik {pd.Timestamp.now():%Y-%m-%d}", key="trip_name_input")
+            if st.button("💾 Saqlashni boshlash", key="trip_create_btn") and trip_name.strip():
+                st.session_state.trip_id = store.create_trip(trip_name.strip(), st.session_state.qqs_rate)
+                st.session_state.trip_name = trip_name.strip()
+                st.session_state.pop("trip_snap", None)  # birinchi autosave — to'liq snapshot
+                st.rerun()
+
+        trips = store.list_trips()
+        if trips:
+            labels = {t["id"]: f"{t['name']} · {t['updated_at'][:16].replace('T', ' ')} · {t['lines']} qator" for t in trips}
+            open_id = st.selectbox("Oldingi safarlar", options=list(labels), format_func=labels.get, key="trip_open_sel")
+            if st.button("📂 Ochish", key="trip_open_btn"):
+                meta = store.trip(open_id)
+                st.session_state.plan_df = apply_plan_schema(store.load_plan(open_id, replay=False))
+                st.session_state.buy_df = apply_buy_schema(store.load_buy(open_id, replay=False))
+                # Oxirgi snapshotdan keyingi tahrirlar jurnaldan qayta qo'llanadi (undo ham qilsa bo'ladi)
+                st.session_state.edit_log = log = new_edit_log()
+                ops = store.load_ops(open_id)
+                for label, step in ops:
+                    log.replay(step, label)
+                if ops:
+                    restore_edits()
+                st.session_state.trip_snap = {"id": open_id, "rate": meta["qqs_rate"], "ops": len(ops)}
+                st.session_state.qqs_rate = meta["qqs_rate"]
+                st.session_state.trip_id = open_id
+                st.session_state.trip_name = meta["name"]
+                st.session_state.pop("shared", None)  # ochilgan safar umumiy ro'yxatga yozilmaydi
+                st.rerun()
+
+        if st.button("🔗 Tarixdagi nomlarni birlashtirish", key="names_merge_btn",
+                     help="Xato yoki turlicha yozilgan nomlar (pamidor / Помидор) bitta nomga keltiriladi"):
+            names = store.item_names()
+            n = store.merge_item_names(dedupe_names(names.index, catalog_index(), weights=names.to_numpy()))
+            name_index.clear()
+            st.session_state.pop("price_refs", None)
+            st.success(f"{n} ta qatorda nom birlashtirildi")
+
+    if shared is not None:
+        st.subheader("👥 Umumiy ro'yxat")
+        sync = st.session_state.get("shared")
+        if sync:
+            st.caption(f"Ulangan: **{sync['name']}** (#{sync['id']}) · versiya {sync['version']}")
+            if st.toggle("Avto-yangilash", value=True, key="shared_auto",
+                         help=f"Boshqalar belgilagan narx va ✅ lar har {SHARED_POLL_S} soniyada olinadi"):
+                shared_watch()
+            if st.button("🔌 Uzilish", key="shared_leave_btn"):
+                st.session_state.pop("shared")
+                st.rerun()
+        else:
+            if st.button("👥 Chekni ulashish", key="shared_create_btn",
+                         help="Joriy xarid jadvali umumiy ro'yxatga aylanadi — boshqa sessiyalar unga qo'shila oladi"):
+                name = st.session_state.get("trip_name") or f"Bozorlik {pd.Timestamp.now():%Y-%m-%d}"
+                shared_join(shared.create_list(name, st.session_state.buy_df, st.session_state.qqs_rate))
+                st.rerun()
+            lists = shared.lists()
+            if lists:
+                labels = {r["id"]: f"#{r['id']} {r['name']} · {r['rows']} qator" for r in lists}
+                join_id = st.selectbox("Ro'yxatlar", options=list(labels), format_func=labels.get, key="shared_sel")
+                if st.button("🔗 Qo'shilish", key="shared_join_btn"):
+                    shared_join(join_id)
+                    st.rerun()
+
+    st.subheader("↩️ Tahrirlar")
+    log = st.session_state.edit_log
+    u1, u2 = st.columns(2)
+    if u1.button("↩️ Bekor qilish", key="undo_btn", disabled=log.cursor == 0, use_container_width=True):
+        log.undo()
+        restore_edits()
+    if u2.button("↪️ Qaytarish", key="redo_btn", disabled=log.cursor >= len(log.steps), use_container_width=True):
+        log.redo()
+        restore_edits()
+    if log.steps:
+        hist = {i: "Boshlang'ich holat" if i == 0 else f"{log.steps[i - 1]['at']} · {log.steps[i - 1]['label']}"
+                for i in range(len(log.steps), -1, -1)}
+        target = st.selectbox("Tarix", options=list(hist), format_func=hist.get, index=len(hist) - 1 - log.cursor,
+                              key="history_sel")
+        if st.button("🕘 Shu holatga o'tish", key="history_btn", disabled=target == log.cursor):
+            log.goto(target)
+            restore_edits()
+            st.rerun()
+        st.caption(f"{log.cursor}/{len(log.steps)} qadam · jurnalda {log.cells()} katak")
+
+    with st.expander("⏱️ Profil"):
+        show_profile = st.checkbox("Rerun profilini ko'rsatish", key="profile_panel")
+        st.selectbox(
+            "Chuqur o'lchov (faylga)", options=["", *CAPTURE_MODES],
+            format_func=lambda m: m or "o'chiq", key="profile_capture",
+            help=f"Har rerun natijasi {PROFILE_DIR}/ ga yoziladi",
+        )
 
 # --- UI ---
 st.title("🛒 Bozorlik — Reja → Xarid → Tahlil")
@@ -312,11 +471,35 @@ with TAB1:
     st.subheader("1) Reja tuzish")
     st.write("Pastdagi formadan yoki tayyor ro'yxatdan foydalaning. Yoki erkin matndan bulk qo'shing.")
 
+    with st.expander("📋 Shablonlar (takrorlanuvchi ro'yxatlar)"):
+        tpls = {(BUILTIN_NAME, 0): {"name": BUILTIN_NAME, "version": 0, "household": 1.0, "lines": len(plan_template())}}
+        if store is not None:
+            tpls.update({(t["name"], t["version"]): t for t in store.list_templates()})
+        c1, c2, c3 = st.columns([2, 1, 1])
+        tpl_key = c1.selectbox(
+            "Shablon", options=list(tpls), key="tpl_sel",
+            format_func=lambda k: f"{k[0]} · v{k[1]} · {tpls[k]['lines']} qator · {tpls[k]['household']:g} kishi",
+        )
+        household = c2.number_input("Oila (kishi)", min_value=0.5, step=0.5, value=1.0, key="tpl_household")
+        use_history = c3.checkbox("Tarix bo'yicha", key="tpl_history", disabled=store is None,
+                                  help=f"Oxirgi {HISTORY_TRIPS} safarda odatda olingan miqdorlar")
+        if st.button("📋 Shablondan reja", key="tpl_load_btn"):
+            factor = round(household / (tpls[tpl_key]["household"] or 1.0), 4)
+            st.session_state.plan_df = attach(scaled_template(*tpl_key, factor, bool(use_history)))
+            st.session_state.op_label = f"Shablon: {tpl_key[0]}"
+            st.success(f"«{tpl_key[0]}» v{tpl_key[1]} — reja {household:g} kishiga yuklandi")
+        if store is not None:
+            c1, c2 = st.columns([2, 1])
+            tpl_name = c1.text_input("Joriy rejani shablon sifatida saqlash", placeholder="Haftalik", key="tpl_name")
+            if c2.button("💾 Saqlash", key="tpl_save_btn") and tpl_name.strip() and tpl_name.strip() != BUILTIN_NAME:
+                v = store.save_template(tpl_name.strip(), st.session_state.plan_df, household)
+                st.success(f"«{tpl_name.strip()}» v{v} saqlandi ({household:g} kishi uchun)")
+
     with st.expander("➕ Tez qo'shish (tayyor mahsulotlar)"):
         c1, c2 = st.columns([2, 1])
         chosen = c1.selectbox(
             "Mahsulot tanlang",
-            options=[""] + sorted(COMMON_ITEMS.keys()),
+            options=[""] + COMMON_ITEM_NAMES,
             key="plan_quick_item",
         )
         if chosen:
@@ -347,17 +530,18 @@ with TAB1:
         display_name = chosen.title() if chosen else st.text_input(
             "Yangi mahsulot nomi (erkin)", value="", key="plan_free_name"
         )
+        known = None if chosen else known_name(display_name)
         add_ok = st.button("🔹 Rejaga qo'shish", key="plan_add_btn")
         if add_ok and display_name.strip():
             new_row = {
-                "item": display_name.strip().title(),
+                "item": known or display_name.strip().title(),
                 "category": cat_sel,
                 "unit": unit_sel,
                 "plan_qty": qty if unit_sel in UNITS_FLOAT else int(qty),
             }
-            st.session_state.plan_df = pd.concat(
-                [st.session_state.plan_df, pd.DataFrame([new_row])], ignore_index=True
-            )
+            cur = st.session_state.plan_df
+            st.session_state.plan_df = pd.concat([cur, pd.DataFrame([new_row], index=[next_row_id(cur)])])
+            st.session_state.op_label = f"Rejaga qo'shildi: {new_row['item']}"
             st.success(f"{display_name.strip()} reja ro'yxatiga qo'shildi")
 
     # 📝 Erkin (bulk) kiritish: istalgan mahsulot(lar)
@@ -382,78 +566,119 @@ Kolbasa, 2, dona
 Suv 1.5 litr Ichimliklar""",
             key="bulk_textarea",
         )
+        bulk_file = st.file_uploader("Yoki matn faylidan (.txt, har qatorda bitta mahsulot)", type=["txt"], key="bulk_file")
         if st.button("➕ Bulk qo'shish", key="bulk_add_btn"):
-            rows = parse_bulk_lines(bulk_text)
-            if rows:
+            if bulk_file is not None:
+                bar = st.progress(0.0, text="O'qilmoqda...")
+                size = max(bulk_file.size, 1)
+                new_rows = bulk_plan_frame(
+                    bulk_file,
+                    progress=lambda n: bar.progress(min(bulk_file.tell() / size, 1.0), text=f"{n} qator o'qildi"),
+                )
+                bulk_file.seek(0)
+            else:
+                new_rows = bulk_plan_frame(bulk_text)
+            if not new_rows.empty:
+                new_rows, n_fixed = canonicalize_items(new_rows, name_index())
+                cur = st.session_state.plan_df
+                start = next_row_id(cur)
                 st.session_state.plan_df = pd.concat(
-                    [st.session_state.plan_df, pd.DataFrame(rows)], ignore_index=True
+                    [cur, new_rows.set_axis(pd.RangeIndex(start, start + len(new_rows)))]
                 )
-                st.success(f"{len(rows)} ta pozitsiya qo'shildi")
+                st.session_state.op_label = f"Bulk: {len(new_rows)} qator"
+                st.success(f"{len(new_rows)} ta pozitsiya qo'shildi" + (f" ({n_fixed} ta nom tuzatildi)" if n_fixed else ""))
             else:
                 st.warning("Hech narsa aniqlanmadi — formatni tekshiring")
 
     st.markdown("**Reja jadvali (tahrirlash mumkin):**")
-    plan_editor = st.data_editor(
-        st.session_state.plan_df,
-        column_config={
-            "item": st.column_config.TextColumn("Mahsulot"),
-            "category": st.column_config.SelectboxColumn("Kategoriya", options=DEFAULT_CATEGORIES),
-            "unit": st.column_config.SelectboxColumn("Birlik", options=ALL_UNITS),
-            "plan_qty": st.column_config.NumberColumn("Reja miqdori", step=0.1, format="%.3f"),
-        },
-        use_container_width=True,
-        hide_index=True,
-        num_rows="dynamic",
-        key="plan_editor",
-    )
-    st.session_state.plan_df = plan_editor[PLAN_COLS].copy()
+    with prof.span("tab1_plan_editor", rows=len(st.session_state.plan_df)):
+        plan_editor = st.data_editor(
+            st.session_state.plan_df,
+            column_config={
+                "item": st.column_config.TextColumn("Mahsulot"),
+                "category": st.column_config.SelectboxColumn("Kategoriya", options=DEFAULT_CATEGORIES),
+                "unit": st.column_config.SelectboxColumn("Birlik", options=ALL_UNITS),
+                "plan_qty": st.column_config.NumberColumn("Reja miqdori", step=0.1, format="%.3f"),
+            },
+            use_container_width=True,
+            hide_index=True,
+            num_rows="dynamic",
+            key="plan_editor",
+        )
+    # Tahrir bo'lmasa jadval o'sha obyekt qoladi (shablon bilan umumiy, jurnal solishtirmaydi)
+    if any(st.session_state.plan_editor.get(k) for k in ("edited_rows", "added_rows", "deleted_rows")):
+        st.session_state.plan_df = apply_plan_schema(plan_editor[PLAN_COLS])
 
     c1, c2, c3 = st.columns(3)
     with c1:
         if st.button("🧹 Rejani tozalash"):
-            st.session_state.plan_df = example_plan_df().head(0)
+            st.session_state.plan_df = attach(plan_template()).head(0)
+            st.session_state.op_label = "Reja tozalandi"
             st.success("Reja tozalandi")
+        if st.button("🔗 Takrorlarni birlashtirish", key="plan_dedupe_btn",
+                     help="Bir xil yoki xato yozilgan mahsulotlar (bir xil birlikda) bitta qatorga jamlanadi"):
+            st.session_state.plan_df, n_merged = merge_plan_duplicates(st.session_state.plan_df, name_index())
+            st.session_state.op_label = "Takrorlar birlashtirildi"
+            st.success(f"{n_merged} ta takror qator birlashtirildi")
     with c2:
-        st.download_button(
-            "⬇️ Rejani CSV sifatida yuklab olish",
-            data=plan_download_bytes(st.session_state.plan_df),
-            file_name="bozorlik_reja.csv", mime="text/csv"
-        )
+        with prof.span("tab1_export") as sp:
+            sp["bytes"] = table_download("⬇️ Rejani yuklab olish", st.session_state.plan_df, "bozorlik_reja", "plan_dl")
     with c3:
-        up = st.file_uploader("Yoki CSV dan yuklash", type=["csv"], accept_multiple_files=False)
-        if up is not None:
+        up = st.file_uploader("Yoki fayldan yuklash (CSV/Excel/Parquet/Arrow)", type=PLAN_UPLOAD_TYPES,
+                              accept_multiple_files=False)
+        # Fayl faqat tanlanganda bir marta import qilinadi (har rerun da emas)
+        if up is not None and st.session_state.get("plan_upload_id") != up.file_id:
+            st.session_state.plan_upload_id = up.file_id
+            bar = st.progress(0.0, text="O'qilmoqda...")
             try:
-                df = pd.read_csv(up)
-                rename_map = {c: c.strip().lower() for c in df.columns}
-                df.columns = [rename_map[c] for c in df.columns]
-                miss = [c for c in ["item", "unit", "plan_qty"] if c not in df.columns]
-                if miss:
-                    st.error(f"CSV ustunlari yetarli emas. Kerak: item, unit, plan_qty (topilmadi: {', '.join(miss)}).")
-                else:
-                    if "category" not in df.columns:
-                        df["category"] = "Boshqa"
-                    st.session_state.plan_df = df[PLAN_COLS].copy()
-                    st.success("Reja CSV dan yuklandi")
+                res = import_plan(up, up.name, progress=lambda n: bar.progress(
+                    min(up.tell() / max(up.size, 1), 1.0), text=f"{n} qator tekshirildi"))
+                st.session_state.plan_df, _ = canonicalize_items(res["plan"], name_index())
+                st.session_state.op_label = f"Fayldan: {up.name}"
+                st.session_state.plan_import = res
+            except ValueError as e:
+                st.error(f"Jadval tekshiruvdan o'tmadi: {e}")
             except Exception as e:
                 st.error(f"Yuklashda xatolik: {e}")
+            bar.empty()
+        res = st.session_state.get("plan_import") if up is not None else None
+        if res:
+            st.caption(f"{res['rows']} qator: {res['accepted']} qabul qilindi, {res['rejected']} rad etildi, "
+                       f"{res['fixed']} tuzatildi · {res['rows_per_s']:,.0f} qator/s".replace(",", " "))
+            if len(res["report"]):
+                with st.expander(f"⚠️ Import hisoboti ({res['report_total']} yozuv)"):
+                    st.dataframe(res["report"].head(200), use_container_width=True, hide_index=True)
+                    table_download("⬇️ Hisobot", res["report"], "bozorlik_import_hisobot", "import_report_dl")
 
     if st.button("➡️ Bozorda sahifasini yangilash (rejadan)"):
-        base = st.session_state.plan_df.copy()
-        for c in ["bought", "actual_qty", "unit_price_gross", "line_gross", "line_net", "line_vat"]:
-            base[c] = 0
-        base["bought"] = False
-        st.session_state.buy_df = base[BUY_COLS].copy()
-        st.success("Bozorda jadvali reja asosida yangilandi")
+        # Kalit bo'yicha sinxronlash: kiritilgan narx/miqdorlar saqlanadi, yig'indilar delta bilan
+        calc = st.session_state.get("buy_calc")
+        valid = calc is not None and calc["df"] is st.session_state.buy_df and calc["rate"] == st.session_state.qqs_rate
+        buy_df, sync_stats = sync_buy_from_plan(
+            st.session_state.plan_df, st.session_state.buy_df, calc["totals"] if valid else None,
+            st.session_state.qqs_rate,
+        )
+        st.session_state.buy_df = buy_df
+        if valid:
+            calc["df"] = buy_df
+        st.session_state.op_label = "Rejadan sinxronlandi"
+        st.success(
+            "Bozorda jadvali reja asosida yangilandi: "
+            f"+{sync_stats['added']} qo'shildi, −{sync_stats['removed']} o'chirildi, {sync_stats['updated']} yangilandi"
+        )
 
 # --- TAB 2: Buy ---
 with TAB2:
     st.subheader("2) Bozorda — narx va chek")
     st.write("Quyida har bir mahsulot uchun: ✅ olindi, **miqdor** va **birlik narxi (Gross, QQS bilan)** kiriting. Pastda chek va jami hisob chiqadi.")
+    shop = st.text_input("🏬 Do'kon / bozor (ixtiyoriy — narx tarixi shu bo'yicha)", key="shop_name").strip()
 
     # ➕ Bozorda sahifasida ham yangi mahsulot qo'shish (rejadan mustaqil)
     with st.expander("➕ Bozorda yangi mahsulot qo'shish (ad-hoc)"):
         c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
         new_item = c1.text_input("Mahsulot nomi", "", key="adhoc_item")
+        with c1:
+            known = known_name(new_item)
         new_unit = c2.selectbox(
             "Birlik",
             options=ALL_UNITS,
@@ -480,9 +705,15 @@ with TAB2:
             index=DEFAULT_CATEGORIES.index(infer_category(new_item)) if new_item else DEFAULT_CATEGORIES.index("Boshqa"),
             key="adhoc_cat",
         )
+        ref = price_refs(pd.DataFrame({"item": [new_item], "unit": [new_unit]}), shop)[0] if new_item.strip() else None
+        if ref:
+            st.caption(f"💡 Tavsiya narx: {fmt_money(ref['median'])} (oxirgi: {fmt_money(ref['last_price'])}, "
+                       f"{ref['n']} ta kuzatuv) — narx 0 qoldirilsa shu ishlatiladi")
         if st.button("➕ Qo'shish (Bozorda)", key="adhoc_add_btn") and new_item.strip():
+            if not new_price and ref:
+                new_price = ref["median"]
             row = {
-                "item": new_item.strip().title(),
+                "item": known or new_item.strip().title(),
                 "category": new_cat,
                 "unit": new_unit,
                 "plan_qty": 0,
@@ -493,130 +724,269 @@ with TAB2:
                 "line_net": 0,
                 "line_vat": 0,
             }
-            st.session_state.buy_df = pd.concat(
-                [st.session_state.buy_df, pd.DataFrame([row])], ignore_index=True
-            )
+            cur = st.session_state.buy_df
+            st.session_state.buy_df = pd.concat([cur, pd.DataFrame([row], index=[next_row_id(cur)])])
+            st.session_state.op_label = f"Chekka qo'shildi: {row['item']}"
             st.success("Yangi pozitsiya qo'shildi — pastdagi jadvalda ko'rasiz")
 
-    # Editable purchase table
-    buy_editor = st.data_editor(
-        st.session_state.buy_df,
-        column_config={
-            "item": st.column_config.TextColumn("Mahsulot"),
-            "category": st.column_config.SelectboxColumn("Kategoriya", options=DEFAULT_CATEGORIES),
-            "unit": st.column_config.SelectboxColumn("Birlik", options=ALL_UNITS),
-            "plan_qty": st.column_config.NumberColumn("Reja miqdori", step=0.1, format="%.3f"),
-            "bought": st.column_config.CheckboxColumn("Olindi mi?"),
-            "actual_qty": st.column_config.NumberColumn("Real miqdor", step=0.1, format="%.3f", help="Olindi deb belgilansa hisobga olinadi"),
-            "unit_price_gross": st.column_config.NumberColumn("Birlik narxi (Gross, QQS bilan)", step=100.0, help="so'm"),
-        },
-        use_container_width=True,
-        hide_index=True,
-        num_rows="dynamic",
-        key="buy_editor",
+    if st.button("💡 Narxi 0 bo'lgan qatorlarga tavsiya narxni qo'yish", key="price_fill_btn"):
+        cur = st.session_state.buy_df
+        med = pd.Series([r["median"] if r else 0.0 for r in price_refs(cur, shop)], index=cur.index)
+        fill = (cur["unit_price_gross"].fillna(0) <= 0) & (med > 0)
+        if fill.any():
+            st.session_state.buy_df = cur.assign(unit_price_gross=cur["unit_price_gross"].mask(fill, med))
+            st.session_state.op_label = "Tavsiya narxlar qo'yildi"
+        st.success(f"{int(fill.sum())} ta qatorga tavsiya narx qo'yildi")
+
+    if st.button("🔗 Nomlarni birlashtirish", key="buy_names_btn",
+                 help="Xato yoki turlicha yozilgan nomlar ro'yxatdagi nomga keltiriladi (qatorlar saqlanadi)"):
+        st.session_state.buy_df, n_fixed = canonicalize_items(st.session_state.buy_df, name_index())
+        st.session_state.op_label = "Nomlar birlashtirildi"
+        st.success(f"{n_fixed} ta qatorda nom tuzatildi")
+
+    # To'liq hisob — stavka o'zgarsa yoki jadval tashqaridan almashsa (reja, ad-hoc, safar ochish)
+    base = st.session_state.buy_df
+    calc = st.session_state.get("buy_calc")
+    if calc is None or calc["df"] is not base or calc["rate"] != st.session_state.qqs_rate:
+        with prof.span("recompute_full", rows=len(base)):
+            if not (base.index.is_unique and base.index.dtype.kind == "i"):
+                base = base.reset_index(drop=True)  # indeks — barqaror qator ID
+            base = recompute_buy_df(base[BUY_COLS], st.session_state.qqs_rate)
+            calc = {"totals": buy_totals(base), "rate": st.session_state.qqs_rate, "df": base}
+
+    # Oyna: filtr va sahifa serverda — brauzerga faqat ko'rinadigan qatorlar yuboriladi
+    f1, f2, f3 = st.columns([3, 2, 1])
+    buy_search = f1.text_input("🔎 Mahsulot bo'yicha qidirish", key="buy_search")
+    buy_cats = f2.multiselect("Kategoriya", options=DEFAULT_CATEGORIES, key="buy_cats")
+    page_size = f3.selectbox("Sahifada", options=PAGE_SIZES, index=1, key="buy_page_size")
+    view_ids = filter_row_ids(base, buy_cats, buy_search)
+    start, stop = page_window(len(view_ids), page_size, "buy_page")
+    page_ids = view_ids[start:stop]
+    view = view_frame(base, page_ids)
+    # Tarix bo'yicha tavsiya va og'ish (faqat ko'rinadigan qatorlar uchun, PK bo'yicha qidiruv)
+    refs = price_refs(view, shop)
+    suggested = [r["median"] if r else None for r in refs]
+    dev, outlier = price_deviation(view["unit_price_gross"], suggested)
+    view = view.assign(
+        suggested_price=suggested,
+        price_check=[f"⚠️ {d:+.0%}" if o else "" for d, o in zip(dev, outlier)],
     )
 
-    # Recompute lines
-    buy_df = recompute_buy_df(buy_editor[BUY_COLS], st.session_state.qqs_rate)
-    st.session_state.buy_df = buy_df.copy()
-
-    # Chek (only bought)
-    cek = buy_df[buy_df["bought"]].copy()
-    cols_show = ["item", "category", "unit", "actual_qty", "unit_price_gross", "line_net", "line_vat", "line_gross"]
-    st.markdown("**🧾 Chek (olinganlar):**")
-    st.dataframe(cek[cols_show], use_container_width=True)
+    # Editable purchase table (faqat joriy sahifa)
+    editor_nonce = st.session_state.setdefault("buy_editor_nonce", 0)
+    editor_key = f"buy_editor_{editor_nonce}"
+    with prof.span("tab2_data_editor", rows=len(view)):
+        buy_editor = st.data_editor(
+            view,
+            column_config={
+                "item": st.column_config.TextColumn("Mahsulot"),
+                "category": st.column_config.SelectboxColumn("Kategoriya", options=DEFAULT_CATEGORIES),
+                "unit": st.column_config.SelectboxColumn("Birlik", options=ALL_UNITS),
+                "plan_qty": st.column_config.NumberColumn("Reja miqdori", step=0.1, format="%.3f"),
+                "bought": st.column_config.CheckboxColumn("Olindi mi?"),
+                "actual_qty": st.column_config.NumberColumn("Real miqdor", step=0.1, format="%.3f", help="Olindi deb belgilansa hisobga olinadi"),
+                "unit_price_gross": st.column_config.NumberColumn("Birlik narxi (Gross, QQS bilan)", step=100.0, help="so'm"),
+                "suggested_price": st.column_config.NumberColumn("Tavsiya narx", format="%.0f", help="Tarixdagi oxirgi narxlar medianasi"),
+                "price_check": st.column_config.TextColumn("Narx tekshiruvi", help="Medianadan ±50% dan ko'p farq"),
+            },
+            disabled=["suggested_price", "price_check"],
+            use_container_width=True,
+            hide_index=True,
+            num_rows="dynamic",
+            key=editor_key,
+        )
 
-    gross_total = float(cek["line_gross"].sum())
-    net_total, vat_total = split_vat_from_gross(gross_total, st.session_state.qqs_rate)
+    # Sahifa tahrirlari asosiy jadvalga qator ID bo'yicha qaytadi; faqat o'zgargan qatorlar hisoblanadi
+    editor_edits = st.session_state.get(editor_key) or {}
+    with prof.span("recompute") as sp:
+        res = merge_view_edits(base, page_ids, view, buy_editor[BUY_COLS], editor_edits,
+                               st.session_state.qqs_rate, calc["totals"])
+        if res is None:
+            # Deltalar sahifaga mos kelmadi — xavfsiz yo'l: tahrirlarni tashlab, to'liq hisob
+            buy_df = recompute_buy_df(base, st.session_state.qqs_rate)
+            calc["totals"] = buy_totals(buy_df)
+            sp["rows"] = len(buy_df)
+        else:
+            buy_df, sp["rows"] = res
+    calc["df"] = buy_df
+    st.session_state.buy_calc = calc
+    st.session_state.buy_df = buy_df
+    buy_totals_now = calc["totals"]
+    if any(editor_edits.get(k) for k in ("edited_rows", "added_rows", "deleted_rows")):
+        # Editor deltalari kumulyativ: qo'llangandan so'ng editor yangi kalit bilan qayta yaratiladi.
+        # Aks holda sahifa o'zgarmasa (yangi qator boshqa sahifada/filtrda) ular yana qo'llanadi.
+        st.session_state.buy_editor_nonce = editor_nonce + 1
+        st.rerun()
+
+    with prof.span("tab2_receipt") as sp:
+        # Chek (only bought) — joriy filtr bo'yicha, sahifalab
+        cek = buy_df[buy_df["bought"]]
+        cols_show = ["item", "category", "unit", "actual_qty", "unit_price_gross", "line_net", "line_vat", "line_gross"]
+        st.markdown("**🧾 Chek (olinganlar):**")
+        cek_ids = filter_row_ids(cek, buy_cats, buy_search)
+        start, stop = page_window(len(cek_ids), page_size, "cek_page")
+        st.dataframe(cek.loc[cek_ids[start:stop], cols_show], use_container_width=True)
+        sp["rows"] = stop - start
+
+    money = money_totals(buy_totals_now, st.session_state.qqs_rate)
 
     m1, m2, m3 = st.columns(3)
-    m1.metric("Jami Net (QQSsiz)", fmt_money(net_total))
-    m2.metric("Jami QQS", fmt_money(vat_total))
-    m3.metric("Jami Gross (QQS bilan)", fmt_money(gross_total))
-
-    st.download_button(
-        "⬇️ Chek (CSV)",
-        data=plan_download_bytes(cek[cols_show]),
-        file_name="bozorlik_chek.csv",
-        mime="text/csv",
-    )
+    m1.metric("Jami Net (QQSsiz)", fmt_money(money["net"]))
+    m2.metric("Jami QQS", fmt_money(money["vat"]))
+    m3.metric("Jami Gross (QQS bilan)", fmt_money(money["gross"]))
+
+    with prof.span("tab2_export") as sp:
+        sp["bytes"] = table_download("⬇️ Chek", cek[cols_show], "bozorlik_chek", "cek_dl")
 
 # --- TAB 3: Summary ---
 with TAB3:
     st.subheader("3) Tahlil — kategoriyalar bo'yicha")
 
-    fakt = st.session_state.buy_df.copy()
-    fakt = fakt[fakt["bought"]].copy()
+    fakt = st.session_state.buy_df[st.session_state.buy_df["bought"]]
 
-    # Reja vs fakt jadvali
-    rvf = st.session_state.buy_df[["item", "category", "unit", "plan_qty", "bought", "actual_qty", "line_gross", "line_net", "line_vat"]].copy()
-    rvf["qty_diff"] = rvf["actual_qty"] - rvf["plan_qty"]
-    st.markdown("**Reja vs Fakt (miqdor):**")
-    st.dataframe(rvf, use_container_width=True)
+    with prof.span("tab3_plan_vs_actual") as sp:
+        # Reja vs fakt jadvali
+        st.markdown("**Reja vs Fakt (miqdor):**")
+        start, stop = page_window(len(st.session_state.buy_df), page_size, "rvf_page")
+        rvf = st.session_state.buy_df.iloc[start:stop][["item", "category", "unit", "plan_qty", "bought", "actual_qty", "line_gross", "line_net", "line_vat"]]
+        rvf = rvf.assign(qty_diff=rvf["actual_qty"] - rvf["plan_qty"])
+        st.dataframe(rvf, use_container_width=True)
+        sp["rows"] = len(rvf)
 
     # Kategoriya bo'yicha yig'indi
     if not fakt.empty:
-        cat = (
-            fakt.groupby("category", as_index=False)
-                .agg(
-                    items=("item", "count"),
-                    qty=("actual_qty", "sum"),
-                    net=("line_net", "sum"),
-                    qqs=("line_vat", "sum"),
-                    gross=("line_gross", "sum"),
-                )
-                .sort_values("gross", ascending=False)
-        )
+        with prof.span("tab3_aggregate"):
+            # Yig'indilar TAB2 da delta bilan yangilanadi — bu yerda groupby qilinmaydi
+            cat = category_totals_df(buy_totals_now, st.session_state.qqs_rate)
 
-        st.markdown("**Kategoriya bo'yicha sarf (Net/QQS/Gross):**")
-        st.dataframe(cat, use_container_width=True)
+            st.markdown("**Kategoriya bo'yicha sarf (Net/QQS/Gross):**")
+            st.dataframe(cat, use_container_width=True)
 
-        # Umumiy jadval
-        summary = pd.DataFrame([
-            {
-                "metric": "Jami Net (QQSsiz)",
-                "value": net_total if 'net_total' in locals() else float(fakt["line_net"].sum()),
-            },
-            {
-                "metric": "Jami QQS",
-                "value": vat_total if 'vat_total' in locals() else float(fakt["line_vat"].sum()),
-            },
-            {
-                "metric": "Jami Gross (QQS bilan)",
-                "value": gross_total if 'gross_total' in locals() else float(fakt["line_gross"].sum()),
-            },
-            {
-                "metric": "Umumiy pozitsiyalar (olingan)",
-                "value": int(fakt.shape[0]),
-            },
-        ])
-        st.markdown("**Umumiy ko'rsatkichlar:**")
-        st.dataframe(summary, use_container_width=True)
+            # Umumiy jadval
+            summary = summary_df(buy_totals_now, st.session_state.qqs_rate)
+            st.markdown("**Umumiy ko'rsatkichlar:**")
+            st.dataframe(summary, use_container_width=True)
 
         # Charts (optional)
-        if ALTAIR_OK and not cat.empty:
-            st.markdown("**Kategoriya bo'yicha Gross (diagramma):**")
-            ch1 = alt.Chart(cat).mark_arc().encode(theta="gross", color="category", tooltip=["category", "gross", "net", "qqs", "qty"])  # Pie
-            st.altair_chart(ch1, use_container_width=True)
-
-            st.markdown("**Mahsulotlar bo'yicha birlik narxlar (Gross):**")
-            prod = fakt[["item", "unit", "unit_price_gross", "line_gross"]].copy()
-            prod = prod.sort_values("unit_price_gross", ascending=False)
-            ch2 = alt.Chart(prod).mark_bar().encode(x=alt.X("item:N", sort="-y"), y="unit_price_gross:Q", tooltip=["item", "unit", "unit_price_gross"])  # Bar
-            st.altair_chart(ch2, use_container_width=True)
-
-        # Exports
-        excel_bytes = purchases_excel_bytes(
-            buy_df=st.session_state.buy_df,
-            summary_df=summary,
-            cat_df=cat,
-        )
-        st.download_button("⬇️ Hisobot (Excel, 3 ta varaq)", data=excel_bytes, file_name="bozorlik_hisobot.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        # Grafiklarga xom qatorlar emas, serverda agregatsiya qilingan kichik jadvallar beriladi
+        with prof.span("tab3_charts", rows=len(fakt)) as sp:
+            if CHARTS_OK and not cat.empty:
+                pie = charts.category_slices(cat)
+                top = charts.top_items(fakt)
+                hist = charts.price_histogram(fakt["unit_price_gross"], fakt["line_gross"])
+                st.markdown("**Kategoriya bo'yicha Gross (diagramma):**")
+                st.vega_lite_chart(charts.chart_spec("category_pie", pie, report_cache()), use_container_width=True)
+
+                st.markdown(f"**Eng ko'p sarflangan {charts.TOP_N} ta mahsulot (Gross):**")
+                st.vega_lite_chart(charts.chart_spec("top_items", top, report_cache()), use_container_width=True)
+
+                st.markdown("**Birlik narxlar taqsimoti:**")
+                st.vega_lite_chart(charts.chart_spec("price_hist", hist, report_cache()), use_container_width=True)
+                sp["rows"] = len(pie) + len(top) + len(hist)  # sahifaga joylangan qatorlar
+
+        # Exports: ma'lumot o'zgarmasa keshdan (qayta qurilmaydi)
+        # Hisobotlar fon navbatida quriladi (skript kutmaydi); ma'lumot o'zgarmasa diskdagi keshdan
+        report_args = (st.session_state.buy_df, summary, cat, float(st.session_state.qqs_rate))
+        with prof.span("tab3_export_excel", rows=len(st.session_state.buy_df)) as sp:
+            sp["bytes"] = export_button(
+                "⬇️ Hisobot (Excel, 3 ta varaq)", report_key("xlsx", *report_args), excel_report_bytes, *report_args,
+                file_name="bozorlik_hisobot.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+        if COLUMNAR_OK:
+            # Arxiv uchun: bitta ustunli jadval, Summary/ByCategory — sxema metama'lumotida
+            with prof.span("tab3_export_columnar", rows=len(st.session_state.buy_df)) as sp:
+                for fmt, (ext, mime) in columnar.FORMATS.items():
+                    sp["bytes"] = (sp["bytes"] or 0) + export_button(
+                        f"⬇️ Hisobot ({fmt.capitalize()})", report_key(f"report-{fmt}", *report_args),
+                        columnar_report_bytes, *report_args, fmt, file_name=f"bozorlik_hisobot{ext}", mime=mime,
+                    )
 
     else:
         st.info("Hali xarid kiritilmadi (olinganlar yo'q)")
 
+    # Saqlangan safarlar bo'yicha: tayyor davriy yig'indilardan (xom qatorlar qayta agregatsiya qilinmaydi)
+    if store is not None:
+        with st.expander("📅 Safarlar bo'yicha tahlil (hafta / oy / yil)"), prof.span("tab3_rollups") as sp:
+            grain = st.radio("Davr", ["week", "month", "year"], index=1, horizontal=True, key="rollup_grain",
+                             format_func={"week": "Hafta", "month": "Oy", "year": "Yil"}.get)
+            roll = store.rollup(grain)
+            sp["rows"] = len(roll)
+            if roll.empty:
+                st.info("Saqlangan safarlar yo'q — yon paneldan saqlashni boshlang")
+            else:
+                per = roll.groupby("period", as_index=False)[["net", "vat", "gross", "plan_qty", "plan_abs_diff"]].sum()
+                per["accuracy"] = (1 - per["plan_abs_diff"] / per["plan_qty"]).where(per["plan_qty"] > 0)
+                st.markdown("**Davr bo'yicha sarf va reja aniqligi:**")
+                st.dataframe(per[["period", "net", "vat", "gross", "accuracy"]], use_container_width=True, hide_index=True)
+                st.markdown("**Kategoriyalar bo'yicha Gross:**")
+                st.dataframe(roll.pivot_table(index="period", columns="category", values="gross", aggfunc="sum", observed=True),
+                             use_container_width=True)
+                if CHARTS_OK:
+                    # Chegaradan oshsa eski davrlar grafikka tushmaydi (jadvalda bor)
+                    st.vega_lite_chart(charts.chart_spec("rollup", charts.recent_periods(roll), report_cache()),
+                                       use_container_width=True)
+
+if st.session_state.export_waiting:
+    export_watch()
+
+# Tahrirlar jurnali: shu rerundagi barcha o'zgarishlar — bitta qadam (faqat kataklar deltasi)
+with prof.span("edit_log") as sp:
+    sp["rows"] = int(record_edits(st.session_state.pop("op_label", "")))
+
+# Umumiy ro'yxat: shu rerundagi tahrirlar katak darajasida yuboriladi, javobda lenta olinadi
+if shared is not None and st.session_state.get("shared"):
+    with prof.span("shared_push") as sp:
+        sp["rows"] = shared_sync(st.session_state.shared)
+        record_edits("👥 Umumiy ro'yxatdan")
+
+# Autosave: jurnal deltalari qo'shiladi (davriy yig'indilar ham shu zahoti yangilanadi); to'liq snapshot —
+# har SNAPSHOT_EVERY qadamda, stavka o'zgarganda va yangi safarda.
+# Narx indeksi har rerunda (safarda ham, safarsiz ham) — olingan narxlar o'zgargandagina;
+# snapshot narxlarni o'zi yozadi, shuning uchun o'sha rerunda qayta yozilmaydi
+entries = st.session_state.edit_log.drain()
+if store is not None:
+    trip_id = st.session_state.get("trip_id")
+    priced = st.session_state.buy_df[["item", "unit", "bought", "unit_price_gross"]]
+    priced_h = frame_hash(priced) + shop
+    if trip_id:
+        with prof.span("autosave") as sp:
+            snap = st.session_state.get("trip_snap")
+            full = snap is None or snap["id"] != trip_id or snap["rate"] != st.session_state.qqs_rate
+            if entries and not full:
+                snap["ops"] = store.append_ops(trip_id, entries, st.session_state.buy_df)
+                full = snap["ops"] >= SNAPSHOT_EVERY
+            if full:
+                store.save_trip(trip_id, st.session_state.plan_df, st.session_state.buy_df,
+                                st.session_state.qqs_rate, store=shop)
+                st.session_state.trip_snap = {"id": trip_id, "rate": st.session_state.qqs_rate, "ops": 0}
+                st.session_state.priced_hash = priced_h
+            sp["rows"] = len(entries)
+    if st.session_state.get("priced_hash") != priced_h:
+        with prof.span("price_index"):
+            store.record_prices(priced, store=shop, trip_id=trip_id)
+            st.session_state.priced_hash = priced_h
+
 st.markdown("---")
 st.caption("© Bozorlik ilovasi — reja, chek va tahlil bitta joyda. QQS avtomatik ajratiladi.")
 
-
+# --- Profil natijasi: log + (ixtiyoriy) panel ---
+prof_record = prof.finish()
+if "profile_stats" not in st.session_state:
+    st.session_state.profile_stats = RollingStats(window=200)
+st.session_state.profile_stats.add(prof_record)
+if PROFILE_LOG:
+    append_jsonl(PROFILE_LOG, {"session": session_uid, **prof_record})
+if show_profile:
+    with st.sidebar:
+        st.markdown(f"**Oxirgi rerun: {prof_record['total_ms']:.1f} ms**")
+        st.dataframe(pd.DataFrame(prof_record["spans"], columns=["name", "ms", "rows", "bytes"]), hide_index=True)
+        st.markdown("**Oxirgi rerunlar (ms):**")
+        st.dataframe(pd.DataFrame(st.session_state.profile_stats.percentiles()), hide_index=True)
+        if prof_record["capture_file"]:
+            st.caption(f"Dump: `{prof_record['capture_file']}`")
+        if export_queue() is not None:
+            st.markdown("**Fon eksportlari (s):**")
+            st.dataframe(pd.DataFrame(export_queue().metrics(), columns=["name", "status", "wait_s", "run_s", "bytes", "cached"])
+                         .tail(20), hide_index=True)
+            st.caption(f"Disk keshi: {export_queue().cache.stats()['bytes'] / 2**20:.1f} MB")
@@ -0,0 +1 @@
+"""Bozorlik benchmarklari (`python -m benchmarks.<nom>`)."""
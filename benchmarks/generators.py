@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Sintetik reja/xarid jadvallari: COMMON_ITEMS + tasodifiy nomlar, takrorlanuvchan (seed)."""
+from __future__ import annotations
+
+import random
+import string
+
+from bozorlik.core import ALL_UNITS, BUY_COLS, COMMON_ITEMS, DEFAULT_CATEGORIES, PLAN_COLS, UNITS_FLOAT
+
+
+def random_names(n: int, seed: int = 0, known_share: float = 0.6) -> list:
+    """`known_share` qismi COMMON_ITEMS dan, qolgani tasodifiy ("Pomidor Xyz" kabi) nomlar."""
+    rng = random.Random(seed)
+    known = [k.title() for k in COMMON_ITEMS]
+    out = []
+    for _ in range(n):
+        if rng.random() < known_share:
+            out.append(rng.choice(known))
+        else:
+            word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+            out.append(f"{rng.choice(known)} {word}".title() if rng.random() < 0.3 else word.title())
+    return out
+
+
+def typo_names(names, seed: int = 0) -> list:
+    """Har bir nomda bitta harf almashtirilgan nusxa ("Pomidor" -> "Pamidor" kabi)."""
+    rng = random.Random(seed)
+    out = []
+    for name in names:
+        i = rng.randrange(len(name)) if name else 0
+        out.append(name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:])
+    return out
+
+
+def plan_rows(n: int, seed: int = 0) -> list:
+    """Eski uslubdagi list[dict] (parse_bulk_lines natijasi kabi)."""
+    rng = random.Random(seed)
+    rows = []
+    for name in random_names(n, seed):
+        unit, cat = COMMON_ITEMS.get(name.lower(), (rng.choice(ALL_UNITS), rng.choice(DEFAULT_CATEGORIES)))
+        qty = round(rng.uniform(0.1, 5), 3) if unit in UNITS_FLOAT else rng.randint(1, 10)
+        rows.append({"item": name, "category": cat, "unit": unit, "plan_qty": qty})
+    return rows
+
+
+def plan_df(n: int, seed: int = 0):
+    import pandas as pd
+    return pd.DataFrame(plan_rows(n, seed), columns=PLAN_COLS)
+
+
+def buy_df(n: int, seed: int = 0, bought_share: float = 0.7):
+    """Xom (hali recompute qilinmagan) xarid jadvali: editor chiqishiga o'xshash."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    df = plan_df(n, seed)
+    df["bought"] = rng.random(n) < bought_share
+    df["actual_qty"] = np.round(df["plan_qty"].to_numpy() * rng.uniform(0.5, 1.5, n), 3)
+    df["unit_price_gross"] = rng.integers(1, 500, n) * 500.0
+    for c in ["line_gross", "line_net", "line_vat"]:
+        df[c] = 0.0
+    return df[BUY_COLS]
+
+
+def bulk_text(n: int, seed: int = 0) -> str:
+    """parse_bulk_lines uchun aralash formatdagi matn."""
+    rng = random.Random(seed)
+    lines = []
+    for r in plan_rows(n, seed):
+        fmt = rng.randint(0, 2)
+        if fmt == 0:
+            lines.append(f"{r['item']}, {r['plan_qty']}, {r['unit']}, {r['category']}")
+        elif fmt == 1:
+            lines.append(f"{r['item']} {r['plan_qty']} {r['unit']}")
+        else:
+            lines.append(f"{r['item']} | {r['unit']} | {r['plan_qty']}")
+    return "\n".join(lines)
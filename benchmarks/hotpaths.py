@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Ilovaning issiq yo'llari bo'yicha benchmark: bulk parser, birlik/kategoriya tahmini,
+recompute_buy_df (qatorma-qator etalon bilan), TAB3 agregatsiyasi, nomlar indeksi, umumiy ro'yxat tahriri, undo jurnali, reja fayli importi va Excel eksport — 10 dan 100k qatorgacha.
+
+    $ python -m benchmarks.hotpaths --sizes 10 1000 100000 --json bench.json \\
+          --thresholds benchmarks/thresholds.json
+
+Natija JSON ga yoziladi; `--thresholds` (case@rows -> sekund) yoki `--baseline`
+(oldingi JSON, `--max-ratio` marta sekinlashuv) oshib ketsa chiqish kodi 1.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import generators as gen
+from bozorlik import charts, core, editlog, importer, names, shared, templates
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+
+def _setup_parse(n):
+    return gen.bulk_text(n)
+
+
+def _run_parse(text):
+    core.bulk_plan_frame(text)
+
+
+def _setup_infer(n):
+    import pandas as pd
+    return pd.Series(gen.random_names(n))
+
+
+def _run_infer_scalar(names):
+    # Sovuq kesh: har takrorda tozalanadi — birinchi import/rerun narxi
+    core._infer_unit_norm.cache_clear()
+    core._infer_category_norm.cache_clear()
+    for n in names:
+        core.infer_unit(n)
+        core.infer_category(n)
+
+
+def _run_infer_batch(names):
+    core._infer_unit_norm.cache_clear()
+    core._infer_category_norm.cache_clear()
+    core.infer_units(names)
+    core.infer_categories(names)
+
+
+def _setup_recompute(n):
+    return gen.buy_df(n)
+
+
+def _run_recompute(df):
+    core.recompute_buy_df(df, core.DEFAULT_QQS)
+
+
+def recompute_rowloop(df, qqs_rate):
+    """
+    recompute_buy_df ning dastlabki qatorma-qator (iterrows) varianti — tenglik testi va taqqoslash
+    uchun etalon. Qator summasi skalyar split_vat_from_gross bilan tiyinga keltiriladi.
+    """
+    out = df.copy()
+    for idx, row in out.iterrows():
+        unit = row["unit"]
+        out.at[idx, "plan_qty"] = core.coerce_qty(row["plan_qty"], unit)
+        out.at[idx, "bought"] = bool(row.get("bought", False))
+        out.at[idx, "actual_qty"] = core.coerce_qty(row.get("actual_qty", 0), unit)
+        up = float(row.get("unit_price_gross", 0) or 0)
+        out.at[idx, "unit_price_gross"] = max(0.0, up)
+
+        line_gross = (out.at[idx, "actual_qty"] * up) if out.at[idx, "bought"] else 0.0
+        net, vat = core.split_vat_from_gross(line_gross, qqs_rate)
+        out.at[idx, "line_gross"] = round(net + vat, 2)
+        out.at[idx, "line_net"] = net
+        out.at[idx, "line_vat"] = vat
+    return out
+
+
+def _run_recompute_rowloop(df):
+    recompute_rowloop(df, core.DEFAULT_QQS)
+
+
+def _setup_computed(n):
+    return core.recompute_buy_df(gen.buy_df(n), core.DEFAULT_QQS)
+
+
+def _run_tab3_groupby(df):
+    fakt = df[df["bought"]]
+    fakt.groupby("category", observed=True).agg(
+        items=("item", "count"),
+        qty=("actual_qty", "sum"),
+        net=("line_net", "sum"),
+        qqs=("line_vat", "sum"),
+        gross=("line_gross", "sum"),
+    ).sort_values("gross", ascending=False)
+
+
+def _run_tab3_totals(df):
+    totals = core.buy_totals(df)
+    core.category_totals_df(totals, core.DEFAULT_QQS)
+    core.summary_df(totals, core.DEFAULT_QQS)
+
+
+def _run_tab3_charts(df):
+    fakt = df[df["bought"]]
+    charts.top_items(fakt)
+    charts.price_histogram(fakt["unit_price_gross"], fakt["line_gross"])
+
+
+def _setup_name_match(n):
+    catalog = gen.random_names(n, known_share=0.0)
+    return names.NameIndex(catalog), gen.typo_names(catalog[:1000], seed=1)
+
+
+def _run_name_match(args):
+    idx, queries = args
+    for q in queries:
+        idx.match(q)
+
+
+def _setup_dedupe(n):
+    base = gen.random_names(n)
+    return base + gen.typo_names(base[: n // 10], seed=1)
+
+
+def _run_dedupe(items):
+    names.dedupe_names(items)
+
+
+def _setup_shared(n):
+    df = _setup_computed(n)
+    tmp = tempfile.TemporaryDirectory()
+    store = shared.SharedStore(os.path.join(tmp.name, "bench.db"))
+    list_id = store.create_list("bench", df, core.DEFAULT_QQS)
+    return {"store": store, "tmp": tmp, "id": list_id, "df": df, "totals": core.buy_totals(df),
+            "version": store.version(list_id), "i": 0}
+
+
+def _teardown_shared(state):
+    state["store"].close()
+    state["tmp"].cleanup()  # .db va uning -wal / -shm fayllari
+
+
+def _run_shared_edit(state):
+    # Bitta katak tahriri: commit + lenta + mahalliy jadvalga qo'llash
+    state["i"] += 1
+    rid = state["i"] % len(state["df"])
+    state["store"].commit(state["id"], state["version"], [(rid, "unit_price_gross", None, 100.0 * state["i"])])
+    feed, state["version"] = state["store"].changes(state["id"], state["version"])
+    state["df"] = shared.apply_changes(state["df"], feed, core.DEFAULT_QQS, state["totals"])
+
+
+def _setup_edit_log(n):
+    df = _setup_computed(n)
+    return {"log": editlog.EditLog({"buy": (df, core.BUY_INPUT_COLS)}), "i": 0}
+
+
+def _run_edit_log(state):
+    # Rerun oxiridagi yozuv (bitta katak) + undo + redo
+    log = state["log"]
+    state["i"] += 1
+    df = log.state["buy"]
+    edited = df.copy(deep=False)
+    edited["unit_price_gross"] = core.replace_at(df["unit_price_gross"], [state["i"] % len(df)], [100.0 * state["i"]])
+    log.record({"buy": edited})
+    log.undo()
+    log.redo()
+    log.drain()
+
+
+def _setup_import(n):
+    import io
+    return gen.plan_df(n).to_csv(index=False).encode("utf-8"), io.BytesIO
+
+
+def _run_import(args):
+    data, stream = args
+    importer.import_plan(stream(data), "plan.csv")
+
+
+def _setup_recurring(n):
+    tpl = templates.freeze(gen.plan_df(n))
+    return tpl, [{"name": f"oila_{i}", "size": 1 + i % 6} for i in range(100)]
+
+
+def _run_recurring(args):
+    # 100 oila: har bir hajm bitta miqyoslangan jadval, qolganlari sayoz nusxa
+    for _name, plan in templates.generate_plans(*args, base_size=2.0):
+        pass
+
+
+def _setup_excel(n):
+    df = _setup_computed(n)
+    totals = core.buy_totals(df)
+    return df, core.summary_df(totals, core.DEFAULT_QQS), core.category_totals_df(totals, core.DEFAULT_QQS)
+
+
+def _run_excel(args):
+    core.purchases_excel_bytes(*args)
+
+
+# name -> (setup(n), run(data), eng katta qator soni (None — cheklovsiz))
+CASES = {
+    "parse_bulk_lines": (_setup_parse, _run_parse, None),
+    "infer_scalar": (_setup_infer, _run_infer_scalar, None),
+    "infer_batch": (_setup_infer, _run_infer_batch, None),
+    "recompute_buy_df": (_setup_recompute, _run_recompute, None),
+    "recompute_rowloop": (_setup_recompute, _run_recompute_rowloop, 10_000),
+    "tab3_groupby": (_setup_computed, _run_tab3_groupby, None),
+    "tab3_totals": (_setup_computed, _run_tab3_totals, None),
+    "tab3_charts": (_setup_computed, _run_tab3_charts, None),
+    "name_match_1000": (_setup_name_match, _run_name_match, None),
+    "dedupe_names": (_setup_dedupe, _run_dedupe, None),
+    "shared_edit": (_setup_shared, _run_shared_edit, None),
+    "edit_log": (_setup_edit_log, _run_edit_log, None),
+    "plan_import_csv": (_setup_import, _run_import, None),
+    "recurring_plans": (_setup_recurring, _run_recurring, None),
+    "purchases_excel_bytes": (_setup_excel, _run_excel, 20_000),
+}
+# Vaqtinchalik resurslari bor holatlar: o'lchovdan keyin tozalanadi
+TEARDOWN = {"shared_edit": _teardown_shared}
+
+
+def measure(fn, data, min_repeats: int = 3, max_repeats: int = 15, budget_s: float = 0.5) -> list:
+    """Kamida `min_repeats`, vaqt byudjeti qolsa `max_repeats` gacha takrorlaydi."""
+    fn(data)  # isitish: lazy importlar, regex kompilyatsiyasi
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeats and (len(times) < min_repeats or time.perf_counter() - start < budget_s):
+        t0 = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def run(sizes, cases=None, full: bool = False) -> dict:
+    import numpy as np
+    import pandas as pd
+    results = []
+    for name in cases or CASES:
+        setup, fn, max_rows = CASES[name]
+        for n in sizes:
+            if max_rows is not None and n > max_rows and not full:
+                continue
+            data = setup(n)
+            try:
+                times = measure(fn, data)
+            finally:
+                if name in TEARDOWN:
+                    TEARDOWN[name](data)
+            results.append({
+                "case": name,
+                "rows": n,
+                "min_s": min(times),
+                "median_s": statistics.median(times),
+                "repeats": len(times),
+            })
+            print(f"{name:<24} {n:>8} rows  min {min(times) * 1e3:10.2f} ms  "
+                  f"median {statistics.median(times) * 1e3:10.2f} ms", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def check(report: dict, thresholds: dict | None = None, baseline: dict | None = None, max_ratio: float = 1.5) -> list:
+    """Buzilishlar ro'yxati: absolyut chegara (min_s) yoki bazaga nisbatan sekinlashuv."""
+    failures = []
+    base = {(r["case"], r["rows"]): r for r in (baseline or {}).get("results", [])}
+    for r in report["results"]:
+        key = f"{r['case']}@{r['rows']}"
+        limit = (thresholds or {}).get(key)
+        if limit is not None and r["min_s"] > limit:
+            failures.append(f"{key}: {r['min_s']:.4f}s > {limit}s")
+        prev = base.get((r["case"], r["rows"]))
+        if prev is not None and r["min_s"] > prev["min_s"] * max_ratio:
+            failures.append(f"{key}: {r['min_s']:.4f}s > {max_ratio}x baseline {prev['min_s']:.4f}s")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="Faqat shu holatlar")
+    parser.add_argument("--full", action="store_true", help="Holatlar uchun qator cheklovlarini e'tiborsiz qoldirish")
+    parser.add_argument("--json", help="Natijani JSON faylga yozish")
+    parser.add_argument("--thresholds", help="case@rows -> maksimal sekund (JSON)")
+    parser.add_argument("--baseline", help="Taqqoslash uchun oldingi natija (JSON)")
+    parser.add_argument("--max-ratio", type=float, default=1.5, help="Bazaga nisbatan ruxsat etilgan sekinlashuv")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.cases, args.full)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    thresholds = baseline = None
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    failures = check(report, thresholds, baseline, args.max_ratio)
+    for msg in failures:
+        print(f"REGRESSIYA {msg}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
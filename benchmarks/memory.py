@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Sessiya xotirasi: eski (object ustunlar, aralash dtypelar) va yangi sxema
+(categorical + float64 + bool) bo'yicha plan_df + buy_df ning chuqur hajmi.
+
+    $ python -m benchmarks.memory --rows 1000 10000 100000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+
+from benchmarks import generators as gen
+from bozorlik.core import BUY_COLS, apply_plan_schema, recompute_buy_df
+
+
+def legacy_frames(n: int):
+    """Avvalgi state-init: object ustunlar, `df0[c] = 0` bilan int ustunlar."""
+    import pandas as pd
+    plan = pd.DataFrame(gen.plan_rows(n), columns=BUY_COLS[:4]).astype({"item": object, "category": object, "unit": object})
+    buy = plan.copy()
+    for c in ["bought", "actual_qty", "unit_price_gross", "line_gross", "line_net", "line_vat"]:
+        buy[c] = 0
+    buy["bought"] = False
+    return plan, buy[BUY_COLS]
+
+
+def schema_frames(n: int):
+    plan = apply_plan_schema(gen.plan_df(n))
+    buy = recompute_buy_df(gen.buy_df(n), 12.0)
+    return plan, buy
+
+
+def deep_bytes(*frames) -> int:
+    return int(sum(f.memory_usage(deep=True, index=True).sum() for f in frames))
+
+
+def run(sizes) -> list:
+    results = []
+    for n in sizes:
+        old = deep_bytes(*legacy_frames(n))
+        new = deep_bytes(*schema_frames(n))
+        results.append({"rows": n, "legacy_bytes": old, "schema_bytes": new, "ratio": round(old / new, 2)})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args(argv)
+    for r in run(args.rows):
+        print(json.dumps(r))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
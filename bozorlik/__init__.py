@@ -0,0 +1 @@
+"""Bozorlik: reja → xarid → tahlil mantiqi (UI'siz). Streamlit ilovasi — app_bozorlik.py."""
@@ -0,0 +1,4 @@
+"""`python -m bozorlik ...` — CLI kirish nuqtasi."""
+from bozorlik.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+TAB3 grafiklari uchun ma'lumot qatlami: serverda oldindan agregatsiya va Vega-Lite spec keshi.
+
+Grafikka xom chek qatorlari berilmaydi — har biri chegaralangan jadval oladi:
+eng katta N ta mahsulot + "Boshqalar", narxlar gistogrammasi (bin lar), kategoriyalar.
+Spec (inline ma'lumot bilan) ma'lumot xeshi bo'yicha keshlanadi, shuning uchun chek
+hajmidan qat'i nazar sahifaga ko'pi bilan CHART_MAX_ROWS qator joylanadi.
+
+altair ixtiyoriy: yo'q bo'lsa `available()` False qaytaradi.
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+from typing import TYPE_CHECKING
+
+from bozorlik.reports import report_key
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from bozorlik.reports import ReportCache
+
+CHART_MAX_ROWS = 200  # bitta grafikka joylanadigan qatorlar chegarasi
+TOP_N = 15
+PRICE_BINS = 20
+MAX_SLICES = 10
+OTHER_LABEL = "Boshqalar"
+
+
+def available() -> bool:
+    return importlib.util.find_spec("altair") is not None
+
+
+# --- Agregatsiya (pandas/numpy, altair'siz) ---
+def top_items(fakt: pd.DataFrame, n: int = TOP_N) -> pd.DataFrame:
+    """Mahsulot (nom + birlik) bo'yicha Gross: eng katta `n` tasi va qolganlari bitta "Boshqalar" qatorida."""
+    import pandas as pd
+    g = fakt.groupby(["item", "unit"], observed=True, sort=False).agg(
+        gross=("line_gross", "sum"),
+        lines=("line_gross", "size"),
+        price=("unit_price_gross", "median"),
+    )
+    head = g.nlargest(n, "gross").reset_index()
+    out = pd.DataFrame({
+        "label": head["item"].astype(str) + " (" + head["unit"].astype(str) + ")",
+        "gross": head["gross"],
+        "lines": head["lines"],
+        "price": head["price"],
+    })
+    rest = len(g) - len(head)
+    if rest > 0:
+        other = {"label": f"{OTHER_LABEL} ({rest} ta)", "gross": float(g["gross"].sum() - head["gross"].sum()),
+                 "lines": int(g["lines"].sum() - head["lines"].sum()), "price": float("nan")}
+        out = pd.concat([out, pd.DataFrame([other])], ignore_index=True)
+    return out
+
+
+def price_histogram(prices, weights=None, bins: int = PRICE_BINS) -> pd.DataFrame:
+    """
+    Birlik narxlar taqsimoti: `bins` ta oraliq (narxlar 50 martadan ko'p farq qilsa — logarifmik).
+    Qaytadi: start, end, label, count, gross (oraliqdagi qatorlar Gross yig'indisi).
+    """
+    import numpy as np
+    import pandas as pd
+    p = pd.to_numeric(pd.Series(prices), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    w = np.zeros_like(p) if weights is None else pd.to_numeric(pd.Series(weights), errors="coerce").to_numpy(
+        dtype="float64", na_value=0.0)
+    ok = np.isfinite(p) & (p > 0)
+    p, w = p[ok], w[ok]
+    cols = ["start", "end", "label", "count", "gross"]
+    if len(p) == 0:
+        return pd.DataFrame(columns=cols)
+    lo, hi = float(p.min()), float(p.max())
+    if hi <= lo:
+        edges = np.array([lo, lo + 1.0])
+    elif hi / lo > 50:
+        edges = np.geomspace(lo, hi, bins + 1)
+    else:
+        edges = np.linspace(lo, hi, bins + 1)
+    count, _ = np.histogram(p, edges)
+    gross, _ = np.histogram(p, edges, weights=w)
+    out = pd.DataFrame({"start": edges[:-1], "end": edges[1:], "count": count, "gross": gross})
+    out["label"] = [f"{a:,.0f}–{b:,.0f}".replace(",", " ") for a, b in zip(out["start"], out["end"])]
+    return out[cols]
+
+
+def category_slices(cat_df: pd.DataFrame, max_slices: int = MAX_SLICES) -> pd.DataFrame:
+    """Doiraviy diagramma uchun: eng katta kategoriyalar, qolganlari "Boshqalar" bo'lagida."""
+    import pandas as pd
+    cols = ["category", "gross", "net", "qqs", "qty"]
+    cat = cat_df[cols].sort_values("gross", ascending=False)
+    if len(cat) <= max_slices:
+        return cat.reset_index(drop=True)
+    head, tail = cat.iloc[:max_slices - 1], cat.iloc[max_slices - 1:]
+    other = {"category": f"{OTHER_LABEL} ({len(tail)} ta)", **tail[cols[1:]].sum().to_dict()}
+    return pd.concat([head, pd.DataFrame([other])], ignore_index=True)
+
+
+def recent_periods(roll: pd.DataFrame, max_rows: int = CHART_MAX_ROWS) -> pd.DataFrame:
+    """Davriy yig'indilardan eng so'nggi davrlar — jami qatorlar `max_rows` dan oshmaydi."""
+    sizes = roll.groupby("period", sort=True).size().iloc[::-1].cumsum()
+    keep = sizes.index[:max(1, int((sizes <= max_rows).sum()))]
+    return roll[roll["period"].isin(keep)]
+
+
+# --- Vega-Lite spec lar ---
+def _pie(data):
+    import altair as alt
+    return alt.Chart(data).mark_arc().encode(
+        theta="gross:Q", color=alt.Color("category:N", sort=None), tooltip=["category", "gross", "net", "qqs", "qty"]
+    )
+
+
+def _top_items(data):
+    import altair as alt
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X("label:N", sort=None, title="Mahsulot"), y=alt.Y("gross:Q", title="Gross"),
+        tooltip=["label", "gross", "lines", "price"],
+    )
+
+
+def _price_hist(data):
+    import altair as alt
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X("label:N", sort=None, title="Birlik narx (Gross)"), y=alt.Y("count:Q", title="Qatorlar"),
+        tooltip=["label", "count", "gross"],
+    )
+
+
+def _rollup(data):
+    import altair as alt
+    return alt.Chart(data).mark_bar().encode(
+        x="period:N", y="gross:Q", color="category:N", tooltip=["period", "category", "gross", "vat", "trips"]
+    )
+
+
+BUILDERS = {"category_pie": _pie, "top_items": _top_items, "price_hist": _price_hist, "rollup": _rollup}
+
+
+def chart_spec(kind: str, data: pd.DataFrame, cache: ReportCache | None = None,
+               max_rows: int = CHART_MAX_ROWS) -> dict:
+    """
+    Vega-Lite spec (ma'lumot ichida). Jadval `max_rows` bilan kesiladi; spec JSON i
+    kind + ma'lumot xeshi bo'yicha keshlanadi — o'zgarmagan grafik qayta qurilmaydi.
+    """
+    data = data.head(max_rows)
+
+    def build():
+        return json.dumps(BUILDERS[kind](data).to_dict(), ensure_ascii=False).encode("utf-8")
+
+    raw = build() if cache is None else cache.get_or_build(report_key(f"chart-{kind}", data), build)
+    return json.loads(raw)
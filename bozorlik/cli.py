@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Bozorlik CLI: UI'siz ommaviy qayta ishlash.
+
+    $ python -m bozorlik reprocess data/cheklar/ --qqs 12 --out hisobot/ --jobs 8
+    $ python -m bozorlik import-plan ta'minot.xlsx --out reja.csv --report xatolar.csv
+    $ python -m bozorlik recurring oilalar.csv --template Haftalik --history --out rejalar/
+    $ python -m bozorlik reports --grain month --format xlsx --jobs 4 --out hisobotlar/
+
+Reja va chek fayllari (CSV, Parquet yoki Arrow IPC; katalog, glob yoki fayl yo'li)
+protsesslar hovuziga taqsimlanadi; har bir fayl `recompute_buy_df` bilan qayta
+hisoblanadi va TAB3 dagi kategoriya hamda umumiy jadvallar yoziladi.
+`import-plan` katta reja faylini bo'laklab tekshiradi (bozorlik.importer): toza reja va
+rad etilgan / tuzatilgan qatorlar hisoboti alohida yoziladi.
+`recurring` shablondan (bozorlik.templates) har bir oila (CSV: name,size) uchun reja fayli yozadi.
+`reports` saqlangan safarlardan har bir davr (oy/hafta/yil) uchun hisobotni protsesslar
+navbatida (bozorlik.jobs) quradi; har vazifa kutish/ishlash vaqti jobs.csv ga yoziladi.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from bozorlik.core import DEFAULT_QQS
+from bozorlik.storage import DEFAULT_DB_PATH
+
+INPUT_SUFFIXES = (".csv", ".parquet", ".arrow", ".feather")
+
+
+def expand_inputs(paths) -> list:
+    """Katalog (*.csv, *.parquet, *.arrow), glob andoza yoki fayl yo'llarini tartiblangan ro'yxatga aylantiradi."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(f for f in glob.glob(os.path.join(p, "*")) if f.lower().endswith(INPUT_SUFFIXES))
+        elif glob.has_magic(p):
+            files.extend(glob.glob(p, recursive=True))
+        elif os.path.isfile(p):
+            files.append(p)
+    return sorted(set(files))
+
+
+def output_stems(files) -> list:
+    """
+    Har bir fayl natijalari uchun nom. Odatda fayl nomi; nomlar to'qnashsa (rekursiv glob:
+    a/chek.csv va b/chek.csv) — umumiy katalogga nisbatan yo'l, `a__chek`. Shunda ham
+    takrorlansa (chek.csv va chek.parquet) kengaytma qo'shiladi: `a__chek_csv`.
+    """
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    if len(set(stems)) == len(stems):
+        return stems
+    paths = [os.path.abspath(f) for f in files]
+    root = os.path.commonpath([os.path.dirname(f) for f in paths])
+    rel = [os.path.relpath(f, root).replace(os.sep, "__") for f in paths]
+    count = Counter(stems)
+    stems = [os.path.splitext(r)[0] if count[s] > 1 else s for s, r in zip(stems, rel)]
+    count = Counter(stems)
+    stems = [r.replace(".", "_") if count[s] > 1 else s for s, r in zip(stems, rel)]
+    dup = sorted(s for s, n in Counter(stems).items() if n > 1)
+    if dup:
+        raise ValueError(f"natija nomlari takrorlanadi: {', '.join(dup)}")
+    return stems
+
+
+def read_buy_file(path: str):
+    """
+    Reja yoki chek fayli (CSV, Parquet yoki Arrow IPC) -> (kind, BUY_COLS jadvali).
+    Ustunli fayllar xotiraga akslantirib o'qiladi.
+    """
+    from bozorlik import columnar
+    from bozorlik.core import normalize_buy_frame
+    if columnar.format_of(path):
+        df, _ = columnar.read_frame(path)
+    else:
+        import pandas as pd
+        df = pd.read_csv(path)
+    return normalize_buy_frame(df)
+
+
+def _write_table(df, out_dir: str, stem: str, fmt: str) -> None:
+    if fmt == "csv":
+        df.to_csv(os.path.join(out_dir, f"{stem}.csv"), index=False)
+    else:
+        from bozorlik import columnar
+        columnar.write_file(df, os.path.join(out_dir, stem + columnar.FORMATS[fmt][0]))
+
+
+def process_file(path: str, qqs_rate: float, out_dir: str, fmt: str = "csv", stem: str | None = None) -> dict:
+    """
+    Bitta faylni qayta hisoblaydi va <stem>_by_category / <stem>_summary ni `fmt` formatida yozadi
+    (`stem` berilmasa — fayl nomi; bir nechta fayl uchun `output_stems`).
+    """
+    from bozorlik.core import buy_totals, category_totals_df, money_totals, recompute_buy_df, summary_df
+
+    t0 = time.perf_counter()
+    stem = stem or os.path.splitext(os.path.basename(path))[0]
+    try:
+        kind, df = read_buy_file(path)
+    except Exception as e:
+        return {"file": path, "output": stem, "kind": "error", "rows": 0, "error": str(e),
+                "seconds": time.perf_counter() - t0}
+    buy_df = recompute_buy_df(df, qqs_rate)
+    totals = buy_totals(buy_df)
+    cat = category_totals_df(totals, qqs_rate)
+    _write_table(cat, out_dir, f"{stem}_by_category", fmt)
+    _write_table(summary_df(totals, qqs_rate), out_dir, f"{stem}_summary", fmt)
+    return {
+        "file": path,
+        "output": stem,
+        "kind": kind,
+        "rows": int(len(buy_df)),
+        "items": int(totals["items"]),
+        **money_totals(totals, qqs_rate),
+        "by_cat": cat.to_dict("records"),
+        "error": "",
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def _process_star(args):
+    return process_file(*args)
+
+
+def reprocess(files, qqs_rate: float, out_dir: str, jobs: int = 0, fmt: str = "csv"):
+    """
+    Fayllarni `jobs` ta protsessga taqsimlaydi (0 — CPU soni, 1 — hovuzsiz).
+    Natija nomlari `output_stems` bilan — bir xil nomli fayllar bir-birini ustidan yozmaydi.
+    Qaytadi: (natijalar ro'yxati, sekundlar).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    tasks = [(f, qqs_rate, out_dir, fmt, stem) for f, stem in zip(files, output_stems(files))]
+    t0 = time.perf_counter()
+    if jobs == 1 or len(tasks) <= 1:
+        results = [_process_star(t) for t in tasks]
+    else:
+        # Kichik fayllar ko'p bo'lsa IPC narxini chunksize bilan kamaytiramiz
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_process_star, tasks, chunksize=chunksize))
+    return results, time.perf_counter() - t0
+
+
+def write_rollup(results, out_dir: str) -> None:
+    """Barcha fayllar bo'yicha files.csv va all_by_category.csv."""
+    import pandas as pd
+    from bozorlik.core import TIYIN, to_tiyin
+    files = pd.DataFrame(
+        [{k: r.get(k) for k in ["file", "output", "kind", "rows", "items", "net", "vat", "gross", "error", "seconds"]}
+         for r in results]
+    )
+    files.to_csv(os.path.join(out_dir, "files.csv"), index=False)
+    cats = [c for r in results for c in r.get("by_cat", [])]
+    if cats:
+        # Pul ustunlari tiyinda (butun son) yig'iladi — natija fayllar tartibiga bog'liq emas
+        money = ["net", "qqs", "gross"]
+        all_cat = pd.DataFrame(cats)
+        all_cat[money] = all_cat[money].apply(to_tiyin)
+        all_cat = (
+            all_cat.groupby("category", as_index=False)[["items", "qty", *money]].sum()
+            .sort_values("gross", ascending=False)
+        )
+        all_cat[money] = all_cat[money] / TIYIN
+    else:
+        all_cat = pd.DataFrame(columns=["category", "items", "qty", "net", "qqs", "gross"])
+    all_cat.to_csv(os.path.join(out_dir, "all_by_category.csv"), index=False)
+
+
+def _cmd_reprocess(args) -> int:
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("CSV fayl topilmadi", file=sys.stderr)
+        return 2
+    try:
+        results, secs = reprocess(files, args.qqs, args.out, args.jobs, args.format)
+    except ValueError as e:
+        print(f"XATO: {e}", file=sys.stderr)
+        return 2
+    write_rollup(results, args.out)
+    errors = [r for r in results if r["error"]]
+    for r in errors:
+        print(f"XATO {r['file']}: {r['error']}", file=sys.stderr)
+    rows = sum(r["rows"] for r in results)
+    secs = max(secs, 1e-9)
+    print(
+        f"{len(files)} fayl, {rows} qator, {secs:.2f} s — "
+        f"{len(files) / secs:.1f} fayl/s, {rows / secs:.0f} qator/s → {args.out}",
+        file=sys.stderr,
+    )
+    return 1 if errors else 0
+
+
+def _cmd_import_plan(args) -> int:
+    from bozorlik.importer import import_plan
+    try:
+        res = import_plan(args.input, chunk_rows=args.chunk_rows)
+    except ValueError as e:
+        print(f"XATO {args.input}: {e}", file=sys.stderr)
+        return 2
+    for path in filter(None, [args.out, args.report]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if args.out.lower().endswith(".csv"):
+        res["plan"].to_csv(args.out, index=False)
+    else:
+        from bozorlik import columnar
+        columnar.write_file(res["plan"], args.out)
+    if args.report:
+        res["report"].to_csv(args.report, index=False)
+    print(
+        f"{res['rows']} qator, {res['seconds']:.2f} s — {res['rows_per_s']:.0f} qator/s: "
+        f"{res['accepted']} qabul, {res['rejected']} rad etildi, {res['fixed']} tuzatildi → {args.out}",
+        file=sys.stderr,
+    )
+    return 1 if res["rejected"] and args.strict else 0
+
+
+def _cmd_recurring(args) -> int:
+    import pandas as pd
+
+    from bozorlik.templates import BUILTIN_NAME, HISTORY_TRIPS, builtin_template, freeze, generate_plans
+    t0 = time.perf_counter()
+    households = pd.read_csv(args.households).to_dict("records")
+    if not households or "name" not in households[0]:
+        print(f"XATO {args.households}: 'name' (va 'size') ustunlari kerak", file=sys.stderr)
+        return 2
+    store = None
+    if args.template != BUILTIN_NAME or args.history:
+        from bozorlik.storage import TripStore
+        store = TripStore(args.db)
+    base = args.base_size
+    if args.template == BUILTIN_NAME:
+        tpl = freeze(builtin_template())
+    else:
+        meta = {t["name"]: t for t in store.list_templates()}.get(args.template)
+        if meta is None:
+            print(f"XATO: «{args.template}» shabloni topilmadi", file=sys.stderr)
+            return 2
+        tpl = freeze(store.load_template(args.template, args.version or meta["version"]))
+        base = base or meta["household"]
+    typical = store.typical_quantities(HISTORY_TRIPS) if args.history else None
+    os.makedirs(args.out, exist_ok=True)
+    n = 0
+    for name, plan in generate_plans(tpl, households, base or 1.0, typical):
+        stem = re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or f"oila_{n + 1}"
+        _write_table(plan, args.out, stem, args.format)
+        n += 1
+    print(f"{n} reja ({len(tpl)} qatorli «{args.template}» shablonidan), {time.perf_counter() - t0:.2f} s → {args.out}",
+          file=sys.stderr)
+    return 0
+
+
+def write_period_report(buy_df, qqs_rate: float, fmt: str, path: str) -> str:
+    """Navbat ishchisi: bitta davr hisobotini quradi va faylga yozadi."""
+    from bozorlik.reports import report_bytes
+    with open(path, "wb") as f:
+        f.write(report_bytes(buy_df, qqs_rate, fmt))
+    return path
+
+
+def _cmd_reports(args) -> int:
+    import pandas as pd
+
+    from bozorlik import columnar
+    from bozorlik.core import apply_buy_schema
+    from bozorlik.jobs import FAILED, JobQueue
+    from bozorlik.storage import TripStore
+    store = TripStore(args.db)
+    periods = store.period_trips(args.grain, args.since or None, args.until or None)
+    if not periods:
+        print("Saqlangan safarlar topilmadi", file=sys.stderr)
+        return 2
+    os.makedirs(args.out, exist_ok=True)
+    ext = ".xlsx" if args.format == "xlsx" else columnar.FORMATS[args.format][0]
+    t0 = time.perf_counter()
+    queue = JobQueue(max_workers=args.jobs or os.cpu_count() or 1, processes=args.jobs != 1)
+    names = {}
+    for period, trips in periods.items():
+        buy_df = apply_buy_schema(pd.concat([store.load_buy(t) for t, _ in trips], ignore_index=True))
+        # Davrda stavkalar turlicha bo'lsa — eng ko'p uchragani (qator qiymatlari saqlanganicha)
+        rate = statistics.mode(r for _, r in trips)
+        path = os.path.join(args.out, f"hisobot_{period}{ext}")
+        names[queue.submit(period, write_period_report, buy_df, rate, args.format, path, name=path).key] = path
+    jobs = queue.wait()
+    queue.shutdown()
+    secs = max(time.perf_counter() - t0, 1e-9)
+    metrics = pd.DataFrame([{**j.metrics(), "period": j.key} for j in jobs])
+    metrics["bytes"] = [os.path.getsize(p) if os.path.exists(p) else 0 for p in metrics["name"]]
+    metrics[["period", "name", "status", "wait_s", "run_s", "bytes", "error"]].to_csv(
+        os.path.join(args.out, "jobs.csv"), index=False)
+    failed = [j for j in jobs if j.status == FAILED]
+    for j in failed:
+        print(f"XATO {j.key}: {j.error}", file=sys.stderr)
+    stats = queue.stats()
+    print(
+        f"{len(jobs)} hisobot, {secs:.2f} s — {len(jobs) / secs:.1f} hisobot/s "
+        f"({queue.max_workers} ishchi; ishlash median {stats['run_s_median'] or 0:.2f} s, "
+        f"kutish maks {stats['wait_s_max'] or 0:.2f} s) → {args.out}",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bozorlik", description="Bozorlik — UI'siz vositalar")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("reprocess", help="Reja/chek CSV larini qayta hisoblash va tahlil jadvallarini yozish")
+    p.add_argument("inputs", nargs="+", help="Katalog, glob (masalan 'cheklar/**/*.csv') yoki fayl (CSV/Parquet/Arrow)")
+    p.add_argument("--qqs", type=float, default=DEFAULT_QQS, help=f"QQS stavkasi, %% (standart: {DEFAULT_QQS})")
+    p.add_argument("--out", default="bozorlik_out", help="Natija katalogi")
+    p.add_argument("--format", choices=["csv", "parquet", "arrow"], default="csv",
+                   help="Har bir fayl natijalari formati (parquet/arrow uchun pyarrow kerak)")
+    p.add_argument("--jobs", type=int, default=0, help="Protsesslar soni (0 — CPU soni, 1 — hovuzsiz)")
+    p.set_defaults(func=_cmd_reprocess)
+
+    p = sub.add_parser("import-plan", help="Reja faylini (CSV/Excel/Parquet/Arrow) bo'laklab tekshirish va tozalash")
+    p.add_argument("input", help="Reja fayli: .csv, .xlsx, .parquet yoki .arrow")
+    p.add_argument("--out", default="reja.csv", help="Toza reja (.csv, .parquet yoki .arrow)")
+    p.add_argument("--report", default="", help="Rad etilgan / tuzatilgan qatorlar hisoboti (CSV)")
+    p.add_argument("--chunk-rows", type=int, default=50_000, help="Bo'lak hajmi (pandas / Excel o'quvchisi uchun)")
+    p.add_argument("--strict", action="store_true", help="Rad etilgan qator bo'lsa chiqish kodi 1")
+    p.set_defaults(func=_cmd_import_plan)
+
+    p = sub.add_parser("recurring", help="Shablondan har bir oila uchun takrorlanuvchi reja fayllari")
+    p.add_argument("households", help="Oilalar CSV: name, size (kishi soni)")
+    p.add_argument("--template", default="Standart", help="Shablon nomi (standart: ichki «Standart»)")
+    p.add_argument("--version", type=int, default=0, help="Shablon versiyasi (0 — oxirgisi)")
+    p.add_argument("--base-size", type=float, default=0.0,
+                   help="Shablon necha kishilik (0 — shablonda saqlangani, ichki shablon uchun 1)")
+    p.add_argument("--history", action="store_true", help="Miqdorlar oxirgi safarlardagi odatiy xariddan")
+    p.add_argument("--db", default=DEFAULT_DB_PATH, help="Safarlar bazasi (shablonlar va tarix)")
+    p.add_argument("--out", default="rejalar", help="Natija katalogi")
+    p.add_argument("--format", choices=["csv", "parquet", "arrow"], default="csv", help="Reja fayllari formati")
+    p.set_defaults(func=_cmd_recurring)
+
+    p = sub.add_parser("reports", help="Saqlangan safarlardan davriy (oylik) hisobotlarni parallel qurish")
+    p.add_argument("--db", default=DEFAULT_DB_PATH, help="Safarlar bazasi")
+    p.add_argument("--grain", choices=["week", "month", "year"], default="month", help="Davr")
+    p.add_argument("--since", default="", help="Birinchi davr (masalan 2026-01)")
+    p.add_argument("--until", default="", help="Oxirgi davr")
+    p.add_argument("--format", choices=["xlsx", "parquet", "arrow"], default="xlsx", help="Hisobot formati")
+    p.add_argument("--jobs", type=int, default=0, help="Bir vaqtda quriladigan hisobotlar (0 — CPU soni, 1 — bitta fon oqimi)")
+    p.add_argument("--out", default="hisobotlar", help="Natija katalogi (hisobot_<davr>.* va jobs.csv)")
+    p.set_defaults(func=_cmd_reports)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Ustunli formatlar: Parquet va Arrow IPC (Feather v2) — reja, chek va hisobot uchun.
+
+CSV/Excel dan farqli ravishda matnga kodlash yo'q: jadval Arrow buferlaridan to'g'ridan-
+to'g'ri yoziladi, categorical ustunlar lug'at (dictionary) sifatida saqlanadi. Fayldan
+o'qishda `memory_map` ishlatiladi — arxivdagi katta safarlar diskdan nusxalanmay ochiladi.
+
+pyarrow ixtiyoriy: yo'q bo'lsa `available()` False qaytaradi, funksiyalar ImportError beradi.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# format -> (fayl kengaytmasi, MIME)
+FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+_SUFFIXES = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+# Hisobot jadvali sxemasidagi metama'lumot kalitlari prefiksi
+META_PREFIX = "bozorlik."
+
+
+def available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def format_of(name: str) -> str | None:
+    """Fayl nomi kengaytmasi bo'yicha format ("parquet" / "arrow") yoki None."""
+    return _SUFFIXES.get(os.path.splitext(str(name))[1].lower())
+
+
+def _table(df: pd.DataFrame, metadata: dict | None = None):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        meta = dict(table.schema.metadata or {})
+        meta.update({(META_PREFIX + k).encode("utf-8"): str(v).encode("utf-8") for k, v in metadata.items()})
+        table = table.replace_schema_metadata(meta)
+    return table
+
+
+def _write(table, sink, fmt: str) -> None:
+    import pyarrow as pa
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink, compression="zstd")
+    elif fmt == "arrow":
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"noma'lum format: {fmt}")
+
+
+def to_bytes(df: pd.DataFrame, fmt: str, metadata: dict | None = None) -> bytes:
+    """DataFrame -> Parquet / Arrow IPC baytlari (Arrow xotira buferiga yoziladi)."""
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    _write(_table(df, metadata), sink, fmt)
+    return sink.getvalue().to_pybytes()
+
+
+def write_file(df: pd.DataFrame, path: str, metadata: dict | None = None) -> None:
+    """Kengaytma bo'yicha formatda to'g'ridan-to'g'ri faylga yozadi."""
+    fmt = format_of(path)
+    if fmt is None:
+        raise ValueError(f"kengaytma tanilmadi: {path}")
+    _write(_table(df, metadata), path, fmt)
+
+
+def read_frame(source, fmt: str | None = None, memory_map: bool = True):
+    """
+    Fayl yo'li, bytes yoki fayl-obyekt (masalan, Streamlit UploadedFile) dan o'qiydi.
+    Yo'l berilsa fayl xotiraga akslantiriladi. Qaytadi: (DataFrame, metadata dict).
+    """
+    import pyarrow as pa
+    if fmt is None:
+        fmt = format_of(source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", ""))
+    if fmt not in FORMATS:
+        raise ValueError("format aniqlanmadi (.parquet yoki .arrow kutiladi)")
+    if isinstance(source, (str, os.PathLike)):
+        src = pa.memory_map(os.fspath(source)) if memory_map else os.fspath(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        src = pa.BufferReader(source)
+    else:
+        src = pa.BufferReader(source.read())
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(src)
+    else:
+        table = pa.ipc.open_file(src).read_all()
+    meta = {
+        k.decode("utf-8")[len(META_PREFIX):]: v.decode("utf-8")
+        for k, v in (table.schema.metadata or {}).items()
+        if k.decode("utf-8", "replace").startswith(META_PREFIX)
+    }
+    return table.to_pandas(), meta
@@ -0,0 +1,1044 @@
+# -*- coding: utf-8 -*-
+"""
+Bozorlik yadrosi: Streamlit'siz biznes-mantiq (reja, chek, QQS, eksport).
+
+Import paytida UI ham, og'ir kutubxonalar ham yuklanmaydi — pandas/numpy/xlsxwriter
+funksiyalar ichida, birinchi chaqiruvda import qilinadi. Shu sababli cron/CLI
+skriptlari `import bozorlik.core` ni millisekundlarda bajaradi.
+"""
+from __future__ import annotations
+
+import io
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from bozorlik.names import canonical_key
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# --- Constants & helpers ---
+DEFAULT_QQS = 12.0  # %
+UNITS_FLOAT = {"kg", "litr"}
+UNITS_INT = {"dona", "karobka"}
+ALL_UNITS = ["kg", "litr", "dona", "karobka", "bog'", "qadoq", "pachka"]
+
+DEFAULT_CATEGORIES = [
+    "Meva-sabzavot",
+    "Quruq oziq-ovqat",
+    "Ichimliklar",
+    "Go'sht mahsulotlari",
+    "Sut mahsulotlari",
+    "Shirinliklar",
+    "Non & bakery",
+    "Uy-ro'zg'or",
+    "Boshqa",
+]
+
+# Tez tanlash uchun bir nechta tayyor mahsulotlar (unit + default category)
+COMMON_ITEMS = {
+    # --- Meva-sabzavotlar ---
+    "piyoz": ("kg", "Meva-sabzavot"),
+    "sabzi (qizil)": ("kg", "Meva-sabzavot"),
+    "sabzi (sariq)": ("kg", "Meva-sabzavot"),
+    "qovoq": ("dona", "Meva-sabzavot"),
+    "baqlajon": ("kg", "Meva-sabzavot"),
+    "kabachki": ("kg", "Meva-sabzavot"),
+    "bolgarskiy (qizil)": ("kg", "Meva-sabzavot"),
+    "bolgarskiy (yashil)": ("kg", "Meva-sabzavot"),
+    "pomidor": ("kg", "Meva-sabzavot"),
+    "zelen (ko'kat)": ("bog'", "Meva-sabzavot"),
+    "chesnok": ("kg", "Meva-sabzavot"),
+    "karam": ("dona", "Meva-sabzavot"),
+    "kartoshka": ("kg", "Meva-sabzavot"),
+
+    # --- Don va quruq oziq-ovqat ---
+    "makaron": ("kg", "Quruq oziq-ovqat"),
+    "guruch (alanga)": ("kg", "Quruq oziq-ovqat"),
+    "grechka": ("kg", "Quruq oziq-ovqat"),
+    "mosh": ("kg", "Quruq oziq-ovqat"),
+    "un (1-sort)": ("kg", "Quruq oziq-ovqat"),
+    "shakar": ("kg", "Quruq oziq-ovqat"),
+    "tuz": ("kg", "Quruq oziq-ovqat"),
+
+    # --- Yog', ichimlik va boshqa mahsulotlar ---
+    "moy (o'simlik)": ("litr", "Ichimliklar"),
+    "kofe": ("qadoq", "Ichimliklar"),
+    "choy": ("pachka", "Ichimliklar"),
+    "suv": ("litr", "Ichimliklar"),
+    "sut": ("karobka", "Sut mahsulotlari"),
+
+    # --- Mevalar ---
+    "olma": ("kg", "Meva-sabzavot"),
+    "nok": ("kg", "Meva-sabzavot"),
+    "anor": ("kg", "Meva-sabzavot"),
+    "mango": ("dona", "Meva-sabzavot"),
+    "xurmo (dates)": ("kg", "Meva-sabzavot"),
+    "uzum": ("kg", "Meva-sabzavot"),
+    "limon": ("kg", "Meva-sabzavot"),
+    "mandarin": ("kg", "Meva-sabzavot"),
+    "banan": ("kg", "Meva-sabzavot"),
+
+    # --- Yeryong‘oq va yong‘oqlar ---
+    "yong'oq (mag'iz)": ("kg", "Quruq oziq-ovqat"),
+    "bodom (mag'iz)": ("kg", "Quruq oziq-ovqat"),
+    "mayiz": ("kg", "Quruq oziq-ovqat"),
+    "yeryong'oq": ("kg", "Quruq oziq-ovqat"),
+
+    # --- Hayvoniy mahsulotlar ---
+    "tuxum": ("dona", "Go'sht mahsulotlari"),
+
+    # --- Qo‘shimcha asosiylar ---
+    "non": ("dona", "Non & bakery"),
+    "shokolad": ("dona", "Shirinliklar"),
+}
+COMMON_ITEM_NAMES = sorted(COMMON_ITEMS)  # tez qo'shish ro'yxati (har rerun da saralanmasin)
+
+
+PLAN_COLS = ["item", "category", "unit", "plan_qty"]
+BUY_COLS = PLAN_COLS + ["bought", "actual_qty", "unit_price_gross", "line_gross", "line_net", "line_vat"]
+BUY_INPUT_COLS = PLAN_COLS + ["bought", "actual_qty", "unit_price_gross"]  # kiritiladi; line_* hisoblanadi
+
+MONEY_COLS = ["unit_price_gross", "line_gross", "line_net", "line_vat"]
+
+# --- Schema: ixcham dtypelar ---
+# category/unit — categorical (int8 kodlar, ma'lum qiymatlar oldinda), miqdor/pul — float64, bought — bool.
+# Pul float64 so'mda qoladi: int64 tiyin ham 8 bayt, xotira yutug'i bermaydi.
+
+
+def as_category(s: pd.Series, known) -> pd.Series:
+    """Seriyani `known` + uchragan boshqa qiymatlar kategoriyalari bilan categorical ga o'tkazadi."""
+    import pandas as pd
+    known = list(known)
+    if isinstance(s.dtype, pd.CategoricalDtype) and list(s.dtype.categories[:len(known)]) == known:
+        return s
+    extra = sorted(set(s.dropna().astype(str).unique()) - set(known))
+    return s.astype(pd.CategoricalDtype(known + extra))
+
+
+def apply_plan_schema(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+    out = df.copy(deep=False)
+    out["category"] = as_category(out["category"], DEFAULT_CATEGORIES)
+    out["unit"] = as_category(out["unit"], ALL_UNITS)
+    out["plan_qty"] = pd.to_numeric(out["plan_qty"], errors="coerce").astype("float64")
+    return out
+
+
+def apply_buy_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Toza (hisoblangan yoki yangi) xarid jadvali uchun; xom editor ma'lumoti recompute_buy_df dan o'tadi."""
+    import pandas as pd
+    out = apply_plan_schema(df)
+    out["bought"] = out["bought"].fillna(False).astype(bool)
+    for c in ["actual_qty"] + MONEY_COLS:
+        out[c] = pd.to_numeric(out[c], errors="coerce").astype("float64")
+    return out
+
+
+def _lower_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return df.set_axis([str(c).strip().lower() for c in df.columns], axis=1)
+
+
+def normalize_plan_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Yuklangan reja (CSV/Parquet/Arrow): ustun nomlari, majburiy ustunlar, sxema. Xato — ValueError."""
+    df = _lower_columns(df)
+    miss = [c for c in ["item", "unit", "plan_qty"] if c not in df.columns]
+    if miss:
+        raise ValueError(f"ustunlar yetarli emas. Kerak: item, unit, plan_qty (topilmadi: {', '.join(miss)}).")
+    if "category" not in df.columns:
+        df = df.assign(category="Boshqa")
+    return apply_plan_schema(df[PLAN_COLS])
+
+
+def normalize_buy_frame(df: pd.DataFrame):
+    """
+    Reja yoki chek jadvalini BUY_COLS ko'rinishiga keltiradi.
+    Chek — barcha qatorlar olingan; reja — hech narsa olinmagan.
+    Qaytadi: (kind, DataFrame), kind — "receipt" yoki "plan".
+    """
+    df = _lower_columns(df)
+    miss = [c for c in ["item", "unit"] if c not in df.columns]
+    if miss:
+        raise ValueError(f"ustunlar yetarli emas (topilmadi: {', '.join(miss)})")
+    kind = "receipt" if {"actual_qty", "unit_price_gross"} <= set(df.columns) else "plan"
+    defaults = {
+        "category": "Boshqa",
+        "plan_qty": 0,
+        "bought": kind == "receipt",
+        "actual_qty": 0,
+        "unit_price_gross": 0.0,
+        "line_gross": 0.0,
+        "line_net": 0.0,
+        "line_vat": 0.0,
+    }
+    df = df.assign(**{c: v for c, v in defaults.items() if c not in df.columns})
+    return kind, df[BUY_COLS]
+
+
+def buy_frame_from_plan(plan_df: pd.DataFrame) -> pd.DataFrame:
+    """Rejadan bo'sh (hech narsa olinmagan) xarid jadvali."""
+    out = plan_df[PLAN_COLS].assign(
+        bought=False, actual_qty=0.0, unit_price_gross=0.0, line_gross=0.0, line_net=0.0, line_vat=0.0
+    )
+    return apply_buy_schema(out)
+
+
+def example_plan_df():
+    import pandas as pd
+    rows = []
+    for name, (unit, cat) in COMMON_ITEMS.items():
+        rows.append({
+            "item": name.title(),
+            "category": cat,
+            "unit": unit,
+            "plan_qty": 1.0 if unit in UNITS_FLOAT else 1,
+        })
+    return apply_plan_schema(pd.DataFrame(rows, columns=PLAN_COLS))
+
+# --- Utils ---
+# Aqlli tahmin: mahsulot nomiga qarab birlik/kategoriya
+UNIT_KEYWORDS = [
+    ("litr", ["suv", "yog'", "yog ", "sirka", "vinegar", "sok", "sharbat"]),
+    ("dona", ["non", "tuxum", "shokolad", "konserva", "qadoq", "pachka", "pachkasi"]),
+    ("karobka", ["sut", "sok karobka", "quti", "qutisi"]),
+    ("kg",   ["go'sht", "gosht", "kolbasa", "guruch", "shakar", "tuz", "piyoz", "kartoshka", "un", "sabzi", "anor", "olma", "uzum", "shaftoli", "banan", "olcha", "bodring", "pamidor", "pomidor"]) 
+]
+
+CATEGORY_KEYWORDS = [
+    ("Ichimliklar", ["suv", "sok", "sharbat", "cola", "choy", "qahva", "kofe"]),
+    ("Non & bakery", ["non", "bulochka", "baget", "pita"]),
+    ("Shirinliklar", ["shokolad", "konfet", "pechenye", "wafer", "vafli"]),
+    ("Sut mahsulotlari", ["sut", "qatiq", "smetana", "tvorog", "pishloq", "sir"]),
+    ("Go'sht mahsulotlari", ["go'sht", "gosht", "mol", "qoy", "tovuq", "kolbasa", "farsh"]),
+    ("Quruq oziq-ovqat", ["guruch", "grechka", "makaron", "shakar", "tuz", "ziravor", "murch", "zira", "qum shakar", "qand"]),
+    ("Meva-sabzavot", ["olma", "anor", "uzum", "shaftoli", "banan", "piyoz", "kartoshka", "sabzi", "bodring", "pomidor", "pamidor", "ko'kat", "kokat"]),
+]
+
+def _compile_keywords(table):
+    """
+    Har bir guruh kalit so'zlari bitta alternativ regexga yig'iladi, guruhlar esa
+    jadval tartibida qoladi — birinchi mos kelgan guruh ustun (avvalgi `any(k in n ...)` kabi).
+    """
+    return [(label, re.compile("|".join(re.escape(k) for k in keys))) for label, keys in table]
+
+
+def _first_match(compiled, n: str, default: str) -> str:
+    for label, pattern in compiled:
+        if pattern.search(n):
+            return label
+    return default
+
+
+# Regexlar birinchi chaqiruvda kompilyatsiya qilinadi — import arzon qolsin
+@lru_cache(maxsize=None)
+def _unit_matcher():
+    return _compile_keywords(UNIT_KEYWORDS)
+
+
+@lru_cache(maxsize=None)
+def _category_matcher():
+    return _compile_keywords(CATEGORY_KEYWORDS)
+
+
+# canonical_key chetdagi bo'shliqni olib tashlaydi — "yog " kabi so'z oxiri kalitlari nom oxirida
+# ham mos kelishi uchun kalitga bitta bo'shliq qo'shiladi ("paxta yog" -> litr, "yogurt" emas)
+@lru_cache(maxsize=8192)
+def _infer_unit_norm(n: str) -> str:
+    return _first_match(_unit_matcher(), n + " ", "kg")
+
+
+@lru_cache(maxsize=8192)
+def _infer_category_norm(n: str) -> str:
+    return _first_match(_category_matcher(), n + " ", "Boshqa")
+
+
+def infer_unit(name: str) -> str:
+    return _infer_unit_norm(canonical_key(name))
+
+
+def infer_category(name: str) -> str:
+    return _infer_category_norm(canonical_key(name))
+
+
+def _infer_batch(names, fn) -> pd.Series:
+    import numpy as np
+    import pandas as pd
+    names = pd.Series(names)
+    codes, uniques = pd.factorize(names.fillna("").astype(str))
+    labels = np.array([fn(canonical_key(n)) for n in uniques], dtype=object)
+    return pd.Series(labels[codes], index=names.index)
+
+
+def infer_units(names) -> pd.Series:
+    """infer_unit ning ommaviy varianti: har bir noyob nom bir marta tasniflanadi."""
+    return _infer_batch(names, _infer_unit_norm)
+
+
+def infer_categories(names) -> pd.Series:
+    """infer_category ning ommaviy varianti."""
+    return _infer_batch(names, _infer_category_norm)
+
+# Bulk matn: oldindan kompilyatsiya qilingan andozalar
+BULK_SPLIT_RE = re.compile(r"[;,|\t]")
+BULK_NUM_TOKEN_RE = re.compile(r"^\d+[\.,]?\d*$")
+BULK_BATCH_ROWS = 5000
+
+
+def _to_num(x: str):
+    try:
+        return float(x.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _parse_bulk_line(line: str):
+    """Bitta qator -> (item, unit, category, qty); unit/category/qty bo'lmasa None."""
+    parts = [p.strip() for p in BULK_SPLIT_RE.split(line)]
+    parts = [p for p in parts if p]
+    item, unit, cat, qty = None, None, None, None
+    if len(parts) >= 3:
+        p0, p1, p2 = parts[0], parts[1], parts[2]
+        q1 = _to_num(p1)
+        q2 = _to_num(p2) if q1 is None else None
+        if q1 is not None:  # item, qty, unit, [cat]
+            item, qty, unit = p0, q1, p2.lower()
+            cat = parts[3] if len(parts) > 3 else None
+        elif q2 is not None:  # item, unit, qty, [cat]
+            item, unit, qty = p0, p1.lower(), q2
+            cat = parts[3] if len(parts) > 3 else None
+        else:
+            item, unit, cat = p0, p1.lower(), p2
+    else:
+        # Erkin gapdan ajratish: "Guruch 3 kg ..." ko‘rinishida
+        tokens = line.split()
+        num_idx = next((i for i, t in enumerate(tokens) if BULK_NUM_TOKEN_RE.match(t)), None)
+        if num_idx is not None and num_idx + 1 < len(tokens):
+            item = " ".join(tokens[:num_idx])
+            qty = float(tokens[num_idx].replace(",", "."))
+            unit = tokens[num_idx + 1].lower()
+            cat = " ".join(tokens[num_idx + 2:]) or None
+        else:
+            item = line
+    item = (item or "").strip()
+    if not item:
+        return None
+    return item, unit or None, cat or None, qty
+
+
+def _iter_text_lines(source):
+    """Matn (str/bytes) yoki fayl obyektidan qatorlarni birma-bir beradi."""
+    if isinstance(source, bytes):
+        source = source.decode("utf-8-sig", errors="replace")
+    if isinstance(source, str):
+        yield from source.splitlines()
+        return
+    if isinstance(source, io.TextIOBase):
+        yield from source
+        return
+    stream = io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace")
+    try:
+        yield from stream
+    finally:
+        stream.detach()  # yuklangan fayl obyektini yopib qo'ymaslik uchun
+
+
+def _bulk_batch_frame(items, units, cats, qtys) -> pd.DataFrame:
+    import numpy as np
+    import pandas as pd
+    item = pd.Series(items, dtype=object)
+    unit = pd.Series(units, dtype=object)
+    miss = unit.isna()
+    if miss.any():
+        unit[miss] = infer_units(item[miss])
+    cat = pd.Series(cats, dtype=object)
+    miss = cat.isna()
+    if miss.any():
+        cat[miss] = infer_categories(item[miss])
+    qty = np.array([np.nan if q is None else q for q in qtys], dtype="float64")
+    qty[np.isnan(qty)] = 1.0
+    is_float = unit.isin(UNITS_FLOAT).to_numpy()
+    qty = np.where(is_float, _round3(qty), np.round(qty))
+    return pd.DataFrame({"item": item.str.title(), "category": cat, "unit": unit, "plan_qty": qty},
+                        columns=PLAN_COLS)
+
+
+def iter_bulk_batches(source, batch_size: int = BULK_BATCH_ROWS, progress=None):
+    """
+    Bulk ro'yxatni oqim bilan o'qiydi va har `batch_size` pozitsiyada bitta ustunli
+    DataFrame (PLAN_COLS) beradi. `source` — matn, bytes yoki fayl obyekti;
+    xotira faqat bitta partiya hajmida. `progress(lines_read)` har partiyadan keyin chaqiriladi.
+    """
+    items, units, cats, qtys = [], [], [], []
+    n_lines = 0
+    for raw in _iter_text_lines(source):
+        n_lines += 1
+        line = raw.strip()
+        if not line:
+            continue
+        parsed = _parse_bulk_line(line)
+        if parsed is None:
+            continue
+        items.append(parsed[0])
+        units.append(parsed[1])
+        cats.append(parsed[2])
+        qtys.append(parsed[3])
+        if len(items) >= batch_size:
+            yield _bulk_batch_frame(items, units, cats, qtys)
+            items, units, cats, qtys = [], [], [], []
+            if progress is not None:
+                progress(n_lines)
+    if items:
+        yield _bulk_batch_frame(items, units, cats, qtys)
+    if progress is not None:
+        progress(n_lines)
+
+
+def bulk_plan_frame(source, batch_size: int = BULK_BATCH_ROWS, progress=None) -> pd.DataFrame:
+    """Barcha partiyalarni bitta concat bilan yig'adi."""
+    import pandas as pd
+    batches = list(iter_bulk_batches(source, batch_size, progress))
+    if not batches:
+        return pd.DataFrame(columns=PLAN_COLS)
+    return pd.concat(batches, ignore_index=True)
+
+
+def parse_bulk_lines(text: str):
+    """
+    Qatorlar misollar:
+      - "Guruch 3 kg Quruq oziq-ovqat"
+      - "Zira; 0.05; kg; Quruq oziq-ovqat"
+      - "Kolbasa, 2, dona" (kategoriya avtomatik)
+      - "Suv | 1.5 | litr | Ichimliklar"
+    Qaytadi: list[dict(item, unit, category, plan_qty)]
+    """
+    if not text:
+        return []
+    return bulk_plan_frame(text).to_dict("records")
+
+def fmt_money(x: float) -> str:
+    try:
+        return f"{int(round(float(x))):,}".replace(",", " ") + " so'm"
+    except Exception:
+        return "—"
+
+
+def coerce_qty(val, unit: str):
+    import pandas as pd
+    if pd.isna(val) or val == "":
+        return 0
+    try:
+        if unit in UNITS_FLOAT:
+            v = float(val)
+            return max(0.0, round(v, 3))
+        else:
+            v = int(float(val))
+            return max(0, v)
+    except Exception:
+        return 0
+
+
+def split_vat_from_gross(gross: float, rate_percent: float):
+    """Bitta summa uchun (net, vat) — tiyinga yaxlitlangan, `vat_tiyin` qoidasi bilan."""
+    g = int(to_tiyin([gross])[0])
+    vat = vat_tiyin(g, rate_percent)
+    return (g - vat) / TIYIN, vat / TIYIN
+
+
+def _round3(v: np.ndarray) -> np.ndarray:
+    """round(x, 3) ning massiv varianti, Python round() bilan bit-ma-bit bir xil."""
+    import numpy as np
+    out = np.round(v, 3)
+    # np.round ba'zan Python round() dan 1 ulp farq qiladi — 3 xonadan uzun qiymatlar kam, ularni skalyar yaxlitlaymiz
+    with np.errstate(invalid="ignore"):
+        odd = np.isfinite(v) & (out != v)
+    if odd.any():
+        out[odd] = [round(x, 3) for x in v[odd].tolist()]
+    return out
+
+
+def coerce_qty_array(vals: pd.Series, units: pd.Series) -> np.ndarray:
+    """coerce_qty ning ustunli varianti: butun ustun bitta NumPy amali bilan."""
+    import numpy as np
+    import pandas as pd
+    v = pd.to_numeric(vals, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    is_float = units.isin(UNITS_FLOAT).to_numpy()
+    with np.errstate(invalid="ignore"):
+        fl = np.where(is_float, v, np.nan)
+        fl = _round3(fl)
+        fl = np.where(fl > 0, fl, 0.0)
+        iv = np.trunc(v)
+        iv = np.where(np.isfinite(iv) & (iv > 0), iv, 0.0)
+    return np.where(is_float, fl, iv)
+
+
+# --- Pul: butun tiyinlarda (1 so'm = 100 tiyin) ---
+# Qator summalari tiyinga yaxlitlanadi; QQS chek darajasida bir marta yaxlitlanib, kategoriyalar
+# va qatorlarga eng katta qoldiq usulida taqsimlanadi — qator QQS lari yig'indisi kategoriya
+# QQS iga, kategoriyalarniki esa chek QQS iga aynan teng. Durang qoldiqlar tartib bo'yicha.
+TIYIN = 100
+NO_CATEGORY = ""  # kategoriyasiz qatorlar guruhi
+
+
+def to_tiyin(values) -> np.ndarray:
+    """So'm -> butun tiyin (int64), yarimi yuqoriga; NaN, cheksiz va manfiy — 0."""
+    import numpy as np
+    v = np.asarray(values, dtype="float64") * TIYIN
+    with np.errstate(invalid="ignore"):
+        v = np.floor(np.round(v, 6) + 0.5)  # 0.285*100 = 28.4999... kabi ikkilik xatoni olib tashlaydi
+        return np.where(np.isfinite(v) & (v > 0), v, 0).astype("int64")
+
+
+def _rate_fraction(rate_percent: float):
+    """Gross ichidagi QQS ulushi r/(100+r) = p/d, butun sonlarda."""
+    from fractions import Fraction
+    r = Fraction(str(float(rate_percent))).limit_denominator(100)
+    if r <= 0:
+        return 0, 1
+    return r.numerator, 100 * r.denominator + r.numerator
+
+
+def vat_tiyin(gross_t: int, rate_percent: float) -> int:
+    """Summa (tiyin) ichidagi QQS, tiyinga yarimi yuqoriga yaxlitlangan."""
+    p, d = _rate_fraction(rate_percent)
+    gross_t = max(int(gross_t), 0)
+    return (2 * gross_t * p + d) // (2 * d)
+
+
+def allocate_vat_groups(group_gross: dict, rate_percent: float) -> dict:
+    """Jami QQS ni guruhlarga (kategoriyalarga) eng katta qoldiq usulida bo'ladi: {guruh: QQS tiyin}."""
+    p, d = _rate_fraction(rate_percent)
+    out = {k: int(g) * p // d for k, g in group_gross.items()}
+    need = vat_tiyin(sum(int(g) for g in group_gross.values()), rate_percent) - sum(out.values())
+    for k in sorted(group_gross, key=lambda k: (-(int(group_gross[k]) * p % d), str(k)))[:need]:
+        out[k] += 1
+    return out
+
+
+def allocate_vat_lines(gross_t: np.ndarray, groups: np.ndarray, targets: np.ndarray,
+                       rate_percent: float) -> np.ndarray:
+    """
+    Har bir guruh ichida qator QQS lari: pastga yaxlitlangan ulush + qolgan tiyinlar eng katta
+    qoldiqli qatorlarga. `groups` — 0..k-1 kodlar, `targets[k]` — guruh QQS i (tiyin).
+    """
+    import numpy as np
+    p, d = _rate_fraction(rate_percent)
+    prod = gross_t * p
+    vat = prod // d
+    if len(vat) == 0 or p == 0:
+        return vat
+    need = targets.copy()
+    np.subtract.at(need, groups, vat)
+    rem = prod - vat * d
+    cand = np.flatnonzero((rem > 0) & (need[groups] > 0))  # qo'shimcha tiyin faqat qoldiqli qatorlarga
+    if len(cand) == 0:
+        return vat
+    # Bitta kalit: guruh, keyin qoldiq kamayish tartibida; barqaror — teng qoldiqda kichik pozitsiya oldin
+    order = cand[np.argsort(groups[cand] * d + (d - rem[cand]), kind="stable")]
+    gs = groups[order]
+    n = len(order)
+    starts = np.flatnonzero(np.r_[True, gs[1:] != gs[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    rank = np.arange(n) - np.repeat(starts, sizes)
+    vat[order[rank < np.repeat(need[gs[starts]], sizes)]] += 1
+    return vat
+
+
+def allocate_vat(df: pd.DataFrame, qqs_rate: float) -> pd.DataFrame:
+    """line_gross va kategoriya bo'yicha line_vat / line_net ni butun jadval uchun qayta taqsimlaydi."""
+    import numpy as np
+    out = df.copy(deep=False)
+    gross_t = to_tiyin(out["line_gross"].to_numpy(dtype="float64", na_value=np.nan))
+    cat = as_category(out["category"], DEFAULT_CATEGORIES)
+    labels = [*map(str, cat.cat.categories), NO_CATEGORY]
+    codes = cat.cat.codes.to_numpy().astype("int64")
+    codes[codes < 0] = len(labels) - 1
+    group_gross = np.zeros(len(labels), dtype="int64")
+    np.add.at(group_gross, codes, gross_t)
+    alloc = allocate_vat_groups({labels[i]: int(g) for i, g in enumerate(group_gross) if g}, qqs_rate)
+    targets = np.array([alloc.get(lbl, 0) for lbl in labels], dtype="int64")
+    vat = allocate_vat_lines(gross_t, codes, targets, qqs_rate)
+    out["line_gross"] = gross_t / TIYIN
+    out["line_net"] = (gross_t - vat) / TIYIN
+    out["line_vat"] = vat / TIYIN
+    return out
+
+
+def vat_groups(rows: pd.DataFrame) -> set:
+    """Qatorlar tegishli QQS guruhlari (kategoriya nomlari, kategoriyasizlar — NO_CATEGORY)."""
+    cat = rows["category"].astype(object)
+    return set(cat.where(cat.notna(), NO_CATEGORY))
+
+
+def reallocate_vat(df: pd.DataFrame, qqs_rate: float, groups, old_targets: dict, new_targets: dict) -> pd.DataFrame:
+    """
+    allocate_vat ning qisman varianti: faqat `groups` (o'zgargan qatorlar guruhlari) va QQS ulushi
+    o'zgargan guruhlar (`old_targets` -> `new_targets`, _category_vat natijalari) qatorlari qayta
+    taqsimlanadi. Guruh ichidagi taqsimot faqat o'sha guruh qatorlariga bog'liq — natija butun
+    jadval bo'yicha allocate_vat bilan aynan bir xil. `df` dagi line_gross tiyinga keltirilgan bo'lishi kerak.
+    """
+    import numpy as np
+    import pandas as pd
+    groups = set(groups) | {k for k in set(old_targets) | set(new_targets)
+                            if old_targets.get(k, 0) != new_targets.get(k, 0)}
+    if not groups:
+        return df
+    cat = df["category"]
+    mask = cat.isin([g for g in groups if g != NO_CATEGORY]).to_numpy()
+    if NO_CATEGORY in groups:
+        mask |= cat.isna().to_numpy()
+    pos = np.flatnonzero(mask)
+    if not len(pos):
+        return df
+    labels = sorted(groups)
+    sub = cat.iloc[pos].astype(object)
+    codes = pd.Series(sub.where(sub.notna(), NO_CATEGORY)).map({g: i for i, g in enumerate(labels)})
+    codes = codes.to_numpy(dtype="int64")
+    gross_t = to_tiyin(df["line_gross"].to_numpy(dtype="float64", na_value=np.nan)[pos])
+    targets = np.array([new_targets.get(g, 0) for g in labels], dtype="int64")
+    vat = allocate_vat_lines(gross_t, codes, targets, qqs_rate)
+    out = df.copy(deep=False)
+    for c, values in (("line_net", (gross_t - vat) / TIYIN), ("line_vat", vat / TIYIN)):
+        arr = out[c].to_numpy(dtype="float64", copy=True)
+        arr[pos] = values
+        out[c] = arr
+    return out
+
+
+def recompute_buy_df(df: pd.DataFrame, qqs_rate: float) -> pd.DataFrame:
+    import numpy as np
+    import pandas as pd
+    out = df.copy(deep=False)  # faqat butun ustunlar almashtiriladi — kirish jadvali o'zgarmaydi
+    n = len(out)
+    units = out["unit"]
+    out["plan_qty"] = coerce_qty_array(out["plan_qty"], units)
+
+    bought = out["bought"] if "bought" in out else pd.Series(False, index=out.index)
+    bought = bought.fillna(False).astype(bool).to_numpy()
+    actual = coerce_qty_array(out["actual_qty"], units) if "actual_qty" in out else np.zeros(n)
+
+    price = out["unit_price_gross"] if "unit_price_gross" in out else pd.Series(0.0, index=out.index)
+    if price.dtype == object:
+        price = price.where(price.notna() & (price != ""), 0)  # `x or 0` bilan bir xil
+    up = pd.to_numeric(price).to_numpy(dtype="float64", na_value=np.nan)
+
+    out["bought"] = bought
+    out["actual_qty"] = actual
+    with np.errstate(invalid="ignore"):
+        out["unit_price_gross"] = np.where(up > 0, up, 0.0)
+        out["line_gross"] = np.where(bought, actual * up, 0.0)  # tiyinga allocate_vat da keltiriladi
+    out["category"] = as_category(out["category"], DEFAULT_CATEGORIES)
+    out["unit"] = as_category(units, ALL_UNITS)
+    return allocate_vat(out, qqs_rate)
+
+
+# --- Incremental recompute: faqat o'zgargan qatorlar ---
+CALC_COLS = ["plan_qty", "bought", "actual_qty", "unit_price_gross", "line_gross", "line_net", "line_vat"]
+CALC_DTYPES = {c: ("bool" if c == "bought" else "float64") for c in CALC_COLS}
+
+
+def empty_buy_totals() -> dict:
+    """Gross tiyinda (butun son) saqlanadi — delta qo'shish/ayirish tartibidan qat'i nazar aniq."""
+    return {"gross_t": 0, "items": 0, "by_cat": {}}
+
+
+def _add_to_totals(totals: dict, rows: pd.DataFrame, sign: int = 1) -> None:
+    """Olingan qatorlar hissasini jamiga qo'shadi (sign=-1 — ayiradi)."""
+    import pandas as pd
+    rows = rows[rows["bought"].fillna(False).astype(bool)]
+    if rows.empty:
+        return
+    by_cat = totals["by_cat"]
+    for cat, qty, gross_t in zip(rows["category"], rows["actual_qty"], to_tiyin(rows["line_gross"]).tolist()):
+        qty = 0.0 if pd.isna(qty) else float(qty)  # groupby(...).sum() kabi NaN = 0
+        totals["gross_t"] += sign * gross_t
+        totals["items"] += sign
+        if pd.isna(cat):
+            continue
+        agg = by_cat.setdefault(cat, {"items": 0, "qty": 0.0, "gross_t": 0})
+        agg["items"] += sign
+        agg["qty"] += sign * qty
+        agg["gross_t"] += sign * gross_t
+        if agg["items"] <= 0:
+            del by_cat[cat]
+
+
+def buy_totals(df: pd.DataFrame) -> dict:
+    """To'liq yig'indi (Gross va kategoriya kesimi) — delta yangilanishlar uchun boshlang'ich nuqta."""
+    totals = empty_buy_totals()
+    fakt = df[df["bought"]]
+    if fakt.empty:
+        return totals
+    fakt = fakt.assign(gross_t=to_tiyin(fakt["line_gross"]))
+    cat = fakt.groupby("category", observed=True).agg(
+        items=("item", "count"),
+        qty=("actual_qty", "sum"),
+        gross_t=("gross_t", "sum"),
+    )
+    totals.update(gross_t=int(fakt["gross_t"].sum()), items=int(fakt.shape[0]))
+    totals["by_cat"] = {
+        k: {"items": int(v["items"]), "qty": float(v["qty"]), "gross_t": int(v["gross_t"])}
+        for k, v in cat.to_dict("index").items()
+    }
+    return totals
+
+
+def _category_vat(totals: dict, qqs_rate: float) -> dict:
+    """Kategoriyalar QQS i (tiyin) — allocate_vat dagi bilan bir xil taqsimot."""
+    groups = {k: v["gross_t"] for k, v in totals["by_cat"].items()}
+    rest = totals["gross_t"] - sum(groups.values())
+    if rest:
+        groups[NO_CATEGORY] = rest
+    return allocate_vat_groups(groups, qqs_rate)
+
+
+def money_totals(totals: dict, qqs_rate: float) -> dict:
+    """Chek bo'yicha {"net", "vat", "gross"} so'mda; QQS jami Gross dan bir marta ajratiladi."""
+    gross_t = int(totals["gross_t"])
+    vat = vat_tiyin(gross_t, qqs_rate)
+    return {"net": (gross_t - vat) / TIYIN, "vat": vat / TIYIN, "gross": gross_t / TIYIN}
+
+
+def category_totals_df(totals: dict, qqs_rate: float) -> pd.DataFrame:
+    """TAB3 dagi groupby jadvali bilan bir xil ko'rinish, lekin tayyor yig'indilardan."""
+    import pandas as pd
+    vat = _category_vat(totals, qqs_rate)
+    cat = pd.DataFrame(
+        [
+            {"category": k, "items": v["items"], "qty": v["qty"],
+             "net": (v["gross_t"] - vat[k]) / TIYIN, "qqs": vat[k] / TIYIN, "gross": v["gross_t"] / TIYIN}
+            for k, v in totals["by_cat"].items()
+        ],
+        columns=["category", "items", "qty", "net", "qqs", "gross"],
+    )
+    return cat.sort_values("gross", ascending=False, ignore_index=True)
+
+
+def summary_df(totals: dict, qqs_rate: float) -> pd.DataFrame:
+    """TAB3 "Umumiy ko'rsatkichlar" jadvali; qiymatlar TAB2 metrikalari bilan aynan bir xil."""
+    import pandas as pd
+    money = money_totals(totals, qqs_rate)
+    return pd.DataFrame([
+        {"metric": "Jami Net (QQSsiz)", "value": money["net"]},
+        {"metric": "Jami QQS", "value": money["vat"]},
+        {"metric": "Jami Gross (QQS bilan)", "value": money["gross"]},
+        {"metric": "Umumiy pozitsiyalar (olingan)", "value": int(totals["items"])},
+    ])
+
+
+def apply_buy_edits(base: pd.DataFrame, edited: pd.DataFrame, edits: dict, qqs_rate: float, totals: dict):
+    """
+    st.data_editor deltalari (edited_rows / added_rows / deleted_rows) bo'yicha
+    faqat o'zgargan qatorlarni qayta hisoblaydi va `totals` ni delta bilan yangilaydi.
+    `base` — editorga berilgan (allaqachon hisoblangan) jadval, `edited` — editor natijasi.
+    Qaytadi: (yangi jadval, qayta hisoblangan qatorlar soni) yoki deltalar mos kelmasa None.
+    """
+    res = _edit_rows(base, edited, edits, qqs_rate, totals)
+    if res is None:
+        return None
+    if res[0] is base:
+        return base, 0
+    out, n_dirty, groups, old_targets = res
+    return reallocate_vat(out, qqs_rate, groups, old_targets, _category_vat(totals, qqs_rate)), n_dirty
+
+
+def _edit_rows(base: pd.DataFrame, edited: pd.DataFrame, edits: dict, qqs_rate: float, totals: dict):
+    """
+    apply_buy_edits ning QQS taqsimotisiz qismi. Qaytadi: (jadval, qayta hisoblangan qatorlar,
+    tegilgan QQS guruhlari, tahrirdan oldingi guruh QQS lari) yoki None.
+    """
+    edits = edits or {}
+    edited_pos = [int(p) for p in edits.get("edited_rows", {})]
+    deleted_pos = [int(p) for p in edits.get("deleted_rows", [])]
+    n_added = len(edits.get("added_rows", []))
+    if not (edited_pos or deleted_pos or n_added):
+        return base, 0, set(), {}
+    if len(edited) != len(base) - len(deleted_pos) + n_added:
+        return None
+
+    deleted_set = set(deleted_pos)
+    changed_labels = base.index[[p for p in edited_pos if p not in deleted_set]]
+    added_labels = edited.index[len(edited) - n_added:]
+    dirty = changed_labels.append(added_labels)
+
+    out = edited.astype(CALC_DTYPES)
+    rec = recompute_buy_df(edited.loc[dirty], qqs_rate)
+    for c in CALC_COLS:
+        out.loc[dirty, c] = rec[c].astype(CALC_DTYPES[c])
+
+    out["category"] = as_category(out["category"], DEFAULT_CATEGORIES)
+    out["unit"] = as_category(out["unit"], ALL_UNITS)
+
+    old_rows = base.iloc[sorted(deleted_set | set(edited_pos))]
+    old_targets = _category_vat(totals, qqs_rate)
+    _add_to_totals(totals, old_rows, sign=-1)
+    _add_to_totals(totals, rec, sign=1)
+    # QQS chek bo'yicha taqsimlanadi, lekin qayta taqsimot faqat tegilgan guruhlarda (reallocate_vat)
+    return out, len(dirty), vat_groups(old_rows) | vat_groups(rec), old_targets
+
+
+# --- Oynali tahrirlash: filtr, sahifa va qator ID bo'yicha birlashtirish ---
+# Qator ID — jadval indeksi (butun son); sahifa faqat ko'rinadigan qatorlarni oladi.
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def filter_row_ids(df: pd.DataFrame, categories=None, search: str = "") -> pd.Index:
+    """Kategoriya va mahsulot nomi (kichik-katta harfsiz qism satr) bo'yicha qator ID lari."""
+    import numpy as np
+    mask = np.ones(len(df), dtype=bool)
+    if categories:
+        mask &= df["category"].isin(list(categories)).to_numpy()
+    search = (search or "").strip()
+    if search:
+        mask &= df["item"].astype(str).str.contains(search, case=False, regex=False, na=False).to_numpy()
+    return df.index[mask]
+
+
+def page_bounds(n_rows: int, page: int, page_size: int):
+    """(start, stop, sahifalar soni); `page` 1 dan boshlanadi va chegaraga keltiriladi."""
+    n_pages = max(1, -(-n_rows // page_size))
+    page = min(max(int(page), 1), n_pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, n_rows), n_pages
+
+
+def next_row_id(df: pd.DataFrame) -> int:
+    return int(df.index.max()) + 1 if len(df) else 0
+
+
+def changed_mask(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """Bir xil uzunlikdagi ikki ustun: qiymati farq qiladigan pozitsiyalar (NaN == NaN)."""
+    import numpy as np
+    import pandas as pd
+    if pd.api.types.is_numeric_dtype(a.dtype) and pd.api.types.is_numeric_dtype(b.dtype):
+        x = a.to_numpy(dtype="float64", na_value=np.nan)
+        y = b.to_numpy(dtype="float64", na_value=np.nan)
+        return ~((x == y) | (np.isnan(x) & np.isnan(y)))
+    if isinstance(a.dtype, pd.CategoricalDtype) and a.dtype == b.dtype:
+        return a.cat.codes.to_numpy() != b.cat.codes.to_numpy()  # NaN kodi -1
+    if isinstance(a.dtype, pd.StringDtype) and isinstance(b.dtype, pd.StringDtype):
+        na_a, na_b = a.isna().to_numpy(), b.isna().to_numpy()
+        ne = a.array != b.array  # NaN-semantikada ndarray, NA-semantikada BooleanArray
+        ne = ne.to_numpy(dtype=bool, na_value=False) if hasattr(ne, "to_numpy") else np.asarray(ne, dtype=bool)
+        return (ne & ~(na_a & na_b)) | (na_a != na_b)
+    x = a.astype(object).where(a.notna(), None).to_numpy()
+    y = b.astype(object).where(b.notna(), None).to_numpy()
+    return x != y
+
+
+def replace_at(col: pd.Series, pos, values):
+    """
+    Ustun nusxasi (massiv), `pos` pozitsiyalarida `values` bilan. Categorical ga yangi qiymatlar
+    kategoriya bo'lib qo'shiladi; Arrow matn ustuni object massivga aylantirilmaydi.
+    """
+    import numpy as np
+    import pandas as pd
+    vals = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        extra = sorted(set(vals.dropna().astype(str)) - set(col.cat.categories))
+        arr = (col.cat.add_categories(extra) if extra else col).array.copy()
+        arr[pos] = vals.astype(object).to_numpy()
+    elif isinstance(col.dtype, np.dtype):
+        arr = col.to_numpy(copy=True)
+        if arr.dtype.kind == "f":
+            vals = pd.to_numeric(vals, errors="coerce")
+        elif arr.dtype.kind == "b":
+            vals = vals.fillna(False).astype(bool)
+        arr[pos] = vals.to_numpy(dtype=arr.dtype if arr.dtype.kind in "fb" else object)
+    else:
+        arr = col.array.copy()
+        arr[pos] = vals.astype(object).to_numpy()
+    return arr
+
+
+def view_frame(master: pd.DataFrame, ids) -> pd.DataFrame:
+    """Sahifa jadvali: RangeIndex bilan (editor indeksni yashirib, qator qo'shishga ruxsat beradi)."""
+    return master.loc[ids].reset_index(drop=True)
+
+
+def merge_view_edits(master: pd.DataFrame, ids, view: pd.DataFrame, edited: pd.DataFrame, edits: dict,
+                     qqs_rate: float, totals: dict):
+    """
+    Sahifa (`view` = view_frame(master, ids)) editori deltalarini asosiy jadvalga qator ID
+    bo'yicha qaytaradi: tahrirlanganlar joyida yangilanadi, o'chirilganlar olib tashlanadi,
+    yangi qatorlar oxiriga yangi ID bilan qo'shiladi. `totals` delta bilan yangilanadi.
+    Qaytadi: (yangi master, qayta hisoblangan qatorlar soni) yoki deltalar mos kelmasa None.
+    """
+    import pandas as pd
+    res = _edit_rows(view, edited, edits, qqs_rate, totals)
+    if res is None:
+        return None
+    view_out, n_dirty, groups, old_targets = res
+    if view_out is view:
+        return master, 0
+
+    ids = pd.Index(ids)
+    n_added = len(edits.get("added_rows", []))
+    deleted = ids[[int(p) for p in edits.get("deleted_rows", [])]]
+    kept = view_out.iloc[:len(view_out) - n_added]
+    kept = kept.set_axis(ids[kept.index.to_numpy()])
+    added = view_out.iloc[len(view_out) - n_added:]
+
+    out = master.drop(deleted) if len(deleted) else master.copy(deep=False)
+    for c in BUY_COLS:
+        if isinstance(out[c].dtype, pd.CategoricalDtype):
+            extra = sorted(set(kept[c].dropna().astype(str)) - set(out[c].cat.categories))
+            if extra:
+                out[c] = out[c].cat.add_categories(extra)
+        out.loc[kept.index, c] = kept[c].to_numpy()
+    if n_added:
+        start = next_row_id(master)
+        added = added.set_axis(pd.RangeIndex(start, start + n_added))
+        out = pd.concat([out, added[BUY_COLS]])
+        out["category"] = as_category(out["category"], DEFAULT_CATEGORIES)
+        out["unit"] = as_category(out["unit"], ALL_UNITS)
+    return reallocate_vat(out, qqs_rate, groups, old_targets, _category_vat(totals, qqs_rate)), n_dirty
+
+
+# --- Narx tavsiyasi va og'ishlar ---
+PRICE_OUTLIER_TOL = 0.5  # medianadan ±50% dan ko'p farq — shubhali narx
+
+
+def price_deviation(prices, refs, tol: float = PRICE_OUTLIER_TOL):
+    """
+    Narxning tarixiy narxdan nisbiy farqi va bayroq: (deviation, is_outlier) massivlari.
+    Narx yoki tarix bo'lmasa (0/NaN) — farq NaN, bayroq False.
+    """
+    import numpy as np
+    import pandas as pd
+    p = pd.to_numeric(pd.Series(prices), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    r = pd.to_numeric(pd.Series(refs), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dev = np.where((p > 0) & (r > 0), p / r - 1.0, np.nan)
+        flag = (dev > tol) | (dev < 1.0 / (1.0 + tol) - 1.0)
+    return dev, flag
+
+
+# --- Reja → xarid sinxronlash: kalit bo'yicha, kiritilgan narx/miqdorlarni saqlab ---
+def sync_keys(df: pd.DataFrame) -> pd.Index:
+    """
+    Barqaror pozitsiya kaliti: kanonik nom (canonical_key — "Помидор" va "pomidor" bitta) +
+    birlik (+ takror tartib raqami, bir xil mahsulot rejada ikki marta bo'lsa).
+    """
+    import pandas as pd
+    codes, uniques = pd.factorize(df["item"].astype(str))
+    names = pd.Series([canonical_key(u) for u in uniques], dtype=str).take(codes)
+    names.index = df.index
+    units = df["unit"].astype(str)
+    nth = pd.Series(0, index=df.index) if df.empty else df.groupby([names, units], sort=False).cumcount()
+    return pd.Index(names + "\x1f" + units + "\x1f" + nth.astype(str))
+
+
+def sync_buy_from_plan(plan_df: pd.DataFrame, buy_df: pd.DataFrame, totals: dict | None = None,
+                       qqs_rate: float | None = None):
+    """
+    `buy_df` ni rejaga moslaydi: yangi reja qatorlari oxiriga qo'shiladi, rejadan o'chirilganlari
+    olib tashlanadi (olingan bo'lsa — qoladi), moslarida nom/kategoriya/reja miqdori yangilanadi.
+    bought / actual_qty / unit_price_gross va qator ID lari saqlanadi; tegilmagan qatorlar
+    qayta hisoblanmaydi. `totals` berilsa delta bilan yangilanadi; `qqs_rate` berilsa va
+    olingan qatorning kategoriyasi o'zgarsa, QQS qayta taqsimlanadi.
+    Qaytadi: (yangi jadval, {"added", "removed", "updated"}).
+    """
+    import numpy as np
+    import pandas as pd
+    plan = plan_df[PLAN_COLS]
+    pos = sync_keys(buy_df).get_indexer(sync_keys(plan))  # xesh indeks: reja qatori -> xarid pozitsiyasi
+    matched = pos >= 0
+
+    # Mos kelganlar: faqat haqiqatan farq qilganlari yoziladi
+    bpos = pos[matched]
+    old = buy_df.iloc[bpos]
+    new = plan[matched].set_axis(old.index)
+    new_qty = coerce_qty_array(new["plan_qty"], new["unit"])
+    diff = (
+        (old["item"].astype(str).to_numpy() != new["item"].astype(str).to_numpy())
+        | (old["category"].astype(str).to_numpy() != new["category"].astype(str).to_numpy())
+        | ~np.isclose(old["plan_qty"].to_numpy(dtype="float64"), new_qty, equal_nan=True)
+    )
+    upd_ids = old.index[diff]
+
+    # Rejada yo'q va olinmagan qatorlar o'chiriladi
+    in_plan = np.zeros(len(buy_df), dtype=bool)
+    in_plan[bpos] = True
+    removed_ids = buy_df.index[~in_plan & ~buy_df["bought"].to_numpy(dtype=bool)]
+
+    out = buy_df.drop(removed_ids) if len(removed_ids) else buy_df.copy(deep=False)
+    if len(upd_ids):
+        if totals is not None:
+            _add_to_totals(totals, out.loc[upd_ids], sign=-1)
+        extra = sorted(set(new.loc[upd_ids, "category"].dropna().astype(str)) - set(out["category"].cat.categories))
+        if extra:
+            out["category"] = out["category"].cat.add_categories(extra)
+        out.loc[upd_ids, "item"] = new.loc[upd_ids, "item"].to_numpy()
+        out.loc[upd_ids, "category"] = new.loc[upd_ids, "category"].astype(str).to_numpy()
+        out.loc[upd_ids, "plan_qty"] = new_qty[diff]
+        if totals is not None:
+            _add_to_totals(totals, out.loc[upd_ids], sign=1)
+
+    n_added = int((~matched).sum())
+    if n_added:
+        start = next_row_id(buy_df)
+        added = buy_frame_from_plan(plan[~matched]).set_axis(pd.RangeIndex(start, start + n_added))
+        added["plan_qty"] = coerce_qty_array(added["plan_qty"], added["unit"])
+        out = pd.concat([out, added])
+        out["category"] = as_category(out["category"], DEFAULT_CATEGORIES)
+        out["unit"] = as_category(out["unit"], ALL_UNITS)
+    if qqs_rate is not None and out.loc[upd_ids, "bought"].to_numpy(dtype=bool).any():
+        out = allocate_vat(out, qqs_rate)
+    return out, {"added": n_added, "removed": len(removed_ids), "updated": len(upd_ids)}
+
+
+def frame_hash(df: pd.DataFrame, index: bool = False) -> str:
+    """DataFrame mazmuni (ustunlar + qiymatlar, `index=True` bo'lsa qator ID lari ham) xeshi — saqlash/kesh kaliti."""
+    import hashlib
+    import pandas as pd
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=index).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def plan_download_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue().encode("utf-8")
+
+
+# Bundan katta varaqlar XlsxWriter constant_memory rejimida qatorma-qator yoziladi
+EXCEL_CONSTANT_MEMORY_ROWS = 50_000
+
+
+def _write_sheet_rows(wb, name: str, df: pd.DataFrame, header_fmt) -> None:
+    """constant_memory faqat ketma-ket qatorlarni qabul qiladi — shuning uchun write_row."""
+    ws = wb.add_worksheet(name)
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+    cols = []
+    for c in df.columns:
+        vals = df[c].astype(object)
+        # NaN / pd.NA / NaT -> bo'sh katak (pandas kabi) — har qanday turdagi ustunda
+        cols.append(vals.where(vals.notna(), None).tolist())
+    for i, row in enumerate(zip(*cols), start=1):
+        ws.write_row(i, 0, row)
+
+
+def purchases_excel_bytes(buy_df: pd.DataFrame, summary_df: pd.DataFrame, cat_df: pd.DataFrame,
+                          constant_memory: bool | None = None) -> bytes:
+    import pandas as pd
+    sheets = [("Purchases", buy_df), ("Summary", summary_df), ("ByCategory", cat_df)]
+    if constant_memory is None:
+        constant_memory = len(buy_df) >= EXCEL_CONSTANT_MEMORY_ROWS
+    bio = io.BytesIO()
+    if constant_memory:
+        import xlsxwriter
+        wb = xlsxwriter.Workbook(bio, {"constant_memory": True})
+        header_fmt = wb.add_format({"bold": True, "border": 1})
+        for name, df in sheets:
+            _write_sheet_rows(wb, name, df, header_fmt)
+        wb.close()
+    else:
+        with pd.ExcelWriter(bio, engine="xlsxwriter") as xw:
+            for name, df in sheets:
+                df.to_excel(xw, sheet_name=name, index=False)
+    bio.seek(0)
+    return bio.read()
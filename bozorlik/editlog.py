@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Tahrirlar jurnali: undo/redo, o'tgan holatga qaytish va tiklash — to'liq jadval nusxalarisiz.
+
+Har qadam — jadvallar (reja, chek) bo'yicha qator ID darajasidagi delta: o'zgargan kataklar
+(eski va yangi qiymat), qo'shilgan va o'chirilgan qatorlar (pozitsiyasi bilan). Delta ikki
+tomonga qo'llanadi, shuning uchun xotira tahrirlar soniga qarab o'sadi, jadval hajmiga emas:
+to'liq holat sifatida faqat joriy jadvallar (sessiyadagi obyektlarning o'zi) saqlanadi.
+
+    log = EditLog({"plan": (plan_df, PLAN_COLS), "buy": (buy_df, BUY_INPUT_COLS)})
+    log.record({"plan": new_plan}, "Bulk qo'shish")
+    log.undo(); log.state["plan"]      # oldingi holat
+
+Deltalar JSON ga aylanadi (oddiy ro'yxatlar) — TripStore ularni safar jurnaliga yozadi va
+safar ochilganda oxirgi snapshotdan keyingilarini qayta qo'llaydi.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+MAX_STEPS = 200  # xotirada saqlanadigan undo qadamlari
+
+
+def _values(s: pd.Series) -> list:
+    """Ustun -> JSON ga yaraydigan ro'yxat (NaN -> None, categorical -> matn, numpy -> Python)."""
+    import pandas as pd
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        return [None if v != v else v for v in s.astype("float64").tolist()]
+    return s.astype(object).where(s.notna(), None).tolist()
+
+
+def _rows(df: pd.DataFrame, cols) -> list:
+    return [list(r) for r in zip(*(_values(df[c]) for c in cols))] if len(df) else []
+
+
+def frame_delta(old: pd.DataFrame, new: pd.DataFrame, cols) -> dict | None:
+    """
+    `old` -> `new` o'tishi (qator ID = indeks): {"cells": {ustun: [ids, eski, yangi]},
+    "added" / "removed": {"ids", "pos", "rows"}, "order": None yoki {"before", "after"}}.
+    Tartib faqat umumiy qatorlar o'rni almashganda to'liq yoziladi. O'zgarish yo'q — None.
+    """
+    import numpy as np
+
+    from bozorlik.core import changed_mask
+    cols = list(cols)
+    if old.index.equals(new.index):  # faqat kataklar o'zgargan (eng ko'p uchraydigan holat)
+        in_new, in_old = np.ones(len(old), dtype=bool), np.ones(len(new), dtype=bool)
+    else:
+        in_new, in_old = old.index.isin(new.index), new.index.isin(old.index)
+    removed_pos = np.flatnonzero(~in_new)
+    added_pos = np.flatnonzero(~in_old)
+    kept_old, kept_new = old.index[in_new], new.index[in_old]
+    order = None
+    if kept_old.equals(kept_new):
+        a = old if in_new.all() else old[in_new]
+        b = new if in_old.all() else new[in_old]
+    else:
+        order = {"before": old.index.tolist(), "after": new.index.tolist()}
+        a, b = old.loc[kept_new], new[in_old]
+    cells = {}
+    for c in cols:
+        idx = np.flatnonzero(changed_mask(a[c], b[c]))
+        if len(idx):
+            cells[c] = [kept_new[idx].tolist(), _values(a[c].iloc[idx]), _values(b[c].iloc[idx])]
+    if not (cells or len(removed_pos) or len(added_pos) or order):
+        return None
+    return {
+        "cols": cols,
+        "cells": cells,
+        "added": {"ids": new.index[added_pos].tolist(), "pos": added_pos.tolist(), "rows": _rows(new.iloc[added_pos], cols)},
+        "removed": {"ids": old.index[removed_pos].tolist(), "pos": removed_pos.tolist(),
+                    "rows": _rows(old.iloc[removed_pos], cols)},
+        "order": order,
+    }
+
+
+def invert_delta(delta: dict) -> dict:
+    """Teskari delta (`new` -> `old`); ro'yxatlar nusxalanmaydi."""
+    order = delta["order"]
+    return {
+        "cols": delta["cols"],
+        "cells": {c: [ids, new, old] for c, (ids, old, new) in delta["cells"].items()},
+        "added": delta["removed"],
+        "removed": delta["added"],
+        "order": order and {"before": order["after"], "after": order["before"]},
+    }
+
+
+def apply_delta(df: pd.DataFrame, delta: dict) -> pd.DataFrame:
+    """Deltani jadvalga qo'llaydi (ID bo'yicha). Dtype lar chaqiruvchi sxemasi bilan tiklanadi."""
+    import numpy as np
+    import pandas as pd
+
+    from bozorlik.core import replace_at
+    removed, added = delta["removed"], delta["added"]
+    out = df.drop(pd.Index(removed["ids"]), errors="ignore") if removed["ids"] else df.copy(deep=False)
+    for c, (ids, _old, new) in delta["cells"].items():
+        pos = out.index.get_indexer(ids)
+        keep = pos >= 0
+        if keep.any():
+            out[c] = replace_at(out[c], pos[keep], [v for v, k in zip(new, keep) if k])
+    if added["ids"]:
+        rows = pd.DataFrame(added["rows"], columns=delta["cols"], index=pd.Index(added["ids"], dtype=out.index.dtype))
+        # Yangi qatorlar saqlangan pozitsiyalariga (o'sish tartibida), qolganlari eski tartibda
+        n, k = len(out), len(rows)
+        slot = np.zeros(n + k, dtype=bool)
+        pos = np.minimum(np.asarray(added["pos"], dtype="int64"), n + k - 1)
+        slot[pos] = True
+        take = np.empty(n + k, dtype="int64")
+        take[pos] = n + np.arange(k)
+        take[~slot] = np.arange(n + k - int(slot.sum()))
+        out = pd.concat([out, rows]).iloc[take]
+    if delta["order"]:
+        target = [i for i in delta["order"]["after"] if i in out.index]
+        if len(target) == len(out):
+            out = out.loc[target]
+    return out
+
+
+def delta_cells(delta: dict) -> int:
+    """Deltadagi kataklar soni (xotira/disk o'lchovi uchun)."""
+    n_cols = len(delta["cols"])
+    return (sum(len(ids) for ids, _, _ in delta["cells"].values())
+            + n_cols * (len(delta["added"]["ids"]) + len(delta["removed"]["ids"])))
+
+
+class EditLog:
+    """
+    Sessiya jurnali: `steps[:cursor]` qo'llangan, qolgani — redo. Joriy jadvallar `state` da;
+    `pending` — hali diskka yozilmagan (qo'llangan) o'zgarishlar, `drain()` bilan olinadi.
+    """
+
+    def __init__(self, tables: dict, max_steps: int = MAX_STEPS):
+        self.cols = {k: list(cols) for k, (_, cols) in tables.items()}
+        self.state = {k: df for k, (df, _) in tables.items()}
+        self.steps = []     # [{"label", "at", "ops": {jadval: delta}}]
+        self.cursor = 0
+        self.pending = []   # [(label, {jadval: delta})] — qo'llangan tartibda
+        self.max_steps = max_steps
+
+    def _push(self, ops: dict, label: str) -> None:
+        del self.steps[self.cursor:]
+        self.steps.append({"label": label, "at": dt.datetime.now().strftime("%H:%M:%S"), "ops": ops})
+        if len(self.steps) > self.max_steps:
+            del self.steps[0]
+        self.cursor = len(self.steps)
+
+    def record(self, frames: dict, label: str = "") -> bool:
+        """Joriy holatdan farqni bitta qadam sifatida yozadi (obyekt o'zgarmagan jadval solishtirilmaydi)."""
+        ops = {}
+        for k, df in frames.items():
+            if df is self.state[k]:
+                continue
+            d = frame_delta(self.state[k], df, self.cols[k])
+            self.state[k] = df
+            if d is not None:
+                ops[k] = d
+        if not ops:
+            return False
+        self._push(ops, label)
+        self.pending.append((label, ops))
+        return True
+
+    def replay(self, ops: dict, label: str = "") -> None:
+        """Diskdagi jurnal qadamini qo'llaydi va undo ro'yxatiga qo'shadi (diskka qayta yozilmaydi)."""
+        for k, d in ops.items():
+            self.state[k] = apply_delta(self.state[k], d)
+        self._push(ops, label)
+
+    def _apply(self, ops: dict, label: str) -> None:
+        for k, d in ops.items():
+            self.state[k] = apply_delta(self.state[k], d)
+        self.pending.append((label, ops))
+
+    def undo(self) -> bool:
+        if self.cursor == 0:
+            return False
+        self.cursor -= 1
+        step = self.steps[self.cursor]
+        self._apply({k: invert_delta(d) for k, d in step["ops"].items()}, f"Bekor qilindi: {step['label']}")
+        return True
+
+    def redo(self) -> bool:
+        if self.cursor >= len(self.steps):
+            return False
+        step = self.steps[self.cursor]
+        self._apply(step["ops"], f"Qaytarildi: {step['label']}")
+        self.cursor += 1
+        return True
+
+    def goto(self, cursor: int) -> int:
+        """`cursor` qadamdan keyingi holatga o'tadi (oraliq deltalar ketma-ket qo'llanadi). Qaytadi: qadamlar soni."""
+        cursor = min(max(int(cursor), 0), len(self.steps))
+        moved = 0
+        while self.cursor > cursor and self.undo():
+            moved += 1
+        while self.cursor < cursor and self.redo():
+            moved += 1
+        return moved
+
+    def drain(self) -> list:
+        out, self.pending = self.pending, []
+        return out
+
+    def cells(self) -> int:
+        """Jurnaldagi jami kataklar (xotira hajmi o'lchovi)."""
+        return sum(delta_cells(d) for s in self.steps for d in s["ops"].values())
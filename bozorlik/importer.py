@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Katta reja fayllarini (yetkazib beruvchi ro'yxatlari) tekshirib import qilish: CSV, Excel (.xlsx),
+Parquet / Arrow.
+
+    res = import_plan("ta'minot.csv")
+    res["plan"]      # toza reja (PLAN_COLS, sxema bilan)
+    res["report"]    # rad etilgan / tuzatilgan kataklar: line, column, value, reason, action
+
+CSV bo'laklab o'qiladi: pyarrow bo'lsa oqimli o'quvchi (`pyarrow.csv.open_csv`, IMPORT_BLOCK_BYTES
+bloklar), bo'lmasa `pd.read_csv(chunksize=...)`. Barcha ustunlar matn sifatida o'qiladi — dtype
+taxmin qilinmaydi, sonlar tekshiruvda o'giriladi. Excel `openpyxl` ning read_only rejimida
+qatorma-qator o'qiladi. Xotirada bir vaqtda bitta bo'lak va tayyor (categorical) natija turadi.
+
+Tekshiruv: nomsiz qator, son bo'lmagan yoki manfiy miqdor, ALL_UNITS da yo'q birlik — rad etiladi.
+Bo'sh birlik/kategoriya va DEFAULT_CATEGORIES da yo'q kategoriya infer_units / infer_categories
+bilan to'ldiriladi, butun birlikdagi kasr miqdor kesiladi — hisobotda "tuzatildi" deb yoziladi.
+Kategoriya ustuni umuman bo'lmasa hamma qatorga nomdan aniqlanadi (hisobotga yozilmaydi).
+Qator raqami — fayldagi qator (sarlavha = 1); bo'sh qatorlar o'tkazib yuboriladi, lekin sanaladi.
+"""
+from __future__ import annotations
+
+import csv
+import importlib.util
+import os
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from bozorlik.core import (
+    ALL_UNITS,
+    DEFAULT_CATEGORIES,
+    PLAN_COLS,
+    UNITS_FLOAT,
+    apply_plan_schema,
+    infer_categories,
+    infer_units,
+)
+from bozorlik.names import canonical_key
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+IMPORT_CHUNK_ROWS = 50_000       # pandas / Excel bo'lagi (qatorlar)
+IMPORT_BLOCK_BYTES = 4 << 20     # pyarrow CSV bloki (baytlar)
+MAX_REPORT_ROWS = 10_000         # hisobotda batafsil saqlanadigan yozuvlar; qolgani faqat sanaladi
+REQUIRED_COLS = ["item", "unit", "plan_qty"]
+REPORT_COLS = ["line", "column", "value", "reason", "action"]
+REJECTED = "rad etildi"
+FIXED = "tuzatildi"
+FORMATS = {".csv": "csv", ".txt": "csv", ".xlsx": "xlsx", ".xlsm": "xlsx",
+           ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+# Ko'p uchraydigan qisqartmalar (kanonik kalit bo'yicha; kirill yozilishlar kalitda lotinga o'tadi)
+UNIT_ALIASES = {"l": "litr", "ltr": "litr", "litr": "litr", "kilogramm": "kg", "kilo": "kg", "sht": "dona",
+                "ta": "dona", "karobka": "karobka", "korobka": "karobka", "quti": "karobka", "paket": "qadoq"}
+
+
+def excel_available() -> bool:
+    return importlib.util.find_spec("openpyxl") is not None
+
+
+def format_of(name: str) -> str | None:
+    """Fayl nomi kengaytmasi bo'yicha format ("csv" / "xlsx" / "parquet" / "arrow") yoki None."""
+    return FORMATS.get(os.path.splitext(str(name))[1].lower())
+
+
+@lru_cache(maxsize=1)
+def _units():
+    return {**UNIT_ALIASES, **{canonical_key(u): u for u in ALL_UNITS}}
+
+
+@lru_cache(maxsize=1)
+def _categories():
+    return {canonical_key(c): c for c in DEFAULT_CATEGORIES}
+
+
+def _lookup(text: pd.Series, table: dict) -> pd.Series:
+    """Matn ustuni -> jadvaldagi qiymat (kanonik kalit bo'yicha, har noyob qiymat bir marta); topilmasa NaN."""
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(text)
+    found = np.array([table.get(canonical_key(u)) for u in uniques] + [None], dtype=object)
+    return pd.Series(found[codes], index=text.index)
+
+
+def _text(s: pd.Series) -> pd.Series:
+    return s.fillna("").astype(str).str.strip()
+
+
+# --- O'qish: bo'laklar (barcha ustunlar matn) ---
+def _header(source, encoding: str = "utf-8-sig"):
+    """CSV sarlavhasi va ajratgich (`,` `;` tab `|`); fayl obyekti boshiga qaytariladi."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            first = f.readline()
+    else:
+        pos = source.tell()
+        first = source.readline()
+        source.seek(pos)
+    line = first.decode(encoding, errors="replace") if isinstance(first, bytes) else first
+    try:
+        sep = csv.Sniffer().sniff(line, delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    return next(csv.reader([line], delimiter=sep), []), sep
+
+
+def _lower(cols) -> list:
+    return [str(c).strip().lower() for c in cols]
+
+
+def iter_csv_chunks(source, chunk_rows: int = IMPORT_CHUNK_ROWS, block_bytes: int = IMPORT_BLOCK_BYTES):
+    """CSV (yo'l yoki fayl obyekti) -> matn ustunli DataFrame bo'laklari (ustun nomlari kichik harfda)."""
+    import pandas as pd
+    header, sep = _header(source)
+    if importlib.util.find_spec("pyarrow") is not None:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        reader = pacsv.open_csv(
+            os.fspath(source) if isinstance(source, os.PathLike) else source,
+            read_options=pacsv.ReadOptions(block_size=block_bytes, encoding="utf8"),
+            parse_options=pacsv.ParseOptions(delimiter=sep, ignore_empty_lines=False),
+            convert_options=pacsv.ConvertOptions(column_types={h: pa.string() for h in header},
+                                                 strings_can_be_null=True),
+        )
+        names = None
+        for batch in reader:
+            df = batch.to_pandas()
+            names = names or _lower(df.columns)
+            yield df.set_axis(names, axis=1)
+        return
+    for df in pd.read_csv(source, sep=sep, dtype=str, keep_default_na=False, skip_blank_lines=False,
+                          chunksize=chunk_rows, encoding="utf-8-sig"):
+        yield df.set_axis(_lower(df.columns), axis=1)
+
+
+def iter_xlsx_chunks(source, chunk_rows: int = IMPORT_CHUNK_ROWS):
+    """Excel (.xlsx) ning birinchi varag'i -> DataFrame bo'laklari; openpyxl read_only — qatorma-qator."""
+    import openpyxl
+    import pandas as pd
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        names = _lower(c if c is not None else "" for c in next(rows, ()))
+        buf = []
+        for r in rows:
+            buf.append(r[:len(names)])
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=names, dtype=object)
+                buf = []
+        if buf or not names:
+            yield pd.DataFrame(buf, columns=names, dtype=object)
+    finally:
+        wb.close()
+
+
+def iter_chunks(source, name: str | None = None, chunk_rows: int = IMPORT_CHUNK_ROWS):
+    """Format bo'yicha bo'laklar (Parquet / Arrow — bitta bo'lak, fayl xotiraga akslantiriladi)."""
+    fmt = format_of(name or (source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")))
+    if fmt == "csv":
+        yield from iter_csv_chunks(source, chunk_rows)
+    elif fmt == "xlsx":
+        yield from iter_xlsx_chunks(source, chunk_rows)
+    elif fmt in ("parquet", "arrow"):
+        from bozorlik import columnar
+        df, _ = columnar.read_frame(source, fmt)
+        yield df.set_axis(_lower(df.columns), axis=1)
+    else:
+        raise ValueError("format aniqlanmadi (.csv, .xlsx, .parquet yoki .arrow kutiladi)")
+
+
+# --- Tekshiruv ---
+def validate_chunk(raw: pd.DataFrame, first_line: int = 2):
+    """
+    Bitta bo'lak (ustunlar kichik harfda) -> (toza reja, hisobot, {"lines", "rows", "rejected", "fixed"}).
+    `first_line` — bo'lakning birinchi qatori fayldagi raqami; butunlay bo'sh qatorlar tashlanadi.
+    """
+    import numpy as np
+    import pandas as pd
+    miss = [c for c in REQUIRED_COLS if c not in raw.columns]
+    if miss:
+        raise ValueError(f"ustunlar yetarli emas. Kerak: item, unit, plan_qty (topilmadi: {', '.join(miss)}).")
+    n_lines = len(raw)
+    lines = np.arange(first_line, first_line + n_lines)
+    raw = raw.reset_index(drop=True)
+    qty_raw = raw["plan_qty"]
+    numeric = pd.api.types.is_numeric_dtype(qty_raw.dtype)  # Parquet / Arrow: ustun allaqachon son
+    text = {c: _text(raw[c]) for c in ("item", "unit", "category") if c in raw.columns}
+    text["plan_qty"] = qty_raw.astype(str).where(qty_raw.notna(), "") if numeric else _text(qty_raw)
+    blank = np.logical_and.reduce([(t == "").to_numpy() for t in text.values()])
+    if blank.any():
+        lines, qty_raw = lines[~blank], qty_raw[~blank].reset_index(drop=True)
+        text = {c: t[~blank].reset_index(drop=True) for c, t in text.items()}
+    notes = []  # (mask, ustun, qiymatlar, sabab, amal)
+
+    item = text["item"]
+    bad_item = (item == "").to_numpy()
+    notes.append((bad_item, "item", item, "mahsulot nomi bo'sh", REJECTED))
+
+    qty_txt = text["plan_qty"]
+    if numeric:
+        qty = qty_raw.astype("float64")
+    else:
+        qty = pd.to_numeric(qty_txt.str.replace(",", ".", regex=False).str.replace(" ", "", regex=False),
+                            errors="coerce").astype("float64")
+    qty_v = qty.to_numpy()
+    no_qty = np.isnan(qty_v)
+    neg_qty = qty_v < 0
+    notes.append((no_qty, "plan_qty", qty_txt, "miqdor son emas", REJECTED))
+    notes.append((neg_qty, "plan_qty", qty_txt, "manfiy miqdor", REJECTED))
+
+    unit_txt = text["unit"]
+    unit = _lookup(unit_txt, _units())
+    no_unit = (unit_txt == "").to_numpy()
+    bad_unit = unit.isna().to_numpy() & ~no_unit
+    if no_unit.any():
+        unit[no_unit] = infer_units(item[no_unit]).to_numpy()
+    notes.append((bad_unit, "unit", unit_txt, "noma'lum birlik", REJECTED))
+    notes.append((no_unit, "unit", unit_txt, "birlik bo'sh — nomdan aniqlandi", FIXED))
+
+    if "category" in text:
+        cat_txt = text["category"]
+        cat = _lookup(cat_txt, _categories())
+        guess = cat.isna().to_numpy()
+        no_cat = (cat_txt == "").to_numpy()
+        notes.append((guess & ~no_cat, "category", cat_txt, "noma'lum kategoriya — nomdan aniqlandi", FIXED))
+        notes.append((no_cat, "category", cat_txt, "kategoriya bo'sh — nomdan aniqlandi", FIXED))
+    else:
+        cat, guess = pd.Series(None, index=item.index, dtype=object), np.ones(len(item), dtype=bool)
+    if guess.any():
+        cat[guess] = infer_categories(item[guess]).to_numpy()
+
+    # Butun birlikdagi kasr miqdor coerce_qty kabi kesiladi — endi hisobotda ko'rinadi
+    is_int = ~unit.isin(UNITS_FLOAT).to_numpy()
+    with np.errstate(invalid="ignore"):
+        frac = is_int & ~no_qty & (qty_v != np.trunc(qty_v))
+        qty_v = np.where(is_int, np.trunc(qty_v), np.round(qty_v, 3))
+    notes.append((frac & ~neg_qty, "plan_qty", qty_txt, "butun birlikda kasr miqdor — kesildi", FIXED))
+
+    rejected = bad_item | no_qty | neg_qty | bad_unit
+    ok = ~rejected
+    plan = apply_plan_schema(pd.DataFrame(
+        {"item": item[ok].to_numpy(), "category": cat[ok].to_numpy(), "unit": unit[ok].to_numpy(),
+         "plan_qty": qty_v[ok]},
+        columns=PLAN_COLS,
+    ))
+    notes = [(m & ok if action == FIXED else m, *rest, action) for m, *rest, action in notes]  # rad etilganlar tuzatilmaydi
+    parts = [
+        pd.DataFrame({"line": lines[m], "column": col, "value": vals.to_numpy()[m], "reason": reason, "action": action})
+        for m, col, vals, reason, action in notes if m.any()
+    ]
+    report = (pd.concat(parts, ignore_index=True).sort_values("line", kind="stable", ignore_index=True)
+              if parts else pd.DataFrame(columns=REPORT_COLS))
+    fixed = np.logical_or.reduce([m for m, *_, action in notes if action == FIXED])
+    return plan, report[REPORT_COLS], {"lines": n_lines, "rows": len(item), "rejected": int(rejected.sum()),
+                                       "fixed": int(fixed.sum())}
+
+
+def import_plan(source, name: str | None = None, chunk_rows: int = IMPORT_CHUNK_ROWS, progress=None,
+                max_report: int = MAX_REPORT_ROWS) -> dict:
+    """
+    Faylni bo'laklab o'qib tekshiradi. `progress(rows_read)` har bo'lakdan keyin chaqiriladi.
+    Qaytadi: {"plan", "report", "rows", "accepted", "rejected", "fixed", "report_total", "seconds", "rows_per_s"}.
+    Majburiy ustun bo'lmasa — ValueError.
+    """
+    import pandas as pd
+    t0 = time.perf_counter()
+    plans, reports = [], []
+    stats = {"lines": 0, "rows": 0, "rejected": 0, "fixed": 0}
+    kept = report_total = 0
+    for raw in iter_chunks(source, name, chunk_rows):
+        plan, report, st = validate_chunk(raw, first_line=2 + stats["lines"])
+        for k in stats:
+            stats[k] += st[k]
+        plans.append(plan)
+        report_total += len(report)
+        if kept < max_report and len(report):
+            reports.append(report.head(max_report - kept))
+            kept += len(reports[-1])
+        if progress is not None:
+            progress(stats["rows"])
+    plan = pd.concat(plans, ignore_index=True) if plans else apply_plan_schema(pd.DataFrame(columns=PLAN_COLS))
+    secs = time.perf_counter() - t0
+    return {
+        "plan": apply_plan_schema(plan),
+        "report": pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=REPORT_COLS),
+        "rows": stats["rows"],
+        "accepted": stats["rows"] - stats["rejected"],
+        "rejected": stats["rejected"],
+        "fixed": stats["fixed"],
+        "report_total": report_total,
+        "seconds": secs,
+        "rows_per_s": stats["rows"] / max(secs, 1e-9),
+    }
+
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Fon vazifalari: hisobot/eksport qurish skript oqimidan tashqarida.
+
+    jobs = JobQueue(max_workers=2, cache=ArtifactCache("exports"))
+    job = jobs.submit(report_key("xlsx", buy_df), excel_bytes, buy_df, name="hisobot.xlsx")
+    job.status            # navbatda / ishlamoqda / tayyor / xato / bekor
+    jobs.result(job.key)  # tayyor bo'lsa baytlar (diskdagi keshdan)
+
+Vazifa kaliti — ma'lumot versiyasi (mazmun xeshi): bir xil kalit qayta yuborilsa yangi
+vazifa ochilmaydi, tayyor natija keshdan beriladi. Natija baytlari `ArtifactCache` ga
+(diskda, umumiy hajm bo'yicha LRU) yoziladi. Oqimlar hovuzi (Streamlit) yoki protsesslar
+hovuzi (CLI, ko'p hisobot parallel) — `processes=True`; protsessda funksiya va argumentlar
+pickle qilinadigan bo'lishi kerak. Har vazifa uchun navbatda kutish va ishlash vaqti yoziladi.
+"""
+from __future__ import annotations
+
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "navbatda", "ishlamoqda", "tayyor", "xato", "bekor"
+MAX_JOBS = 256  # xotirada saqlanadigan tugagan vazifalar (metrikalar uchun)
+RETRY_AFTER_S = 30.0  # xato bilan tugagan vazifa shuncha vaqtdan keyin qayta yuboriladi
+
+
+class ArtifactCache:
+    """
+    Diskdagi LRU: kalit -> fayl (`root/<kalit>`), umumiy hajm `max_bytes` bilan chegaralangan.
+    Yozish atomar (vaqtinchalik fayl + os.replace) — o'quvchi yarim yozilgan faylni ko'rmaydi.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # kalit -> hajm, eng eskisi boshida
+        self._bytes = 0
+        os.makedirs(root, exist_ok=True)
+        found = []
+        for entry in os.scandir(root):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._files
+
+    def size(self, key: str) -> int:
+        with self._lock:
+            return self._files.get(key, 0)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if key not in self._files:
+                return None
+            self._files.move_to_end(key)
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            os.utime(self.path(key))  # qayta ochilganda ham LRU tartibi saqlansin
+        except FileNotFoundError:  # boshqa protsess o'chirgan
+            with self._lock:
+                self._bytes -= self._files.pop(key, 0)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return  # sig'maydigan natija keshlanmaydi
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path(key))
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(key, 0)
+            self._files[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._files:
+            key, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._files), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+def _timed(fn, args):
+    """Ishchida bajariladi (protsessda ham): natija va devor soati bo'yicha boshlanish/tugash."""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class Job:
+    """Bitta vazifa holati va metrikalari (sekundlarda)."""
+
+    def __init__(self, key: str, name: str = ""):
+        self.key = key
+        self.name = name
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.size = 0
+        self.error = ""
+        self.cached = False   # keshdan berildi (qayta qurilmadi)
+        self.result = None    # keshsiz navbatda — natijaning o'zi
+        self.future = None
+
+    @property
+    def status(self) -> str:
+        if self.error:
+            return FAILED
+        if self.finished is not None:
+            return DONE
+        if self.future is not None and self.future.cancelled():
+            return CANCELLED
+        if self.future is not None and (self.future.running() or self.future.done()):
+            return RUNNING  # done(), lekin natija hali yozilmoqda
+        return QUEUED
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.submitted
+
+    def metrics(self) -> dict:
+        return {
+            "key": self.key,
+            "name": self.name,
+            "status": self.status,
+            "wait_s": (self.started - self.submitted) if self.started else None,
+            "run_s": (self.finished - self.started) if self.started and self.finished else None,
+            "bytes": self.size,
+            "cached": self.cached,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Kalit bo'yicha takrorlanmaydigan vazifalar navbati: bir vaqtda `max_workers` tadan ortiq
+    ishlamaydi (qolganlari navbatda). `cache` berilsa baytli natijalar diskka yoziladi.
+    """
+
+    def __init__(self, max_workers: int = 2, cache: ArtifactCache | None = None, processes: bool = False):
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.max_workers = max_workers
+        self.cache = cache
+        self._pool = pool(max_workers=max_workers)
+        self._jobs = OrderedDict()  # kalit -> Job
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn, *args, name: str = "") -> Job:
+        """
+        Yangi vazifa yoki shu kalitdagi mavjudi. Bekor qilingan yoki natijasi keshdan chiqib
+        ketgani — qayta. Xato bilan tugagani `RETRY_AFTER_S` o'tgachgina qayta yuboriladi (vaqtinchalik
+        xato — disk, xotira — tuzalsin); ungacha o'sha xatoli vazifa qaytadi, shuning uchun har
+        rerunda qayta yuborish "xato -> rerun -> xato" aylanasiga tushmaydi.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            status = job.status if job is not None else None
+            if status in (QUEUED, RUNNING) or (
+                    status == FAILED and time.time() - job.finished < RETRY_AFTER_S) or (
+                    status == DONE and (self.cache is None or job.result is not None or key in self.cache)):
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key, name)
+            if self.cache is not None and key in self.cache:
+                job.started = job.finished = job.submitted
+                job.size, job.cached = self.cache.size(key), True
+            else:
+                job.future = self._pool.submit(_timed, fn, args)
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._trim()
+        if job.future is not None:
+            job.future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _finish(self, job: Job, future) -> None:
+        try:
+            result, job.started, finished = future.result()
+        except CancelledError:
+            return
+        except Exception as e:  # vazifa xatosi navbatni to'xtatmaydi — holatda ko'rinadi
+            job.error = f"{type(e).__name__}: {e}"
+            job.finished = time.time()
+            return
+        if isinstance(result, (bytes, bytearray)):
+            job.size = len(result)
+            if self.cache is not None:
+                self.cache.put(job.key, bytes(result))
+                result = None
+        job.result = result
+        job.finished = finished
+
+    def _trim(self) -> None:
+        done = [k for k, j in self._jobs.items() if j.status not in (QUEUED, RUNNING)]
+        for k in done[: max(0, len(self._jobs) - MAX_JOBS)]:
+            del self._jobs[k]
+
+    def get(self, key: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def result(self, key: str):
+        """Tayyor natija (keshdan yoki vazifadan); yo'q bo'lsa None."""
+        job = self.get(key)
+        if job is not None and job.result is not None:
+            return job.result
+        return self.cache.get(key) if self.cache is not None else None
+
+    def cancel(self, key: str) -> bool:
+        """Hali boshlanmagan vazifani bekor qiladi (ishlayotgani to'xtatilmaydi)."""
+        job = self.get(key)
+        return bool(job is not None and job.future is not None and job.future.cancel())
+
+    def wait(self, keys=None, timeout: float | None = None) -> list:
+        """Berilgan (yoki barcha) vazifalar tugashini kutadi; qaytadi: ularning Job lari."""
+        from concurrent.futures import wait
+        with self._lock:
+            jobs = [self._jobs[k] for k in (keys if keys is not None else list(self._jobs)) if k in self._jobs]
+        wait([j.future for j in jobs if j.future is not None], timeout=timeout)
+        # done-callback lar future tugagach chaqiriladi — natija yozilishini ham kutamiz
+        deadline = time.time() + 5.0
+        while any(j.status in (QUEUED, RUNNING) for j in jobs) and time.time() < deadline:
+            time.sleep(0.005)
+        return jobs
+
+    def stats(self) -> dict:
+        """Holatlar soni va tugagan vazifalar bo'yicha kutish/ishlash vaqtlari (median, maksimum)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        out = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for j in jobs:
+            out[j.status] += 1
+        ran = [m for m in (j.metrics() for j in jobs) if m["run_s"] is not None and not m["cached"]]
+        for name in ("wait_s", "run_s"):
+            vals = [m[name] for m in ran]
+            out[f"{name}_median"] = statistics.median(vals) if vals else None
+            out[f"{name}_max"] = max(vals) if vals else None
+        out["cached"] = sum(j.cached for j in jobs)
+        return out
+
+    def metrics(self) -> list:
+        with self._lock:
+            return [j.metrics() for j in self._jobs.values()]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Mahsulot nomlarini normallashtirish va yaqin nomlarni (xato yozilganlarini) topish.
+
+    canonical_key(" Помидор ")            # "pomidor"
+    idx = NameIndex(["Pomidor", "Olma"])
+    idx.match("pamidor")                   # "Pomidor"
+    dedupe_names(df["item"], idx)          # {yozilish: vakil nom}
+
+Kanonik kalit: kirill -> lotin (o'zbek), kichik harf, apostrof shakllari bitta, tinish
+belgilari va ortiqcha bo'shliqlarsiz. Yaqinlik — Levenshtein masofasi (uzunlikka qarab
+0-2 tahrir, raqamlar aynan bir xil bo'lishi shart). Indeks trigramlar bo'yicha: k tahrir
+ko'pi bilan 3k trigramni buzadi, shuning uchun nomzodlar faqat so'rovning eng kam uchraydigan
+3k+2 trigrami ro'yxatlaridan olinadi — katalog bo'yicha juftma-juft solishtirish yo'q.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# O'zbek kirill -> lotin (rus nomlari ham shu jadval bilan o'qiladi)
+_CYR = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "'", "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya", "ў": "o'", "қ": "q", "ғ": "g'",
+    "ҳ": "h",
+}
+_TRANSLIT = str.maketrans({**_CYR, "‘": "'", "’": "'", "ʻ": "'", "ʼ": "'", "`": "'", "´": "'"})
+_DECIMAL_COMMA_RE = re.compile(r"(?<=\d),(?=\d)")
+_JUNK_RE = re.compile(r"[^a-z0-9'%. ]+|(?<!\d)\.|\.(?!\d)")
+_DIGITS_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+@lru_cache(maxsize=65536)
+def canonical_key(name) -> str:
+    """Taqqoslash kaliti: "Pomidor ", "помидор" va "POMIDOR" -> "pomidor"."""
+    s = str(name or "").lower().translate(_TRANSLIT)
+    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+    s = _JUNK_RE.sub(" ", _DECIMAL_COMMA_RE.sub(".", s))
+    return " ".join(t for t in (w.lstrip("'") for w in s.split()) if t)  # bog' — oxiridagi apostrof qoladi
+
+
+def max_edits(key: str) -> int:
+    """So'rov uchun ruxsat etilgan tahrirlar: qisqa nomlar (sut/suv) faqat aynan mos keladi."""
+    n = len(key)
+    return 0 if n <= 4 else 1 if n <= 8 else 2
+
+
+def _trigrams(key: str) -> set:
+    s = f" {key} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein masofasi; `limit` dan oshsa limit+1 qaytadi (diagonal yo'lak, erta to'xtash)."""
+    # Umumiy bosh va oxir masofaga ta'sir qilmaydi — xato odatda bitta joyda
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    j = 0
+    while j < n - i and a[-1 - j] == b[-1 - j]:
+        j += 1
+    a, b = a[i:len(a) - j], b[i:len(b) - j]
+    big = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return big
+    if not a or not b:
+        return max(len(a), len(b))
+    prev = [j if j <= limit else big for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [big] * (len(b) + 1)
+        cur[0] = i if i <= limit else big
+        for j in range(lo, hi + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+        if min(cur[lo - 1:hi + 1]) > limit:
+            return big
+        prev = cur
+    return min(prev[-1], big)
+
+
+class NameIndex:
+    """Kanonik kalit -> ko'rsatiladigan nom; trigram indeksi bilan yaqin nom qidirish."""
+
+    def __init__(self, names=()):
+        self.names = []     # id -> ko'rsatiladigan nom (kalit uchun birinchi qo'shilgani)
+        self.keys = []      # id -> kanonik kalit
+        self._ids = {}      # kalit -> id
+        self._postings = {}  # trigram -> [id, ...]
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name) -> int:
+        key = canonical_key(name)
+        if key in self._ids:
+            return self._ids[key]
+        i = len(self.names)
+        self.names.append(str(name).strip())
+        self.keys.append(key)
+        self._ids[key] = i
+        for g in _trigrams(key):
+            self._postings.setdefault(g, []).append(i)
+        return i
+
+    def copy(self) -> NameIndex:
+        out = NameIndex()
+        out.names, out.keys, out._ids = list(self.names), list(self.keys), dict(self._ids)
+        out._postings = {g: list(ids) for g, ids in self._postings.items()}
+        return out
+
+    def _lookup(self, key: str):
+        """(id, masofa) — aynan kalit yoki eng yaqin nom; topilmasa None."""
+        if key in self._ids:
+            return self._ids[key], 0
+        k = max_edits(key)
+        if k == 0 or not key:
+            return None
+        # k tahrir so'rov trigramlaridan ko'pi bilan 3k tasini buzadi: eng kam uchraydigan 3k+2
+        # trigramdan kamida 2 tasi nomzodda bo'lishi shart (ko'p uchraydiganlari skanerlanmaydi)
+        grams = sorted(_trigrams(key), key=lambda g: len(self._postings.get(g, ())))[:3 * k + 2]
+        need = len(grams) - 3 * k
+        shared = Counter()
+        for g in grams:
+            shared.update(self._postings.get(g, ()))
+        cand = [i for i, c in shared.items() if c >= need and abs(len(self.keys[i]) - len(key)) <= k]
+        digits = _DIGITS_RE.findall(key)
+        best = None
+        for i in sorted(cand):
+            other = self.keys[i]
+            if _DIGITS_RE.findall(other) != digits:
+                continue
+            d = edit_distance(key, other, k if best is None else best[1] - 1)
+            if d <= k and (best is None or d < best[1]):
+                best = (i, d)
+                if d == 1:
+                    break
+        return best
+
+    def match(self, name) -> str | None:
+        """Katalogdagi mos nom (aynan yoki xato yozilgan) yoki None."""
+        hit = self._lookup(canonical_key(name))
+        return None if hit is None else self.names[hit[0]]
+
+
+def dedupe_names(names, index: NameIndex | None = None, weights=None) -> dict:
+    """
+    Yozilishlar -> vakil nom. Katalogdagi (`index`) nomlar ustun; qolganlari ko'p uchragani
+    (`weights` — tayyor sonlar, bo'lmasa takrorlar sanaladi) birinchi bo'lib vakil bo'ladi va
+    kamroq uchraydigan yaqin yozilishlar unga qo'shiladi. `index` o'zgartirilmaydi.
+    """
+    import pandas as pd
+    names = pd.Series(list(names), dtype=object)
+    w = pd.Series(1 if weights is None else list(weights), index=names.index, dtype="int64")
+    ok = names.notna()
+    names = names[ok].astype(str)
+    counts = w[ok].groupby(names.to_numpy(), sort=False).sum()
+    groups = {}  # kalit -> [jami soni, eng ko'p yozilish, uning soni]
+    for name, n in counts.items():
+        key = canonical_key(name)
+        if not key:
+            continue
+        g = groups.setdefault(key, [0, name.strip(), 0])
+        g[0] += n
+        if n > g[2]:
+            g[1], g[2] = name.strip(), n
+    reps = index.copy() if index is not None else NameIndex()
+    rep_of = {}
+    for key in sorted(groups, key=lambda k: (-groups[k][0], k)):
+        hit = reps._lookup(key)
+        rep_of[key] = reps.names[hit[0]] if hit is not None else reps.names[reps.add(groups[key][1])]
+    return {name: rep_of[canonical_key(name)] for name in counts.index if canonical_key(name)}
+
+
+def canonicalize_items(df: pd.DataFrame, index: NameIndex | None = None):
+    """`item` ustunidagi nomlarni vakil nomlarga almashtiradi. Qaytadi: (jadval, o'zgargan qatorlar soni)."""
+    mapping = {k: v for k, v in dedupe_names(df["item"], index).items() if k != v}
+    if not mapping:
+        return df, 0
+    items = df["item"].astype(str)
+    changed = items.isin(list(mapping)).to_numpy()
+    out = df.copy(deep=False)
+    out["item"] = items.map(mapping).where(changed, df["item"])
+    return out, int(changed.sum())
+
+
+def merge_plan_duplicates(plan_df: pd.DataFrame, index: NameIndex | None = None):
+    """
+    Rejadagi bir xil (yoki xato yozilgan) mahsulotlarni bitta qatorga jamlaydi: nom + birlik
+    bo'yicha, reja miqdori qo'shiladi, kategoriya va qator ID si birinchi qatordan.
+    Qaytadi: (reja, birlashgan qatorlar soni).
+    """
+    from bozorlik.core import PLAN_COLS, apply_plan_schema
+    out, _ = canonicalize_items(plan_df[PLAN_COLS], index)
+    merged = (
+        out.assign(_id=out.index)
+        .groupby(["item", "unit"], sort=False, observed=True, dropna=False)
+        .agg(category=("category", "first"), plan_qty=("plan_qty", "sum"), _id=("_id", "first"))
+        .reset_index()
+    )
+    merged = merged.set_index("_id").rename_axis(None)[PLAN_COLS]
+    return apply_plan_schema(merged), len(plan_df) - len(merged)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Rerun profili: skriptning har bir bosqichi uchun vaqt oralig'i (span), qayta ishlangan
+qatorlar va eksport baytlari.
+
+    prof = RunProfiler(capture="cprofile")   # yoki "tracemalloc" / None
+    with prof.span("recompute", rows=len(df)):
+        ...
+    record = prof.finish()                   # dict: ts, total_ms, spans, capture_file
+    append_jsonl("profile.jsonl", record)
+
+`RollingStats` oxirgi N rerun bo'yicha p50/p95/p99 ni beradi.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+CAPTURE_MODES = ("cprofile", "tracemalloc")
+
+_LOG_LOCK = threading.Lock()
+
+
+class RunProfiler:
+    """Bitta rerun uchun. Span'lar arzon (perf_counter) — doim yoqiq turishi mumkin."""
+
+    def __init__(self, capture: str | None = None, out_dir: str = "profiles"):
+        if capture not in (None, "", *CAPTURE_MODES):
+            raise ValueError(f"noma'lum capture rejimi: {capture}")
+        self.capture = capture or None
+        self.out_dir = out_dir
+        self.spans = []
+        self._t0 = time.perf_counter()
+        self._cprof = None
+        self._own_tracemalloc = False
+        if self.capture == "cprofile":
+            import cProfile
+            self._cprof = cProfile.Profile()
+            self._cprof.enable()
+        elif self.capture == "tracemalloc":
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracemalloc = True
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def span(self, name: str, rows: int | None = None, nbytes: int | None = None):
+        """Yield qilingan dict ga `rows` / `bytes` ni bosqich ichida ham yozish mumkin."""
+        rec = {"name": name, "rows": rows, "bytes": nbytes}
+        t = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["ms"] = (time.perf_counter() - t) * 1000.0
+            self.spans.append(rec)
+
+    def finish(self) -> dict:
+        total_ms = (time.perf_counter() - self._t0) * 1000.0
+        now = dt.datetime.now()
+        record = {
+            "ts": now.isoformat(timespec="milliseconds"),
+            "total_ms": total_ms,
+            "spans": self.spans,
+            "capture_file": None,
+        }
+        stem = os.path.join(self.out_dir, f"rerun-{now:%Y%m%d-%H%M%S-%f}")
+        if self._cprof is not None:
+            self._cprof.disable()
+            os.makedirs(self.out_dir, exist_ok=True)
+            record["capture_file"] = stem + ".prof"
+            self._cprof.dump_stats(record["capture_file"])
+            self._cprof = None
+        elif self.capture == "tracemalloc":
+            import tracemalloc
+            snap = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            record["mem_current"] = current
+            record["mem_peak"] = peak
+            os.makedirs(self.out_dir, exist_ok=True)
+            record["capture_file"] = stem + ".tracemalloc.txt"
+            with open(record["capture_file"], "w", encoding="utf-8") as f:
+                f.write(f"current={current} peak={peak}\n")
+                for stat in snap.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+        return record
+
+
+def _percentile(sorted_vals, q: float) -> float:
+    """Eng yaqin rang usuli (nearest-rank)."""
+    if not sorted_vals:
+        return 0.0
+    k = max(0, math.ceil(q / 100.0 * len(sorted_vals)) - 1)
+    return sorted_vals[k]
+
+
+class RollingStats:
+    """Har bir span nomi (va "total") uchun oxirgi `window` ta o'lchov."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._data = defaultdict(lambda: deque(maxlen=window))
+
+    def add(self, record: dict) -> None:
+        self._data["total"].append(record["total_ms"])
+        for s in record["spans"]:
+            self._data[s["name"]].append(s["ms"])
+
+    def percentiles(self, qs=(50, 95, 99)) -> list:
+        rows = []
+        for name, vals in self._data.items():
+            sv = sorted(vals)
+            row = {"span": name, "n": len(sv)}
+            row.update({f"p{q}_ms": _percentile(sv, q) for q in qs})
+            rows.append(row)
+        return rows
+
+
+def append_jsonl(path: str, record: dict) -> None:
+    """JSON-lines log; bir jarayondagi sessiyalar qulf bilan navbatma-navbat yozadi."""
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _LOG_LOCK:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
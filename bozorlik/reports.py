@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Eksport keshi: CSV/Excel/Parquet/Arrow baytlari mazmun xeshi bo'yicha memoizatsiya qilinadi.
+
+Rerun paytida ma'lumot o'zgarmagan bo'lsa hisobot qayta qurilmaydi — faqat xesh
+hisoblanadi. Kesh yozuvlar soni va umumiy bayt hajmi bo'yicha chegaralangan (LRU).
+Katta hisobotlar fon navbatida quriladi (bozorlik.jobs) — `report_key` vazifa kaliti bo'ladi.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from bozorlik import columnar
+from bozorlik.core import frame_hash, purchases_excel_bytes
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ReportCache:
+    """Oqimlar uchun xavfsiz LRU: kalit -> bytes, `max_entries` va `max_bytes` bilan."""
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            if len(value) > self.max_bytes:
+                return  # sig'maydigan hisobot keshlanmaydi
+            self._data[key] = value
+            self._bytes += len(value)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_or_build(self, key: str, build) -> bytes:
+        value = self.get(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            value = build()  # qulfdan tashqarida — uzoq qurish boshqa sessiyalarni to'smasin
+            self.put(key, value)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def report_key(kind: str, *parts) -> str:
+    """DataFrame qismlari frame_hash orqali, qolganlari repr orqali kalitga qo'shiladi."""
+    h = hashlib.blake2b(kind.encode("utf-8"), digest_size=16)
+    for p in parts:
+        h.update(b"\x1e")
+        h.update((frame_hash(p) if hasattr(p, "columns") else repr(p)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def csv_bytes(df: pd.DataFrame, cache: ReportCache | None = None) -> bytes:
+    """plan_download_bytes bilan bir xil natija; BytesIO ga to'g'ridan-to'g'ri yoziladi."""
+    def build():
+        bio = io.BytesIO()
+        df.to_csv(bio, index=False, encoding="utf-8")
+        return bio.getvalue()
+
+    if cache is None:
+        return build()
+    return cache.get_or_build(report_key("csv", df), build)
+
+
+def excel_report_bytes(buy_df: pd.DataFrame, summary_df: pd.DataFrame, cat_df: pd.DataFrame,
+                       qqs_rate: float, cache: ReportCache | None = None) -> bytes:
+    """3 varaqli hisobot (purchases_excel_bytes), ma'lumot va QQS stavkasi xeshi bo'yicha keshlangan."""
+    def build():
+        return purchases_excel_bytes(buy_df=buy_df, summary_df=summary_df, cat_df=cat_df)
+
+    if cache is None:
+        return build()
+    return cache.get_or_build(report_key("xlsx", buy_df, summary_df, cat_df, float(qqs_rate)), build)
+
+
+def columnar_bytes(df: pd.DataFrame, fmt: str, cache: ReportCache | None = None) -> bytes:
+    """Reja/chek jadvali Parquet yoki Arrow IPC sifatida (csv_bytes kabi keshlangan)."""
+    def build():
+        return columnar.to_bytes(df, fmt)
+
+    if cache is None:
+        return build()
+    return cache.get_or_build(report_key(fmt, df), build)
+
+
+def columnar_report_bytes(buy_df: pd.DataFrame, summary_df: pd.DataFrame, cat_df: pd.DataFrame,
+                          qqs_rate: float, fmt: str, cache: ReportCache | None = None) -> bytes:
+    """
+    To'liq hisobot bitta ustunli jadvalda: Purchases qatorlari, Summary va ByCategory esa
+    sxema metama'lumotida (JSON) — Excel dagi 3 varaqning o'rnini bosadi.
+    """
+    def build():
+        meta = {
+            "qqs_rate": float(qqs_rate),
+            "summary": summary_df.to_json(orient="records", force_ascii=False),
+            "by_category": cat_df.to_json(orient="records", force_ascii=False),
+        }
+        return columnar.to_bytes(buy_df, fmt, metadata=meta)
+
+    if cache is None:
+        return build()
+    return cache.get_or_build(report_key(f"report-{fmt}", buy_df, summary_df, cat_df, float(qqs_rate)), build)
+
+
+def report_bytes(buy_df: pd.DataFrame, qqs_rate: float, fmt: str = "xlsx") -> bytes:
+    """Chekdan to'liq hisobot (Summary va ByCategory shu yerda hisoblanadi) — CLI va fon vazifalari uchun."""
+    from bozorlik.core import buy_totals, category_totals_df, summary_df
+    totals = buy_totals(buy_df)
+    summary, cat = summary_df(totals, qqs_rate), category_totals_df(totals, qqs_rate)
+    if fmt == "xlsx":
+        return excel_report_bytes(buy_df, summary, cat, qqs_rate)
+    return columnar_report_bytes(buy_df, summary, cat, qqs_rate, fmt)
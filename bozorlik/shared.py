@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Umumiy ro'yxat: bir nechta sessiya (oila a'zolari, turli do'konlar) bitta xarid jadvalini tahrirlaydi.
+
+Jarayon ichidagi xizmat, ma'lumot SQLite (WAL) da. Har yozuv ro'yxat versiyasini bittaga
+oshiradi va tegilgan qatorlarga shu versiyani yozadi; o'chirilgan qator belgi bilan qoladi.
+Sessiya o'zi oxirgi ko'rgan versiyadan keyingi qatorlarnigina oladi (`changes`) — butun jadval
+qayta yuklanmaydi, o'zgarish bo'lmasa bitta PK o'qish (`version`).
+
+Yozish optimistik, katak darajasida: har tahrir sessiya ko'rgan eski qiymat bilan keladi va
+qator shu versiyadan beri o'zgarmagan yoki katak hali eski (yoki allaqachon yangi) qiymatda
+bo'lsa yoziladi. Bir qatorning turli kataklariga parallel tahrirlar birlashadi; bitta katakda
+to'qnashsa serverdagi qiymat qoladi va sessiya uni keyingi `changes` da oladi.
+
+line_* ustunlari saqlanmaydi — ular (QQS taqsimoti bilan) har sessiyada hisoblanadi.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+from bozorlik.core import BUY_COLS, BUY_INPUT_COLS
+from bozorlik.storage import DEFAULT_DB_PATH, _now, _rows
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Sessiyalar kiritadigan ustunlar
+SHARED_COLS = BUY_INPUT_COLS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_lists (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    qqs_rate    REAL NOT NULL,
+    version     INTEGER NOT NULL DEFAULT 0,
+    next_row    INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS shared_rows (
+    list_id           INTEGER NOT NULL REFERENCES shared_lists(id) ON DELETE CASCADE,
+    row_id            INTEGER NOT NULL,
+    version           INTEGER NOT NULL,
+    deleted           INTEGER NOT NULL DEFAULT 0,
+    editor            TEXT NOT NULL DEFAULT '',
+    item              TEXT,
+    category          TEXT,
+    unit              TEXT,
+    plan_qty          REAL,
+    bought            INTEGER,
+    actual_qty        REAL,
+    unit_price_gross  REAL,
+    PRIMARY KEY (list_id, row_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_shared_version ON shared_rows(list_id, version);
+"""
+
+
+class SharedStore:
+    """Umumiy ro'yxatlar ombori; TripStore kabi bitta ulanish qulf bilan sessiyalar orasida ulashiladi."""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    # --- ro'yxatlar ---
+    def create_list(self, name: str, buy_df: pd.DataFrame, qqs_rate: float) -> int:
+        """Joriy xarid jadvalidan yangi umumiy ro'yxat (qator ID lari 0 dan)."""
+        rows = _rows(buy_df, SHARED_COLS)
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                cur.execute(
+                    "INSERT INTO shared_lists(name, created_at, qqs_rate, version, next_row) VALUES (?, ?, ?, 1, ?)",
+                    (name, _now(), float(qqs_rate), len(rows)),
+                )
+                list_id = int(cur.lastrowid)
+                cur.executemany(
+                    "INSERT INTO shared_rows(list_id, row_id, version, " + ", ".join(SHARED_COLS) + ") "
+                    "VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)",
+                    [(list_id, i, *r) for i, r in enumerate(rows)],
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return list_id
+
+    def lists(self, limit: int = 50) -> list:
+        """[{id, name, version, rows}] — yangilari oldin."""
+        with self._lock:
+            cur = self.conn.execute(
+                """
+                SELECT l.id, l.name, l.version,
+                       (SELECT COUNT(*) FROM shared_rows r WHERE r.list_id = l.id AND r.deleted = 0)
+                FROM shared_lists l ORDER BY l.id DESC LIMIT ?
+                """,
+                (limit,),
+            )
+            return [{"id": r[0], "name": r[1], "version": r[2], "rows": r[3]} for r in cur.fetchall()]
+
+    def meta(self, list_id: int):
+        with self._lock:
+            r = self.conn.execute(
+                "SELECT id, name, qqs_rate, version FROM shared_lists WHERE id = ?", (list_id,)
+            ).fetchone()
+        if r is None:
+            return None
+        return {"id": r[0], "name": r[1], "qqs_rate": r[2], "version": r[3]}
+
+    def delete_list(self, list_id: int) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM shared_lists WHERE id = ?", (list_id,))
+
+    # --- o'zgarishlar lentasi ---
+    def version(self, list_id: int) -> int:
+        """Ro'yxatning joriy versiyasi (yo'q bo'lsa 0) — so'rov uchun arzon tekshiruv."""
+        with self._lock:
+            r = self.conn.execute("SELECT version FROM shared_lists WHERE id = ?", (list_id,)).fetchone()
+        return 0 if r is None else int(r[0])
+
+    def changes(self, list_id: int, since: int = 0):
+        """
+        `since` versiyadan keyin o'zgargan qatorlar (indeks — qator ID, `deleted` ustuni bilan)
+        va joriy versiya. since=0 — to'liq holat (o'chirilganlarsiz).
+        """
+        import pandas as pd
+        sql = ("SELECT row_id, deleted, " + ", ".join(SHARED_COLS) + " FROM shared_rows "
+               "WHERE list_id = ? AND version > ?" + (" AND deleted = 0" if since <= 0 else "") + " ORDER BY row_id")
+        with self._lock:
+            version = self.conn.execute("SELECT version FROM shared_lists WHERE id = ?", (list_id,)).fetchone()
+            rows = self.conn.execute(sql, (list_id, since)).fetchall()
+        if version is None:
+            raise KeyError(f"umumiy ro'yxat topilmadi: {list_id}")
+        cols = list(zip(*rows)) or [()] * (len(SHARED_COLS) + 2)
+        feed = pd.DataFrame(
+            {"deleted": pd.array(cols[1], dtype="bool"), **dict(zip(SHARED_COLS, cols[2:]))},
+            index=pd.Index(cols[0], dtype="int64"),  # qator ID
+        )
+        return feed, int(version[0])
+
+    def snapshot(self, list_id: int):
+        """To'liq hisoblangan xarid jadvali (indeks — qator ID) va versiya."""
+        from bozorlik.core import recompute_buy_df
+        meta = self.meta(list_id)
+        if meta is None:
+            raise KeyError(f"umumiy ro'yxat topilmadi: {list_id}")
+        feed, version = self.changes(list_id, 0)
+        rows = feed[SHARED_COLS].assign(line_gross=0.0, line_net=0.0, line_vat=0.0)[BUY_COLS]
+        return recompute_buy_df(rows, meta["qqs_rate"]), version
+
+    def commit(self, list_id: int, since: int, edits=(), added: pd.DataFrame | None = None, deleted=(),
+               editor: str = "") -> dict:
+        """
+        Sessiya tahrirlarini bitta tranzaksiyada yozadi; `since` — sessiya oxirgi ko'rgan versiya.
+        edits — (qator ID, ustun, ko'rilgan qiymat, yangi qiymat): qator `since` dan beri o'zgarmagan
+        yoki katak hali ko'rilgan / yangi qiymatda bo'lsa yoziladi, aks holda to'qnashuv.
+        added — yangi qatorlar (SHARED_COLS); ID larni server beradi.
+        deleted — qator ID lari: `since` dan beri hech kim tegmagan bo'lsagina o'chiriladi.
+        Qaytadi: {"version", "applied", "conflicts", "added", "deleted"}.
+        """
+        by_col = {}
+        for row_id, col, old, new in edits:
+            if col not in SHARED_COLS:
+                raise ValueError(f"noma'lum ustun: {col}")
+            by_col.setdefault(col, []).append((int(row_id), old, new))
+        new_rows = [] if added is None or added.empty else _rows(added, SHARED_COLS)
+        deleted = [int(i) for i in deleted]
+        n_edits = sum(len(v) for v in by_col.values())
+        res = {"applied": 0, "conflicts": 0, "added": len(new_rows), "deleted": 0}
+
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")  # o'qish-yozish: yozish qulfi boshidanoq olinadi
+            try:
+                r = cur.execute("SELECT version, next_row FROM shared_lists WHERE id = ?", (list_id,)).fetchone()
+                if r is None:
+                    raise KeyError(f"umumiy ro'yxat topilmadi: {list_id}")
+                version, next_row = r[0] + 1, r[1]
+                for col, cells in by_col.items():
+                    cur.executemany(
+                        f"UPDATE shared_rows SET {col} = ?, version = ?, editor = ? "
+                        f"WHERE list_id = ? AND row_id = ? AND deleted = 0 "
+                        f"AND (version <= ? OR {col} IS ? OR {col} IS ?)",
+                        [(new, version, editor, list_id, rid, since, old, new) for rid, old, new in cells],
+                    )
+                    res["applied"] += max(cur.rowcount, 0)
+                if deleted:
+                    cur.executemany(
+                        "UPDATE shared_rows SET deleted = 1, version = ?, editor = ? "
+                        "WHERE list_id = ? AND row_id = ? AND deleted = 0 AND version <= ?",
+                        [(version, editor, list_id, rid, since) for rid in deleted],
+                    )
+                    res["deleted"] = max(cur.rowcount, 0)
+                if new_rows:
+                    cur.executemany(
+                        "INSERT INTO shared_rows(list_id, row_id, version, editor, " + ", ".join(SHARED_COLS) + ") "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(list_id, next_row + i, version, editor, *row) for i, row in enumerate(new_rows)],
+                    )
+                if res["applied"] or res["deleted"] or new_rows:
+                    cur.execute(
+                        "UPDATE shared_lists SET version = ?, next_row = ? WHERE id = ?",
+                        (version, next_row + len(new_rows), list_id),
+                    )
+                else:
+                    version -= 1
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        res["conflicts"] = n_edits - res["applied"] + len(deleted) - res["deleted"]
+        res["version"] = version
+        return res
+
+
+# --- Sessiya tomoni: farq va lentani qo'llash ---
+def _py(v):
+    """numpy skalyar / NaN -> SQLite ga bog'lanadigan Python qiymat."""
+    if v is None:
+        return None
+    if hasattr(v, "item"):
+        v = v.item()
+    return None if isinstance(v, float) and v != v else v
+
+
+def diff_rows(old: pd.DataFrame, new: pd.DataFrame):
+    """
+    Ikki holat orasidagi farq qator ID bo'yicha: (edits, added, deleted).
+    edits — (qator ID, ustun, eski, yangi) faqat haqiqatan o'zgargan kataklar uchun (vektorli solishtirish).
+    """
+    import numpy as np
+
+    from bozorlik.core import changed_mask
+    common = old.index.intersection(new.index)
+    deleted = old.index.difference(new.index)
+    added = new.loc[new.index.difference(old.index), SHARED_COLS]
+    a, b = old.loc[common, SHARED_COLS], new.loc[common, SHARED_COLS]
+    edits = []
+    for c in SHARED_COLS:
+        for i in np.flatnonzero(changed_mask(a[c], b[c])):
+            edits.append((int(common[i]), c, _py(a[c].iat[i]), _py(b[c].iat[i])))
+    return edits, added, deleted
+
+
+def apply_changes(df: pd.DataFrame, changes: pd.DataFrame, qqs_rate: float, totals: dict | None = None,
+                  drop=()) -> pd.DataFrame:
+    """
+    Lentani (`SharedStore.changes`) mahalliy jadvalga qo'llaydi: o'chirilganlar olib tashlanadi,
+    qolganlari qator ID bo'yicha joyida yoziladi yoki oxiriga qo'shiladi; faqat shu qatorlar
+    qayta hisoblanadi. `drop` — serverga yuborilgan yangi qatorlarning vaqtinchalik ID lari
+    (lentada server ID si bilan qaytadi). `totals` berilsa delta bilan yangilanadi va QQS faqat
+    tegilgan kategoriyalarda qayta taqsimlanadi (reallocate_vat); aks holda — butun chek bo'yicha.
+    """
+    import pandas as pd
+
+    from bozorlik.core import (
+        ALL_UNITS,
+        DEFAULT_CATEGORIES,
+        _add_to_totals,
+        _category_vat,
+        allocate_vat,
+        as_category,
+        changed_mask,
+        reallocate_vat,
+        recompute_buy_df,
+        replace_at,
+        vat_groups,
+    )
+    gone = df.index.intersection(pd.Index(drop).append(changes.index[changes["deleted"]]))
+    live = changes.loc[~changes["deleted"], SHARED_COLS]
+    if live.empty and gone.empty:
+        return df
+    upd = df.index.intersection(live.index).difference(gone)
+    old_rows = df.loc[gone.append(upd)]
+    rec = recompute_buy_df(live.assign(line_gross=0.0, line_net=0.0, line_vat=0.0)[BUY_COLS], qqs_rate)
+    if totals is not None:
+        old_targets = _category_vat(totals, qqs_rate)
+        _add_to_totals(totals, old_rows, sign=-1)
+        _add_to_totals(totals, rec, sign=1)
+
+    out = df.drop(gone) if len(gone) else df.copy(deep=False)
+    if len(upd):
+        # Pozitsiya bo'yicha, faqat qiymati o'zgargan ustunlar (line_net/line_vat QQS taqsimotida yoziladi)
+        pos = out.index.get_indexer(upd)
+        new = rec.loc[upd]
+        for c in SHARED_COLS + ["line_gross"]:
+            if changed_mask(out[c].iloc[pos], new[c]).any():
+                out[c] = replace_at(out[c], pos, new[c])
+    new_ids = rec.index.difference(out.index)  # vaqtinchalik ID server ID si bilan to'qnashishi mumkin
+    if len(new_ids):
+        out = pd.concat([out, rec.loc[new_ids]])
+        out["category"] = as_category(out["category"], DEFAULT_CATEGORIES)
+        out["unit"] = as_category(out["unit"], ALL_UNITS)
+    if totals is None:
+        return allocate_vat(out, qqs_rate)
+    return reallocate_vat(out, qqs_rate, vat_groups(old_rows) | vat_groups(rec), old_targets,
+                          _category_vat(totals, qqs_rate))
@@ -0,0 +1,854 @@
+# -*- coding: utf-8 -*-
+"""
+Mahalliy saqlash: rejalar, xarid qatorlari va narxlar tarixi SQLite (WAL) da.
+
+Sessiya holati (`plan_df` / `buy_df`) har rerun oxirida bitta tranzaksiyada
+yoziladi — faqat mazmun xeshi o'zgargan bo'lsa. O'qish dangasa: ro'yxat uchun
+faqat `trips` metama'lumoti, jadvallar esa safar ochilganda yuklanadi.
+
+Narx indeksi (`price_stats`) har yozuvda faqat tegilgan kalitlar bo'yicha yangilanadi:
+oxirgi narx, oxirgi PRICE_WINDOW kuzatuv medianasi va sirpanuvchi o'rtacha tayyor
+saqlanadi — tavsiya uchun xom tarix skanerlanmaydi. Davriy tahlil (`rollups`) ham
+shunday: safar saqlanganda faqat uning hissasidagi farq hafta/oy/yil yig'indilariga qo'shiladi.
+
+Tahrirlar jurnali (`trip_ops`): har rerun da to'liq jadval o'rniga faqat kataklar deltasi
+(bozorlik.editlog) qo'shiladi; to'liq snapshot (`save_trip`) vaqti-vaqti bilan yoziladi va
+jurnalni tozalaydi. `load_plan` / `load_buy` snapshot + undan keyingi deltalarni qaytaradi,
+safar hissasi esa rollup larga har jurnal yozuvida qo'shiladi — snapshot kutilmaydi.
+Qator ID lari (`row_id`) saqlanadi — deltalar qayta ochilgandan keyin ham o'sha qatorlarga tushadi.
+
+Reja shablonlari (`plan_templates` / `template_lines`) versiyalanadi: saqlash yangi versiya
+qo'shadi, mavjudlari o'zgarmaydi (bozorlik.templates).
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+from bozorlik.core import BUY_COLS, PLAN_COLS, frame_hash
+from bozorlik.names import canonical_key
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_DB_PATH = os.environ.get("BOZORLIK_DB", "bozorlik.db")
+
+# Safar x kategoriya hissasi va davr (hafta/oy/yil) x kategoriya yig'indilari.
+# plan_* — reja vs fakt aniqligi uchun: rejadagi qatorlar, ulardan olinganlar, miqdorlar.
+ROLLUP_MEASURES = ["items", "qty", "net", "vat", "gross", "plan_lines", "plan_hit", "plan_qty", "plan_actual_qty",
+                   "plan_abs_diff"]
+MONEY_MEASURES = ("net", "vat", "gross")
+ROLLUP_GRAINS = ("week", "month", "year")
+
+PRICE_HISTORY_DDL = """
+CREATE TABLE IF NOT EXISTS price_history (
+    item              TEXT NOT NULL,
+    unit              TEXT NOT NULL,
+    store             TEXT NOT NULL DEFAULT '',
+    date              TEXT NOT NULL,
+    unit_price_gross  REAL NOT NULL,
+    trip_id           INTEGER,
+    PRIMARY KEY (item, unit, store, date)
+) WITHOUT ROWID"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trips (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    qqs_rate    REAL NOT NULL,
+    plan_hash   TEXT NOT NULL DEFAULT '',
+    buy_hash    TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS plan_lines (
+    trip_id   INTEGER NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    pos       INTEGER NOT NULL,
+    item      TEXT,
+    category  TEXT,
+    unit      TEXT,
+    plan_qty  REAL,
+    row_id    INTEGER,
+    PRIMARY KEY (trip_id, pos)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS purchase_lines (
+    trip_id           INTEGER NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    pos               INTEGER NOT NULL,
+    item              TEXT,
+    category          TEXT,
+    unit              TEXT,
+    plan_qty          REAL,
+    bought            INTEGER,
+    actual_qty        REAL,
+    unit_price_gross  REAL,
+    line_gross        REAL,
+    line_net          REAL,
+    line_vat          REAL,
+    row_id            INTEGER,
+    PRIMARY KEY (trip_id, pos)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_purchase_item ON purchase_lines(item, unit);
+CREATE TABLE IF NOT EXISTS plan_templates (
+    name        TEXT NOT NULL,
+    version     INTEGER NOT NULL,
+    created_at  TEXT NOT NULL,
+    household   REAL NOT NULL DEFAULT 1,
+    note        TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (name, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS template_lines (
+    name      TEXT NOT NULL,
+    version   INTEGER NOT NULL,
+    pos       INTEGER NOT NULL,
+    item      TEXT,
+    category  TEXT,
+    unit      TEXT,
+    plan_qty  REAL,
+    PRIMARY KEY (name, version, pos),
+    FOREIGN KEY (name, version) REFERENCES plan_templates(name, version) ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trip_ops (
+    trip_id     INTEGER NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    seq         INTEGER NOT NULL,
+    created_at  TEXT NOT NULL,
+    label       TEXT NOT NULL DEFAULT '',
+    ops         TEXT NOT NULL,
+    PRIMARY KEY (trip_id, seq)
+) WITHOUT ROWID;
+""" + PRICE_HISTORY_DDL + """;
+CREATE INDEX IF NOT EXISTS idx_price_date ON price_history(date);
+CREATE TABLE IF NOT EXISTS price_stats (
+    item        TEXT NOT NULL,
+    unit        TEXT NOT NULL,
+    store       TEXT NOT NULL,
+    n           INTEGER NOT NULL,
+    last_date   TEXT NOT NULL,
+    last_price  REAL NOT NULL,
+    ewma        REAL NOT NULL,
+    prev_ewma   REAL,
+    median      REAL NOT NULL,
+    recent      TEXT NOT NULL,
+    PRIMARY KEY (item, unit, store)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trip_totals (
+    trip_id  INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    """ + ",\n    ".join(f"{m} REAL NOT NULL" for m in ROLLUP_MEASURES) + """,
+    PRIMARY KEY (trip_id, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    grain    TEXT NOT NULL,
+    period   TEXT NOT NULL,
+    category TEXT NOT NULL,
+    trips    INTEGER NOT NULL,
+    """ + ",\n    ".join(f"{m} REAL NOT NULL" for m in ROLLUP_MEASURES) + """,
+    PRIMARY KEY (grain, period, category)
+) WITHOUT ROWID;
+"""
+SCHEMA_VERSION = 4
+
+# Narx indeksi: (item, unit, store) bo'yicha oldindan hisoblangan agregatlar.
+# store = '' — barcha do'konlar bo'yicha umumiy qator.
+PRICE_WINDOW = 20   # mediana uchun oxirgi kuzatuvlar
+EWMA_ALPHA = 0.3    # sirpanuvchi o'rtacha (eksponensial) og'irligi
+
+
+def price_key(item) -> str:
+    """Narxlar tarixi kaliti: kanonik nom (lotin, kichik harf, tinish belgilarisiz)."""
+    return canonical_key(item)
+
+
+def _now() -> str:
+    return dt.datetime.now().isoformat(timespec="seconds")
+
+
+def period_keys(date: str) -> dict:
+    """ISO sana -> {"week": "2026-W07", "month": "2026-02", "year": "2026"}."""
+    d = dt.date.fromisoformat(date[:10])
+    iso = d.isocalendar()
+    return {"week": f"{iso[0]}-W{iso[1]:02d}", "month": f"{d:%Y-%m}", "year": f"{d:%Y}"}
+
+
+def _next_stat(stat: dict | None, date: str, price: float) -> dict | None:
+    """
+    Agregatni bitta kuzatuv bilan yangilaydi (O(PRICE_WINDOW)). Shu kunning narxi
+    qayta yozilsa oxirgi kuzatuv almashtiriladi; eskiroq sana agregatga ta'sir qilmaydi.
+    """
+    if stat is None:
+        return {"n": 1, "last_date": date, "last_price": price, "ewma": price, "prev_ewma": None, "recent": [price]}
+    if date < stat["last_date"]:
+        return None
+    recent = list(stat["recent"])
+    if date == stat["last_date"]:
+        recent[-1] = price
+        prev = stat["prev_ewma"]
+        ewma = price if prev is None else EWMA_ALPHA * price + (1 - EWMA_ALPHA) * prev
+        return {**stat, "last_price": price, "ewma": ewma, "recent": recent}
+    return {
+        "n": stat["n"] + 1,
+        "last_date": date,
+        "last_price": price,
+        "ewma": EWMA_ALPHA * price + (1 - EWMA_ALPHA) * stat["ewma"],
+        "prev_ewma": stat["ewma"],
+        "recent": (recent + [price])[-PRICE_WINDOW:],
+    }
+
+
+def _rows(df: pd.DataFrame, cols) -> list:
+    """DataFrame -> executemany uchun tuple'lar (NaN -> NULL, numpy skalyar -> Python)."""
+    import pandas as pd
+    sub = df[cols].astype(object).where(pd.notna(df[cols]), None)
+    return list(sub.itertuples(index=False, name=None))
+
+
+def trip_contribution(buy_df: pd.DataFrame) -> dict:
+    """
+    Safarning kategoriya bo'yicha hissasi xotiradagi chekdan ({kategoriya: ROLLUP_MEASURES}) —
+    `TripStore._trip_contribution` (saqlangan qatorlar bo'yicha SQL) bilan bir xil qoidalar.
+    Jurnal yozuvida (snapshotsiz) ham rollup lar joriy bo'lishi uchun.
+    """
+    import numpy as np
+    import pandas as pd
+    if buy_df.empty:
+        return {}
+
+    def num(c):
+        return buy_df[c].to_numpy(dtype="float64", na_value=np.nan)
+
+    bought = buy_df["bought"].fillna(False).astype(bool).to_numpy()
+    actual = np.where(bought, np.nan_to_num(num("actual_qty")), 0.0)
+    plan = num("plan_qty")
+    with np.errstate(invalid="ignore"):
+        in_plan = plan > 0
+    cat = buy_df["category"].astype(object)
+    parts = pd.DataFrame({
+        "items": bought.astype("float64"),
+        "qty": actual,
+        **{c: np.where(bought, np.nan_to_num(num(f"line_{c}")), 0.0) for c in MONEY_MEASURES},
+        "plan_lines": in_plan.astype("float64"),
+        "plan_hit": (in_plan & bought).astype("float64"),
+        "plan_qty": np.where(in_plan, plan, 0.0),
+        "plan_actual_qty": np.where(in_plan, actual, 0.0),
+        "plan_abs_diff": np.where(in_plan, np.abs(actual - np.where(in_plan, plan, 0.0)), 0.0),
+    })[ROLLUP_MEASURES]
+    sums = parts.groupby(cat.where(cat.notna(), "Boshqa").astype(str).to_numpy(), sort=False).sum()
+    sums[list(MONEY_MEASURES)] = sums[list(MONEY_MEASURES)].round(2)
+    return {cat: [float(v) for v in row] for cat, row in zip(sums.index, sums.itertuples(index=False, name=None))
+            if row[0] > 0 or row[5] > 0}
+
+
+def _row_ids(df: pd.DataFrame) -> list:
+    """Saqlanadigan qator ID lari: indeks (takrorsiz butun son bo'lsa), aks holda pozitsiya."""
+    import pandas as pd
+    idx = df.index
+    if pd.api.types.is_integer_dtype(idx.dtype) and idx.is_unique:
+        return [int(i) for i in idx]
+    return list(range(len(df)))
+
+
+class TripStore:
+    """
+    Bitta SQLite fayl ustidagi ombor. Streamlit sessiyalari turli oqimlarda ishlaydi,
+    shuning uchun bitta ulanish qulf bilan ulashiladi (`st.cache_resource` orqali).
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """
+        v0 -> v1: price_history ga `store` ustuni, price_stats ni tarixdan qurish.
+        v1 -> v2: trip_totals / rollups ni saqlangan safarlardan qurish.
+        v2 -> v3: narx kalitlarini kanonik kalitga o'tkazish (kirill/lotin yozilishlar birlashadi).
+        v3 -> v4: plan_lines / purchase_lines ga `row_id` (eski qatorlar uchun = pos).
+        """
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            cols = {r[1] for r in self.conn.execute("PRAGMA table_info(price_history)")}
+            line_cols = {t: {r[1] for r in self.conn.execute(f"PRAGMA table_info({t})")}
+                         for t in ("plan_lines", "purchase_lines")}
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                if "store" not in cols:
+                    cur.execute("ALTER TABLE price_history RENAME TO price_history_v0")
+                    cur.execute("DROP INDEX IF EXISTS idx_price_date")
+                    cur.execute(PRICE_HISTORY_DDL)
+                    cur.execute("CREATE INDEX idx_price_date ON price_history(date)")
+                    cur.execute(
+                        "INSERT INTO price_history(item, unit, store, date, unit_price_gross, trip_id) "
+                        "SELECT item, unit, '', date, unit_price_gross, trip_id FROM price_history_v0"
+                    )
+                    cur.execute("DROP TABLE price_history_v0")
+                if version < 1:
+                    cur.execute("DELETE FROM price_stats")
+                    obs = cur.execute(
+                        "SELECT item, unit, store, date, unit_price_gross FROM price_history ORDER BY date"
+                    ).fetchall()
+                    self._update_stats(cur, obs)
+                if version < 2:
+                    self._rebuild_rollups(cur)
+                if version < 3:
+                    items = [r[0] for r in cur.execute("SELECT DISTINCT item FROM price_history")]
+                    self._rekey_prices(cur, {i: price_key(i) for i in items})
+                for table, have in line_cols.items():
+                    if "row_id" not in have:
+                        cur.execute(f"ALTER TABLE {table} ADD COLUMN row_id INTEGER")
+                        cur.execute(f"UPDATE {table} SET row_id = pos")
+                cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    # --- trips ---
+    def create_trip(self, name: str, qqs_rate: float) -> int:
+        now = _now()
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO trips(name, created_at, updated_at, qqs_rate) VALUES (?, ?, ?, ?)",
+                (name, now, now, float(qqs_rate)),
+            )
+            return int(cur.lastrowid)
+
+    def list_trips(self, limit: int = 200) -> list:
+        """Faqat metama'lumot (jadvallar yuklanmaydi): [{id, name, updated_at, lines}]."""
+        with self._lock:
+            cur = self.conn.execute(
+                """
+                SELECT t.id, t.name, t.updated_at,
+                       (SELECT COUNT(*) FROM purchase_lines p WHERE p.trip_id = t.id)
+                FROM trips t ORDER BY t.updated_at DESC, t.id DESC LIMIT ?
+                """,
+                (limit,),
+            )
+            return [{"id": r[0], "name": r[1], "updated_at": r[2], "lines": r[3]} for r in cur.fetchall()]
+
+    def trip(self, trip_id: int):
+        with self._lock:
+            r = self.conn.execute(
+                "SELECT id, name, qqs_rate, plan_hash, buy_hash FROM trips WHERE id = ?", (trip_id,)
+            ).fetchone()
+        if r is None:
+            return None
+        return {"id": r[0], "name": r[1], "qqs_rate": r[2], "plan_hash": r[3], "buy_hash": r[4]}
+
+    def rename_trip(self, trip_id: int, name: str) -> None:
+        with self._lock:
+            self.conn.execute("UPDATE trips SET name = ? WHERE id = ?", (name, trip_id))
+
+    def delete_trip(self, trip_id: int) -> None:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                self._apply_trip_totals(cur, trip_id, {})  # hissasini yig'indilardan ayirish
+                cur.execute("DELETE FROM trips WHERE id = ?", (trip_id,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    # --- saqlash (har rerun) ---
+    def save_trip(self, trip_id: int, plan_df: pd.DataFrame, buy_df: pd.DataFrame, qqs_rate: float,
+                  store: str = "") -> bool:
+        """
+        Xeshi o'zgargan jadvallarni bitta tranzaksiyada qayta yozadi va olingan
+        qatorlar narxini tarixga qo'shadi. O'zgarish bo'lmasa hech narsa yozilmaydi.
+        Snapshot jurnaldagi barcha deltalarni o'z ichiga oladi, shuning uchun `trip_ops` tozalanadi.
+        Qaytadi: biror narsa yozildimi.
+        """
+        plan_h = frame_hash(plan_df[PLAN_COLS], index=True)
+        buy_h = frame_hash(buy_df[BUY_COLS], index=True)
+        meta = self.trip(trip_id)
+        if meta is None:
+            raise KeyError(f"safar topilmadi: {trip_id}")
+        plan_changed = meta["plan_hash"] != plan_h
+        buy_changed = meta["buy_hash"] != buy_h
+        if not (plan_changed or buy_changed or meta["qqs_rate"] != float(qqs_rate)):
+            with self._lock:
+                self.conn.execute("DELETE FROM trip_ops WHERE trip_id = ?", (trip_id,))
+            return False
+        now = _now()
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                if plan_changed:
+                    cur.execute("DELETE FROM plan_lines WHERE trip_id = ?", (trip_id,))
+                    cur.executemany(
+                        f"INSERT INTO plan_lines(trip_id, pos, {', '.join(PLAN_COLS)}, row_id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(trip_id, i, *r, rid) for i, (r, rid) in enumerate(zip(_rows(plan_df, PLAN_COLS),
+                                                                               _row_ids(plan_df)))],
+                    )
+                if buy_changed:
+                    rows = _rows(buy_df, BUY_COLS)
+                    cur.execute("DELETE FROM purchase_lines WHERE trip_id = ?", (trip_id,))
+                    cur.executemany(
+                        f"INSERT INTO purchase_lines(trip_id, pos, {', '.join(BUY_COLS)}, row_id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(trip_id, i, *r, rid) for i, (r, rid) in enumerate(zip(rows, _row_ids(buy_df)))],
+                    )
+                    self._record_prices(cur, trip_id, buy_df, now[:10], store)
+                    self._apply_trip_totals(cur, trip_id, trip_contribution(buy_df))
+                cur.execute(
+                    "UPDATE trips SET updated_at = ?, qqs_rate = ?, plan_hash = ?, buy_hash = ? WHERE id = ?",
+                    (now, float(qqs_rate), plan_h, buy_h, trip_id),
+                )
+                cur.execute("DELETE FROM trip_ops WHERE trip_id = ?", (trip_id,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return True
+
+    # --- reja shablonlari ---
+    def save_template(self, name: str, plan_df: pd.DataFrame, household: float = 1.0, note: str = "") -> int:
+        """Yangi versiya sifatida saqlaydi (eski versiyalar o'zgarmaydi). Qaytadi: versiya raqami."""
+        rows = _rows(plan_df, PLAN_COLS)
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                version = cur.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM plan_templates WHERE name = ?",
+                                      (name,)).fetchone()[0]
+                cur.execute("INSERT INTO plan_templates VALUES (?, ?, ?, ?, ?)",
+                            (name, version, _now(), float(household), note))
+                cur.executemany(
+                    f"INSERT INTO template_lines(name, version, pos, {', '.join(PLAN_COLS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(name, version, i, *r) for i, r in enumerate(rows)],
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return int(version)
+
+    def list_templates(self) -> list:
+        """Har bir shablonning oxirgi versiyasi: [{name, version, household, lines, created_at}]."""
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                SELECT t.name, t.version, t.household, t.created_at,
+                       (SELECT COUNT(*) FROM template_lines l WHERE l.name = t.name AND l.version = t.version)
+                FROM plan_templates t
+                WHERE t.version = (SELECT MAX(version) FROM plan_templates WHERE name = t.name)
+                ORDER BY t.name
+                """
+            ).fetchall()
+        return [{"name": r[0], "version": r[1], "household": r[2], "created_at": r[3], "lines": r[4]} for r in rows]
+
+    def load_template(self, name: str, version: int) -> pd.DataFrame:
+        import pandas as pd
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(PLAN_COLS)} FROM template_lines WHERE name = ? AND version = ? ORDER BY pos",
+                self.conn, params=(name, int(version)),
+            )
+        return df[PLAN_COLS]
+
+    def typical_quantities(self, last_trips: int = 8) -> pd.Series:
+        """
+        Iste'mol tarixi: oxirgi `last_trips` safarda olingan miqdorlar medianasi,
+        (kanonik nom, birlik) -> miqdor. Shablonni oilaga moslash uchun.
+        """
+        import pandas as pd
+        with self._lock:
+            df = pd.read_sql_query(
+                """
+                SELECT p.item, p.unit, p.actual_qty FROM purchase_lines p
+                JOIN (SELECT id FROM trips ORDER BY updated_at DESC, id DESC LIMIT ?) t ON t.id = p.trip_id
+                WHERE p.bought = 1 AND p.actual_qty > 0
+                """,
+                self.conn, params=(int(last_trips),),
+            )
+        if df.empty:
+            return pd.Series(dtype="float64")
+        df["item"] = df["item"].map(price_key)
+        return df.groupby(["item", "unit"])["actual_qty"].median()
+
+    # --- tahrirlar jurnali ---
+    def append_ops(self, trip_id: int, entries, buy_df: pd.DataFrame | None = None) -> int:
+        """
+        Deltalarni (`[(label, {jadval: delta}), ...]`) jurnal oxiriga qo'shadi — jadvallar qayta
+        yozilmaydi. `buy_df` (deltalardan keyingi chek) berilsa va chek o'zgargan bo'lsa, safar
+        hissasi davriy yig'indilarga o'sha tranzaksiyada qo'shiladi — rollup snapshotni kutmaydi.
+        Qaytadi: oxirgi snapshotdan beri jurnaldagi qadamlar soni.
+        """
+        now = _now()
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                seq = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM trip_ops WHERE trip_id = ?",
+                                  (trip_id,)).fetchone()[0]
+                cur.executemany(
+                    "INSERT INTO trip_ops(trip_id, seq, created_at, label, ops) VALUES (?, ?, ?, ?, ?)",
+                    [(trip_id, seq + i, now, label, json.dumps(ops, ensure_ascii=False, separators=(",", ":")))
+                     for i, (label, ops) in enumerate(entries, start=1)],
+                )
+                cur.execute("UPDATE trips SET updated_at = ? WHERE id = ?", (now, trip_id))
+                if buy_df is not None and any("buy" in ops for _, ops in entries):
+                    self._apply_trip_totals(cur, trip_id, trip_contribution(buy_df))
+                n = cur.execute("SELECT COUNT(*) FROM trip_ops WHERE trip_id = ?", (trip_id,)).fetchone()[0]
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return int(n)
+
+    def load_ops(self, trip_id: int) -> list:
+        """Oxirgi snapshotdan keyingi deltalar, yozilgan tartibda: [(label, {jadval: delta})]."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT label, ops FROM trip_ops WHERE trip_id = ? ORDER BY seq", (trip_id,)
+            ).fetchall()
+        return [(label, json.loads(ops)) for label, ops in rows]
+
+    @classmethod
+    def _record_prices(cls, cur, trip_id, buy_df: pd.DataFrame, date: str, store: str = "") -> int:
+        fakt = buy_df[buy_df["bought"].astype(bool) & (buy_df["unit_price_gross"] > 0)]
+        if fakt.empty:
+            return 0
+        obs = [
+            (price_key(item), str(unit), store, date, float(price))
+            for item, unit, price in zip(fakt["item"], fakt["unit"], fakt["unit_price_gross"])
+        ]
+        cur.executemany(
+            """
+            INSERT INTO price_history(item, unit, store, date, unit_price_gross, trip_id) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(item, unit, store, date) DO UPDATE SET
+                unit_price_gross = excluded.unit_price_gross, trip_id = excluded.trip_id
+            """,
+            [(*o, trip_id) for o in obs],
+        )
+        cls._update_stats(cur, obs)
+        return len(obs)
+
+    @staticmethod
+    def _update_stats(cur, obs) -> None:
+        """
+        Kuzatuvlar (item, unit, store, date, price) bo'yicha price_stats ni yangilaydi:
+        do'kon qatori va umumiy ('') qator. Faqat tegilgan kalitlar o'qiladi/yoziladi.
+        """
+        import json
+        import statistics
+        targets = {}
+        for item, unit, store, date, price in obs:
+            for st_key in {store, ""}:
+                targets.setdefault((item, unit, st_key), []).append((date, price))
+        stats = {}
+        keys = list(targets)
+        for i in range(0, len(keys), 300):
+            chunk = keys[i:i + 300]
+            rows = cur.execute(
+                "SELECT item, unit, store, n, last_date, last_price, ewma, prev_ewma, recent FROM price_stats "
+                f"WHERE (item, unit, store) IN (VALUES {', '.join(['(?, ?, ?)'] * len(chunk))})",
+                [v for k in chunk for v in k],
+            ).fetchall()
+            for r in rows:
+                stats[r[:3]] = {"n": r[3], "last_date": r[4], "last_price": r[5], "ewma": r[6],
+                                "prev_ewma": r[7], "recent": json.loads(r[8])}
+        out = []
+        for key, points in targets.items():
+            stat = stats.get(key)
+            changed = False
+            for date, price in points:
+                nxt = _next_stat(stat, date, price)
+                if nxt is not None:
+                    stat, changed = nxt, True
+            if changed:
+                out.append((*key, stat["n"], stat["last_date"], stat["last_price"], stat["ewma"], stat["prev_ewma"],
+                            float(statistics.median(stat["recent"])), json.dumps(stat["recent"])))
+        cur.executemany("INSERT OR REPLACE INTO price_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", out)
+
+    def record_prices(self, buy_df: pd.DataFrame, store: str = "", trip_id: int | None = None) -> int:
+        """Olingan qatorlar narxini tarix va indeksga yozadi (safarsiz sessiya yoki snapshotlar orasidagi autosave)."""
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                n = self._record_prices(cur, trip_id, buy_df, _now()[:10], store)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return n
+
+    def price_lookup(self, keys, store: str = "") -> dict:
+        """
+        (item, unit) juftliklari -> {last_price, median, ewma, n, last_date}; PK bo'yicha
+        O(log n) qidiruv. Do'kon bo'yicha agregat bo'lsa u, aks holda umumiy qator.
+        """
+        keys = list({(price_key(i), str(u)) for i, u in keys})
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 300):
+                chunk = keys[i:i + 300]
+                rows = self.conn.execute(
+                    "SELECT item, unit, store, last_price, median, ewma, n, last_date FROM price_stats "
+                    f"WHERE store IN (?, '') AND (item, unit) IN (VALUES {', '.join(['(?, ?)'] * len(chunk))})",
+                    [store, *(v for k in chunk for v in k)],
+                ).fetchall()
+                for item, unit, st_key, last, med, ewma, n, last_date in rows:
+                    if (item, unit) in found and st_key == "":
+                        continue  # do'kon qatori ustun
+                    found[(item, unit)] = {"last_price": last, "median": med, "ewma": ewma, "n": n, "last_date": last_date}
+        return found
+
+    # --- nomlarni birlashtirish ---
+    @classmethod
+    def _rekey_prices(cls, cur, keys: dict) -> int:
+        """
+        Narx tarixi kalitlarini almashtiradi ({eski: yangi}); bir kunda ikkala kalitda ham
+        kuzatuv bo'lsa yangisi qoladi. Tegilgan kalitlar statistikasi tarixdan qayta quriladi.
+        """
+        keys = {old: new for old, new in keys.items() if old != new}
+        if not keys:
+            return 0
+        n = 0
+        for old, new in keys.items():
+            n += cur.execute("UPDATE OR IGNORE price_history SET item = ? WHERE item = ?", (new, old)).rowcount
+            cur.execute("DELETE FROM price_history WHERE item = ?", (old,))
+        touched = sorted(set(keys) | set(keys.values()))
+        for i in range(0, len(touched), 300):
+            chunk = touched[i:i + 300]
+            marks = ", ".join(["?"] * len(chunk))
+            cur.execute(f"DELETE FROM price_stats WHERE item IN ({marks})", chunk)
+            obs = cur.execute(
+                "SELECT item, unit, store, date, unit_price_gross FROM price_history "
+                f"WHERE item IN ({marks}) ORDER BY date",
+                chunk,
+            ).fetchall()
+            cls._update_stats(cur, obs)
+        return n
+
+    def item_names(self) -> pd.Series:
+        """Saqlangan reja va xarid qatorlaridagi nomlar, uchrash soni bo'yicha (ko'pi birinchi)."""
+        import pandas as pd
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT item, COUNT(*) FROM (SELECT item FROM plan_lines UNION ALL SELECT item FROM purchase_lines) "
+                "WHERE item IS NOT NULL GROUP BY item ORDER BY 2 DESC"
+            ).fetchall()
+        return pd.Series({r[0]: r[1] for r in rows}, dtype="int64")
+
+    def merge_item_names(self, mapping: dict) -> int:
+        """
+        Safarlardagi nomlarni ({yozilish: vakil nom}, masalan `dedupe_names` natijasi) almashtiradi
+        va narx tarixini vakil kalitga o'tkazadi. Qaytadi: o'zgargan qatorlar soni.
+        """
+        mapping = {str(k): str(v) for k, v in mapping.items() if k != v}
+        if not mapping:
+            return 0
+        n = 0
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                # Bitta o'tishda: jadval nomlar xaritasi bilan birlashtiriladi
+                cur.execute("CREATE TEMP TABLE IF NOT EXISTS name_map (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+                cur.execute("DELETE FROM name_map")
+                cur.executemany("INSERT INTO name_map VALUES (?, ?)", list(mapping.items()))
+                for table in ("plan_lines", "purchase_lines"):
+                    n += cur.execute(
+                        f"UPDATE {table} SET item = (SELECT new FROM name_map WHERE old = {table}.item) "
+                        "WHERE item IN (SELECT old FROM name_map)"
+                    ).rowcount
+                self._rekey_prices(cur, {price_key(k): price_key(v) for k, v in mapping.items()})
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return n
+
+    # --- davriy yig'indilar (rollup) ---
+    @staticmethod
+    def _trip_contribution(cur, trip_id: int) -> dict:
+        """Safarning kategoriya bo'yicha hissasi — faqat shu safar qatorlari (PK prefiksi) bo'yicha."""
+        rows = cur.execute(
+            """
+            SELECT COALESCE(category, 'Boshqa'),
+                   SUM(bought),
+                   SUM(CASE WHEN bought THEN COALESCE(actual_qty, 0) ELSE 0 END),
+                   ROUND(SUM(CASE WHEN bought THEN COALESCE(line_net, 0) ELSE 0 END), 2),
+                   ROUND(SUM(CASE WHEN bought THEN COALESCE(line_vat, 0) ELSE 0 END), 2),
+                   ROUND(SUM(CASE WHEN bought THEN COALESCE(line_gross, 0) ELSE 0 END), 2),
+                   SUM(plan_qty > 0),
+                   SUM(plan_qty > 0 AND bought),
+                   SUM(CASE WHEN plan_qty > 0 THEN plan_qty ELSE 0 END),
+                   SUM(CASE WHEN plan_qty > 0 AND bought THEN COALESCE(actual_qty, 0) ELSE 0 END),
+                   SUM(CASE WHEN plan_qty > 0
+                            THEN ABS(CASE WHEN bought THEN COALESCE(actual_qty, 0) ELSE 0 END - plan_qty)
+                            ELSE 0 END)
+            FROM purchase_lines WHERE trip_id = ?
+            GROUP BY 1
+            """,
+            (trip_id,),
+        ).fetchall()
+        return {r[0]: [float(v or 0) for v in r[1:]] for r in rows if (r[1] or 0) > 0 or (r[6] or 0) > 0}
+
+    @staticmethod
+    def _apply_trip_totals(cur, trip_id: int, new: dict) -> None:
+        """
+        Safarning eski hissasini (trip_totals) yangisi bilan almashtiradi va farqni har bir
+        davr yig'indisiga qo'shadi — boshqa safarlar qayta hisoblanmaydi.
+        """
+        old = {
+            r[0]: list(r[1:])
+            for r in cur.execute(
+                f"SELECT category, {', '.join(ROLLUP_MEASURES)} FROM trip_totals WHERE trip_id = ?", (trip_id,)
+            )
+        }
+        if old == new:
+            return
+        meta = cur.execute("SELECT created_at FROM trips WHERE id = ?", (trip_id,)).fetchone()
+        if meta is None:
+            return
+        periods = period_keys(meta[0])
+        zero = [0.0] * len(ROLLUP_MEASURES)
+        deltas = []
+        for cat in set(old) | set(new):
+            o, n = old.get(cat, zero), new.get(cat, zero)
+            d_trips = (cat in new) - (cat in old)
+            d = [b - a for a, b in zip(o, n)]
+            if d_trips or any(d):
+                deltas.extend((grain, periods[grain], cat, d_trips, *d) for grain in ROLLUP_GRAINS)
+        cols = ", ".join(["trips", *ROLLUP_MEASURES])
+        cur.executemany(
+            f"INSERT INTO rollups(grain, period, category, {cols}) "
+            f"VALUES (?, ?, ?, {', '.join(['?'] * (len(ROLLUP_MEASURES) + 1))}) "
+            "ON CONFLICT(grain, period, category) DO UPDATE SET "
+            + ", ".join(
+                # pul o'lchovlari tiyinga yaxlitlanadi — delta zanjiri float xatosi yig'maydi
+                f"{c} = ROUND({c} + excluded.{c}, 2)" if c in MONEY_MEASURES else f"{c} = {c} + excluded.{c}"
+                for c in ["trips", *ROLLUP_MEASURES]
+            ),
+            deltas,
+        )
+        cur.executemany(
+            "DELETE FROM rollups WHERE grain = ? AND period = ? AND trips <= 0",
+            [(grain, periods[grain]) for grain in ROLLUP_GRAINS],
+        )
+        cur.execute("DELETE FROM trip_totals WHERE trip_id = ?", (trip_id,))
+        cur.executemany(
+            f"INSERT INTO trip_totals VALUES (?, ?, {', '.join(['?'] * len(ROLLUP_MEASURES))})",
+            [(trip_id, cat, *vals) for cat, vals in new.items()],
+        )
+
+    def _rebuild_rollups(self, cur) -> None:
+        """To'liq qayta qurish (migratsiya): har bir safar hissasi noldan qo'shiladi."""
+        cur.execute("DELETE FROM rollups")
+        cur.execute("DELETE FROM trip_totals")
+        for (trip_id,) in cur.execute("SELECT id FROM trips").fetchall():
+            self._apply_trip_totals(cur, trip_id, self._trip_contribution(cur, trip_id))
+
+    def rollup(self, grain: str = "month", since: str | None = None, until: str | None = None) -> pd.DataFrame:
+        """
+        Davr x kategoriya yig'indilari (tayyor jadvaldan, xom qatorlarsiz) va reja aniqligi:
+        accuracy = 1 - sum|fakt - reja| / sum reja, hit_rate = olingan reja qatorlari ulushi.
+        """
+        import numpy as np
+        import pandas as pd
+        if grain not in ROLLUP_GRAINS:
+            raise ValueError(f"noma'lum davr: {grain}")
+        sql = f"SELECT period, category, trips, {', '.join(ROLLUP_MEASURES)} FROM rollups WHERE grain = ?"
+        params = [grain]
+        if since:
+            sql += " AND period >= ?"
+            params.append(since)
+        if until:
+            sql += " AND period <= ?"
+            params.append(until)
+        with self._lock:
+            df = pd.read_sql_query(sql + " ORDER BY period, gross DESC", self.conn, params=params)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df["accuracy"] = np.where(df["plan_qty"] > 0, 1.0 - df["plan_abs_diff"] / df["plan_qty"], np.nan)
+            df["hit_rate"] = np.where(df["plan_lines"] > 0, df["plan_hit"] / df["plan_lines"], np.nan)
+        return df
+
+    def period_trips(self, grain: str = "month", since: str | None = None, until: str | None = None) -> dict:
+        """Davr -> [(safar id, QQS stavkasi)] (rollup dagi kabi safar yaratilgan sana bo'yicha)."""
+        if grain not in ROLLUP_GRAINS:
+            raise ValueError(f"noma'lum davr: {grain}")
+        with self._lock:
+            rows = self.conn.execute("SELECT id, created_at, qqs_rate FROM trips ORDER BY created_at, id").fetchall()
+        out = {}
+        for trip_id, created, rate in rows:
+            period = period_keys(created)[grain]
+            if (since is None or period >= since) and (until is None or period <= until):
+                out.setdefault(period, []).append((trip_id, rate))
+        return out
+
+    # --- dangasa o'qish ---
+    def _replay(self, trip_id: int, table: str, df: pd.DataFrame) -> tuple:
+        """Snapshotdan keyingi jurnal deltalarini jadvalga qo'llaydi. Qaytadi: (jadval, qo'llandimi)."""
+        from bozorlik.editlog import apply_delta
+        deltas = [ops[table] for _, ops in self.load_ops(trip_id) if table in ops]
+        for d in deltas:
+            df = apply_delta(df, d)
+        return df, bool(deltas)
+
+    def load_plan(self, trip_id: int, replay: bool = True) -> pd.DataFrame:
+        """Reja: snapshot + jurnal (`replay=False` — faqat snapshot, jurnalni chaqiruvchi o'zi qo'llaydi)."""
+        import pandas as pd
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT COALESCE(row_id, pos) AS row_id, {', '.join(PLAN_COLS)} FROM plan_lines "
+                "WHERE trip_id = ? ORDER BY pos",
+                self.conn, params=(trip_id,),
+            )
+        df = df.set_index("row_id").rename_axis(None)[PLAN_COLS]
+        return self._replay(trip_id, "plan", df)[0] if replay else df
+
+    def load_buy(self, trip_id: int, replay: bool = True) -> pd.DataFrame:
+        """Chek: snapshot + jurnal; jurnal qo'llansa hisob ustunlari safar stavkasi bilan qayta hisoblanadi."""
+        import pandas as pd
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT COALESCE(row_id, pos) AS row_id, {', '.join(BUY_COLS)} FROM purchase_lines "
+                "WHERE trip_id = ? ORDER BY pos",
+                self.conn, params=(trip_id,),
+            )
+        df["bought"] = df["bought"].fillna(0).astype(bool)
+        df = df.set_index("row_id").rename_axis(None)[BUY_COLS]
+        if not replay:
+            return df
+        df, changed = self._replay(trip_id, "buy", df)
+        if changed:
+            from bozorlik.core import recompute_buy_df
+            df["bought"] = df["bought"].fillna(False).astype(bool)
+            df = recompute_buy_df(df, self.trip(trip_id)["qqs_rate"])[BUY_COLS]
+        return df
+
+    def price_history(self, item: str, unit: str, since: str | None = None, store: str | None = None) -> pd.DataFrame:
+        """(item, unit) bo'yicha sana -> narx; indeks orqali, to'liq jadvalni yuklamasdan."""
+        import pandas as pd
+        sql = "SELECT date, store, unit_price_gross FROM price_history WHERE item = ? AND unit = ?"
+        params = [price_key(item), unit]
+        if store is not None:
+            sql += " AND store = ?"
+            params.append(store)
+        if since:
+            sql += " AND date >= ?"
+            params.append(since)
+        with self._lock:
+            return pd.read_sql_query(sql + " ORDER BY date", self.conn, params=params)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Reja shablonlari: nomlangan, versiyali ro'yxatlar va takrorlanuvchi (haftalik) rejalar generatori.
+
+    tpl = freeze(builtin_template())           # bir marta quriladi, barcha sessiyalarga umumiy
+    plan = attach(tpl)                          # sessiya uchun — nusxasiz (copy-on-write)
+    scale_plan(tpl, 4 / 2)                      # 2 kishilik shablon -> 4 kishilik oila
+
+Shablon jadvali o'zgarmas: uning o'zi hech kimga berilmaydi, sessiyalar sayoz nusxa
+(`copy(deep=False)`, `attach`) orqali ulanadi — pandas copy-on-write birinchi tahrirda faqat
+o'sha ustunni nusxalaydi, umumiy massivlar o'zgarmaydi. Miqyoslangan variant faqat `plan_qty`
+ustunini yangidan yaratadi, nom/kategoriya/birlik ustunlari shablon bilan umumiy qoladi.
+
+Versiyalar TripStore da (`plan_templates` / `template_lines`): har saqlash yangi versiya, eski
+versiyalar o'zgarmaydi — kesh kaliti (nom, versiya) hech qachon eskirmaydi.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from bozorlik.core import PLAN_COLS, UNITS_FLOAT, apply_plan_schema, example_plan_df
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+BUILTIN_NAME = "Standart"  # COMMON_ITEMS dan qurilgan ichki shablon (versiya 0)
+HISTORY_TRIPS = 8          # iste'mol tarixi: oxirgi shuncha safar
+
+
+def builtin_template() -> pd.DataFrame:
+    """COMMON_ITEMS dan standart reja (1 kishilik miqdorlar)."""
+    return example_plan_df()
+
+
+def freeze(df: pd.DataFrame) -> pd.DataFrame:
+    """Umumiy foydalanish uchun jadval: sxema, RangeIndex, manbadan mustaqil (bitta) nusxa."""
+    return apply_plan_schema(df[PLAN_COLS].reset_index(drop=True)).copy()
+
+
+def attach(tpl: pd.DataFrame) -> pd.DataFrame:
+    """Sessiya rejasi: shablon massivlari ustidagi sayoz nusxa (yozilganda o'sha ustun nusxalanadi)."""
+    return tpl.copy(deep=False)
+
+
+def _round_qty(qty, units) -> pd.Series:
+    """Og'irlik/hajm — 3 xonagacha; dona kabi birliklar yuqoriga butunlanadi (0 dan katta bo'lsa kamida 1)."""
+    import numpy as np
+    is_float = units.isin(UNITS_FLOAT).to_numpy()
+    q = np.asarray(qty, dtype="float64")
+    with np.errstate(invalid="ignore"):
+        return np.where(is_float, np.round(q, 3), np.where(q > 0, np.maximum(np.ceil(q - 1e-9), 1.0), 0.0))
+
+
+def scale_plan(tpl: pd.DataFrame, factor: float) -> pd.DataFrame:
+    """Miqdorlar `factor` marta; faqat plan_qty yangi ustun, qolganlari shablon bilan umumiy."""
+    if factor == 1:
+        return attach(tpl)
+    return tpl.assign(plan_qty=_round_qty(tpl["plan_qty"].to_numpy() * float(factor), tpl["unit"]))
+
+
+def apply_history(tpl: pd.DataFrame, typical: pd.Series, factor: float = 1.0) -> pd.DataFrame:
+    """
+    Tarixdagi odatiy miqdor (`typical`: (kanonik nom, birlik) -> miqdor, TripStore.typical_quantities)
+    bor mahsulotlarda shablon miqdori o'rniga olinadi; so'ng hammasi `factor` bilan miqyoslanadi
+    (tarix shablon oilasi hajmida deb hisoblanadi).
+    """
+    import numpy as np
+    import pandas as pd
+    from bozorlik.names import canonical_key
+    keys = pd.MultiIndex.from_arrays([tpl["item"].map(canonical_key).astype(object), tpl["unit"].astype(object)])
+    hist = typical.reindex(keys).to_numpy(dtype="float64", na_value=np.nan) if len(typical) else np.full(len(tpl), np.nan)
+    qty = np.where(np.isnan(hist), tpl["plan_qty"].to_numpy(), hist) * float(factor)
+    return tpl.assign(plan_qty=_round_qty(qty, tpl["unit"]))
+
+
+def generate_plans(tpl: pd.DataFrame, households, base_size: float = 1.0, typical: pd.Series | None = None):
+    """
+    Takrorlanuvchi ro'yxatlar: har bir uy xo'jaligi (`{"name", "size"}`) uchun (nom, reja).
+    Bir xil hajmdagi oilalar bitta miqyoslangan jadvalni ulashadi.
+    """
+    cache = {}
+    for h in households:
+        factor = float(h.get("size") or base_size) / base_size
+        if factor not in cache:
+            cache[factor] = (scale_plan(tpl, factor) if typical is None
+                             else apply_history(tpl, typical, factor))
+        yield h["name"], attach(cache[factor])
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from bozorlik import cli, core
+
+
+def test_output_stems_keep_plain_names_when_unique():
+    assert cli.output_stems(["x/reja.csv", "y/chek.parquet"]) == ["reja", "chek"]
+
+
+def test_output_stems_use_relative_path_on_collision():
+    files = [os.path.join("in", "a", "chek.csv"), os.path.join("in", "b", "chek.csv"), os.path.join("in", "reja.csv")]
+    assert cli.output_stems(files) == ["a__chek", "b__chek", "reja"]
+    assert cli.output_stems(["in/chek.csv", "in/chek.parquet"]) == ["chek_csv", "chek_parquet"]
+
+
+def test_output_stems_refuse_remaining_duplicates():
+    with pytest.raises(ValueError):
+        cli.output_stems(["in/a/chek.csv", "in/b/chek.csv", "in/a__chek.csv"])
+
+
+def test_reprocess_recursive_glob_writes_one_result_per_file(tmp_path):
+    plan = core.example_plan_df()
+    for sub, n in (("a", 2), ("b", 3)):
+        os.makedirs(tmp_path / "in" / sub)
+        plan.head(n).to_csv(tmp_path / "in" / sub / "chek.csv", index=False)
+    files = cli.expand_inputs([str(tmp_path / "in" / "**" / "*.csv")])
+    out = tmp_path / "out"
+
+    results, _ = cli.reprocess(files, core.DEFAULT_QQS, str(out), jobs=1)
+
+    assert [r["output"] for r in results] == ["a__chek", "b__chek"]
+    assert sorted(os.listdir(out)) == ["a__chek_by_category.csv", "a__chek_summary.csv",
+                                       "b__chek_by_category.csv", "b__chek_summary.csv"]
+    assert [r["rows"] for r in results] == [2, 3]
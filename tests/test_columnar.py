@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from bozorlik import columnar, core, reports
+
+pytest.importorskip("pyarrow")
+
+RATE = 12.0
+
+
+@pytest.fixture
+def buy():
+    df = core.apply_buy_schema(core.buy_frame_from_plan(core.example_plan_df().head(10)))
+    df["bought"] = core.replace_at(df["bought"], [0, 3], [True, True])
+    df["actual_qty"] = core.replace_at(df["actual_qty"], [0, 3], [1.25, 2.0])
+    df["unit_price_gross"] = core.replace_at(df["unit_price_gross"], [0, 3], [12_345.67, 8_000.0])
+    return core.recompute_buy_df(df, RATE)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow", ".feather"])
+@pytest.mark.parametrize("memory_map", [True, False])
+def test_file_round_trip(tmp_path, buy, suffix, memory_map):
+    path = tmp_path / f"chek{suffix}"
+    columnar.write_file(buy, str(path))
+    back, meta = columnar.read_frame(str(path), memory_map=memory_map)
+    assert meta == {}
+    pd.testing.assert_frame_equal(back, buy.reset_index(drop=True))
+    assert isinstance(back["category"].dtype, pd.CategoricalDtype)  # lug'at sifatida saqlangan
+
+
+@pytest.mark.parametrize("fmt", list(columnar.FORMATS))
+def test_bytes_and_upload_round_trip(buy, fmt):
+    data = columnar.to_bytes(buy, fmt, metadata={"qqs_rate": RATE, "izoh": "Oylik"})
+    back, meta = columnar.read_frame(data, fmt)
+    pd.testing.assert_frame_equal(back, buy.reset_index(drop=True))
+    assert meta == {"qqs_rate": "12.0", "izoh": "Oylik"}
+
+    upload = io.BytesIO(data)
+    upload.name = "chek" + columnar.FORMATS[fmt][0]  # Streamlit UploadedFile kabi — format nomdan
+    pd.testing.assert_frame_equal(columnar.read_frame(upload)[0], back)
+
+
+@pytest.mark.parametrize("fmt", list(columnar.FORMATS))
+def test_report_summary_metadata(buy, fmt):
+    totals = core.buy_totals(buy)
+    summary, cats = core.summary_df(totals, RATE), core.category_totals_df(totals, RATE)
+    back, meta = columnar.read_frame(reports.columnar_report_bytes(buy, summary, cats, RATE, fmt), fmt)
+    assert len(back) == len(buy)
+    assert float(meta["qqs_rate"]) == RATE
+    assert json.loads(meta["summary"]) == json.loads(summary.to_json(orient="records", force_ascii=False))
+    assert pd.read_json(io.StringIO(meta["by_category"]))["category"].tolist() == cats["category"].tolist()
+
+
+def test_unknown_format_raises(tmp_path, buy):
+    assert columnar.format_of("a.PQ") == "parquet" and columnar.format_of("a.csv") is None
+    with pytest.raises(ValueError):
+        columnar.write_file(buy, str(tmp_path / "chek.csv"))
+    with pytest.raises(ValueError):
+        columnar.read_frame(b"", None)
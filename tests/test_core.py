@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bozorlik import core
+from bozorlik.core import BUY_COLS
+
+RATE = 12.0
+
+
+def buy_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cats = np.array(core.DEFAULT_CATEGORIES)
+    df = pd.DataFrame({
+        "item": [f"Mahsulot {i}" for i in range(n)],
+        "category": cats[rng.integers(0, len(cats), n)],
+        "unit": "kg",
+        "plan_qty": 1.0,
+        "bought": rng.random(n) < 0.7,
+        "actual_qty": rng.integers(1, 5, n) * 0.5,
+        "unit_price_gross": rng.integers(1, 5000, n) * 10.0 + 0.37,
+    })
+    return core.recompute_buy_df(df, RATE)
+
+
+def assert_same_calc(got: pd.DataFrame, expected: pd.DataFrame) -> None:
+    for c in ["line_gross", "line_net", "line_vat"]:
+        np.testing.assert_array_equal(got[c].to_numpy(), expected[c].to_numpy(), err_msg=c)
+
+
+# --- UI'siz yadro: import Streamlit / pandas ni yuklamaydi ---
+def test_core_import_is_headless():
+    import os
+    import subprocess
+    import sys
+    code = ("import sys, bozorlik.core, bozorlik.cli, bozorlik.jobs; "
+            "print(','.join(m for m in ('streamlit', 'pandas', 'numpy', 'xlsxwriter', 'altair') if m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=root)
+    assert out.stdout.strip() == ""
+
+
+# --- infer_unit / infer_category: kalit so'zlar canonical_key bo'yicha ---
+@pytest.mark.parametrize("name, unit, category", [
+    ("Сут", "karobka", "Sut mahsulotlari"),            # kirill yozuv
+    ("Go‘sht", "kg", "Go'sht mahsulotlari"),           # egri apostrof
+    ("Mol GO'SHTI", "kg", "Go'sht mahsulotlari"),
+    ("Paxta yog", "litr", "Boshqa"),                  # "yog " nom oxirida ham
+    ("Kungaboqar yog‘", "litr", "Boshqa"),
+    ("Yogurt", "kg", "Boshqa"),                       # "yog" alohida so'z emas
+    ("Апельсин соки", "litr", "Ichimliklar"),
+    ("Non", "dona", "Non & bakery"),
+    ("", "kg", "Boshqa"),
+    (None, "kg", "Boshqa"),
+])
+def test_infer_unit_and_category(name, unit, category):
+    assert core.infer_unit(name) == unit
+    assert core.infer_category(name) == category
+
+
+def test_infer_batch_matches_scalar():
+    names = pd.Series(["Сут", "sut", None, "Paxta yog", "Guruch", "Сут"], index=[5, 3, 9, 1, 0, 2])
+    units, cats = core.infer_units(names), core.infer_categories(names)
+    assert list(units.index) == list(names.index)
+    assert units.tolist() == [core.infer_unit(n) for n in names]
+    assert cats.tolist() == [core.infer_category(n) for n in names]
+
+
+# --- Bulk ro'yxat: oqimli partiyalar ---
+BULK_TEXT = """Guruch 3 kg Quruq oziq-ovqat
+Zira; 0.05; kg; Quruq oziq-ovqat
+
+Kolbasa, 2, dona
+Suv | 1.5 | litr | Ichimliklar
+Tuxum; dona; 10
+Сут
+non 3,4 dona
+"""
+
+
+def test_bulk_plan_frame_formats():
+    df = core.bulk_plan_frame(BULK_TEXT)
+    assert list(df.columns) == core.PLAN_COLS
+    assert df["item"].tolist() == ["Guruch", "Zira", "Kolbasa", "Suv", "Tuxum", "Сут", "Non"]
+    assert df["unit"].tolist() == ["kg", "kg", "dona", "litr", "dona", "karobka", "dona"]
+    assert df["plan_qty"].tolist() == [3.0, 0.05, 2.0, 1.5, 10.0, 1.0, 3.0]  # miqdorsiz — 1, dona — butun
+    assert df["category"].tolist()[2:6] == ["Go'sht mahsulotlari", "Ichimliklar", "Boshqa", "Sut mahsulotlari"]
+    assert core.parse_bulk_lines(BULK_TEXT) == df.to_dict("records")
+
+
+@pytest.mark.parametrize("source", [
+    BULK_TEXT,
+    ("\ufeff" + BULK_TEXT).encode("utf-8"),
+    io.StringIO(BULK_TEXT),
+])
+def test_iter_bulk_batches_sources_and_progress(source):
+    seen = []
+    batches = list(core.iter_bulk_batches(source, batch_size=3, progress=seen.append))
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert seen == [4, 7, 8]  # bo'sh qator ham sanaladi
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), core.bulk_plan_frame(BULK_TEXT))
+
+
+def test_iter_bulk_batches_leaves_upload_open():
+    upload = io.BytesIO(BULK_TEXT.encode("utf-8"))
+    assert len(core.bulk_plan_frame(upload, batch_size=2)) == 7
+    assert not upload.closed
+
+
+def test_bulk_plan_frame_empty():
+    assert core.bulk_plan_frame("\n  \n").empty
+    assert list(core.bulk_plan_frame("").columns) == core.PLAN_COLS
+    assert core.parse_bulk_lines("") == []
+
+
+# --- recompute_buy_df: qatorma-qator etalon bilan tenglik ---
+def messy_buy_frame(n: int, seed: int) -> pd.DataFrame:
+    """NaN, manfiy, uzun kasrli va bo'sh qiymatlar aralash xom chek."""
+    rng = np.random.default_rng(seed)
+
+    def messy(values):
+        v = values.copy()
+        v[rng.random(n) < 0.1] = np.nan
+        v[rng.random(n) < 0.1] *= -1
+        return v
+
+    cats = np.array([*core.DEFAULT_CATEGORIES, None], dtype=object)
+    return pd.DataFrame({
+        "item": [f"Mahsulot {i}" for i in range(n)],
+        "category": cats[rng.integers(0, len(cats), n)],
+        "unit": np.array(core.ALL_UNITS)[rng.integers(0, len(core.ALL_UNITS), n)],
+        "plan_qty": messy(rng.random(n) * 10),
+        "bought": np.array([True, False, None], dtype=object)[rng.integers(0, 3, n)],
+        "actual_qty": messy(np.where(rng.random(n) < 0.5, np.round(rng.random(n) * 5, 1), rng.random(n) * 5)),
+        "unit_price_gross": messy(rng.random(n) * 100_000),
+        "line_gross": 0.0,
+        "line_net": 0.0,
+        "line_vat": 0.0,
+    })
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("rate", [0.0, 7.5, 12.0, 20.0])
+def test_recompute_matches_rowloop_reference(seed, rate):
+    from benchmarks.hotpaths import recompute_rowloop
+    raw = messy_buy_frame(80, seed)
+    got = core.recompute_buy_df(raw, rate)
+    ref = recompute_rowloop(raw, rate)
+    for c in ["plan_qty", "actual_qty", "unit_price_gross", "line_gross"]:
+        np.testing.assert_array_equal(got[c].to_numpy(), ref[c].to_numpy(dtype="float64"), err_msg=c)
+    np.testing.assert_array_equal(got["bought"].to_numpy(), ref["bought"].to_numpy(dtype=bool))
+    assert got["category"].astype(object).tolist() == ref["category"].tolist()
+    # QQS chek darajasida taqsimlanadi: har qatorda skalyar natijadan ko'pi bilan 1 tiyin farq,
+    # jami esa chek summasidan bir marta hisoblangan QQS ga teng
+    gross_t, vat_t = core.to_tiyin(got["line_gross"]), core.to_tiyin(got["line_vat"])
+    assert np.abs(vat_t - core.to_tiyin(ref["line_vat"])).max() <= 1
+    np.testing.assert_array_equal(core.to_tiyin(got["line_net"]) + vat_t, gross_t)
+    assert vat_t.sum() == core.vat_tiyin(gross_t.sum(), rate)
+    assert raw["unit_price_gross"].isna().any()  # kirish jadvali o'zgarmagan
+
+
+# --- merge_view_edits: sahifa deltalari asosiy jadvalga qator ID bo'yicha ---
+def test_merge_view_edits_maps_page_edits_to_row_ids():
+    master = buy_frame(250)
+    totals = core.buy_totals(master)
+    page_ids = master.index[100:200]
+    view = core.view_frame(master, page_ids)
+    edited = view.copy()
+    edited.loc[3, "unit_price_gross"] = 777.0
+    new_row = {"item": "Yangi", "category": "Boshqa", "unit": "dona", "plan_qty": 0.0,
+               "bought": True, "actual_qty": 2.0, "unit_price_gross": 500.0}
+    # st.data_editor kabi: o'chirilgan qator tushib qoladi (qolganlar yorlig'i saqlanadi), yangisi — max + 1
+    edited = pd.concat([edited.drop(index=5), pd.DataFrame([new_row], index=[len(view)])])
+    edits = {"edited_rows": {3: {"unit_price_gross": 777.0}}, "added_rows": [new_row], "deleted_rows": [5]}
+
+    out, n_dirty = core.merge_view_edits(master, page_ids, view, edited[BUY_COLS], edits, RATE, totals)
+
+    assert n_dirty == 2
+    assert len(out) == 250
+    assert page_ids[5] not in out.index
+    assert out.loc[page_ids[3], "unit_price_gross"] == 777.0
+    assert out.index[-1] == 250 and out.loc[250, "item"] == "Yangi"
+    # Sahifadan tashqaridagi qatorlar tegilmagan
+    pd.testing.assert_frame_equal(out.loc[master.index[:100], BUY_COLS], master.loc[master.index[:100], BUY_COLS])
+    # Delta yig'indilar va QQS — to'liq qayta hisob bilan aynan bir xil
+    full = core.recompute_buy_df(out[BUY_COLS], RATE)
+    assert_same_calc(out, full)
+    assert totals == core.buy_totals(full)
+
+
+def test_merge_view_edits_without_edits_returns_master():
+    master = buy_frame(30)
+    view = core.view_frame(master, master.index[:10])
+    out, n_dirty = core.merge_view_edits(master, master.index[:10], view, view[BUY_COLS], {}, RATE,
+                                         core.buy_totals(master))
+    assert out is master and n_dirty == 0
+
+
+def test_merge_view_edits_rejects_mismatched_deltas():
+    master = buy_frame(30)
+    view = core.view_frame(master, master.index[:10])
+    edits = {"added_rows": [{"item": "X"}]}  # editor natijasida yangi qator yo'q
+    assert core.merge_view_edits(master, master.index[:10], view, view[BUY_COLS], edits, RATE,
+                                 core.buy_totals(master)) is None
+
+
+@pytest.mark.parametrize("page", [slice(0, 50), slice(200, 250)])
+def test_merge_view_edits_category_change(page):
+    master = buy_frame(250, seed=3)
+    totals = core.buy_totals(master)
+    page_ids = master.index[page]
+    view = core.view_frame(master, page_ids)
+    edited = view.copy()
+    edited["category"] = edited["category"].astype(object)
+    edited.loc[[0, 7, 9], "category"] = "Ichimliklar"
+    edits = {"edited_rows": {p: {"category": "Ichimliklar"} for p in (0, 7, 9)}}
+    out, _ = core.merge_view_edits(master, page_ids, view, edited[BUY_COLS], edits, RATE, totals)
+    full = core.recompute_buy_df(out[BUY_COLS], RATE)
+    assert_same_calc(out, full)
+    assert totals == core.buy_totals(full)
+
+
+# --- apply_buy_edits / reallocate_vat: QQS faqat tegilgan guruhlarda qayta taqsimlanadi ---
+@pytest.mark.parametrize("seed", range(5))
+def test_apply_buy_edits_matches_full_allocation(seed):
+    rng = np.random.default_rng(seed)
+    base = buy_frame(120, seed=seed)
+    totals = core.buy_totals(base)
+    cats = core.DEFAULT_CATEGORIES
+    for _ in range(6):
+        edited = base[BUY_COLS].copy()
+        edited["category"] = edited["category"].astype(object)
+        pos = rng.choice(len(base), 4, replace=False)
+        edits = {"edited_rows": {}}
+        for p in pos[:2]:
+            edited.iloc[p, edited.columns.get_loc("unit_price_gross")] = float(rng.integers(1, 9000)) + 0.13
+            edits["edited_rows"][int(p)] = {"unit_price_gross": 1}
+        for p in pos[2:]:
+            edited.iloc[p, edited.columns.get_loc("category")] = cats[rng.integers(0, len(cats))]
+            edits["edited_rows"][int(p)] = {"category": 1}
+        base, n_dirty = core.apply_buy_edits(base, edited, edits, RATE, totals)
+        assert n_dirty == 4
+        full = core.recompute_buy_df(base[BUY_COLS], RATE)
+        assert_same_calc(base, full)
+        assert totals == core.buy_totals(full)
+
+
+def test_reallocate_vat_touches_only_affected_groups():
+    df = buy_frame(200, seed=7)
+    groups = {"Ichimliklar"}
+    targets = core.allocate_vat_groups(
+        {k: v["gross_t"] for k, v in core.buy_totals(df)["by_cat"].items()}, RATE)
+    spoiled = df.copy()
+    spoiled["line_vat"] = -1.0
+    out = core.reallocate_vat(spoiled, RATE, groups, targets, targets)
+    mask = (df["category"] == "Ichimliklar").to_numpy()
+    np.testing.assert_array_equal(out.loc[mask, "line_vat"].to_numpy(), df.loc[mask, "line_vat"].to_numpy())
+    assert (out.loc[~mask, "line_vat"] == -1.0).all()
+    assert core.reallocate_vat(df, RATE, set(), targets, targets) is df
+
+
+# --- purchases_excel_bytes: constant_memory rejimida bo'sh qiymatlar ---
+def test_excel_constant_memory_writes_missing_values_as_blank():
+    openpyxl = pytest.importorskip("openpyxl")
+    import io
+    buy = buy_frame(200, seed=1)
+    n = len(buy)
+    category = buy["category"].astype(object).to_numpy(copy=True)
+    category[1] = np.nan
+    unit = np.array(["kg"] * n, dtype=object)
+    unit[2] = None
+    price = buy["unit_price_gross"].to_numpy(dtype="float64", copy=True)
+    price[4] = np.nan
+    buy = buy.assign(
+        category=pd.Categorical(category),
+        unit=unit,
+        plan_qty=pd.array([1] * 3 + [None] + [1] * (n - 4), dtype="Int64"),
+        unit_price_gross=price,
+    )
+    summary = pd.DataFrame({"metric": ["Gross", "Izoh"], "value": [1.0, None]})
+
+    data = core.purchases_excel_bytes(buy, summary, summary.iloc[:0], constant_memory=True)
+
+    ws = openpyxl.load_workbook(io.BytesIO(data), read_only=True)["Purchases"]
+    header, *rows = ws.iter_rows(min_row=1, max_row=6, values_only=True)
+    col = {c: i for i, c in enumerate(header)}
+    assert rows[1][col["category"]] is None and rows[0][col["category"]] == category[0]
+    assert rows[2][col["unit"]] is None
+    assert rows[3][col["plan_qty"]] is None and rows[0][col["plan_qty"]] == 1
+    assert rows[4][col["unit_price_gross"]] is None
+    assert rows[4][col["item"]] == buy["item"].iloc[4]
+
+
+# --- sync_buy_from_plan: kalit canonical_key bo'yicha ---
+def test_sync_keys_use_canonical_names():
+    a = pd.DataFrame({"item": ["Помидор", " POMIDOR ", "Olma"], "unit": ["kg", "kg", "dona"]})
+    b = pd.DataFrame({"item": ["pomidor", "Pomidor", "олма"], "unit": ["kg", "kg", "dona"]})
+    assert list(core.sync_keys(a)) == list(core.sync_keys(b))
+    assert core.sync_keys(a)[0] != core.sync_keys(a)[1]  # takror — alohida pozitsiya
+
+
+def test_sync_buy_from_plan_keeps_row_for_transliterated_name():
+    plan = pd.DataFrame({"item": ["Pomidor", "Olma"], "category": ["Sabzavotlar", "Mevalar"],
+                         "unit": ["kg", "kg"], "plan_qty": [1.0, 2.0]})
+    buy = core.recompute_buy_df(core.buy_frame_from_plan(plan), RATE)
+    buy.loc[0, ["bought", "actual_qty", "unit_price_gross"]] = [True, 1.5, 12000.0]
+    plan.loc[0, "item"] = "Помидор"
+
+    out, stats = core.sync_buy_from_plan(plan, buy)
+
+    assert stats == {"added": 0, "removed": 0, "updated": 1}
+    assert out.loc[0, "item"] == "Помидор" and out.loc[0, "unit_price_gross"] == 12000.0
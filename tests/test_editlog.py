@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pandas as pd
+import pytest
+
+from bozorlik import core, editlog
+from bozorlik.core import PLAN_COLS
+
+
+def plan_frame():
+    return core.apply_plan_schema(core.example_plan_df().head(6))
+
+
+def with_qty(df, pos, qty):
+    out = df.copy(deep=False)
+    out["plan_qty"] = core.replace_at(df["plan_qty"], [pos], [qty])
+    return out
+
+
+def assert_same(a, b):
+    pd.testing.assert_frame_equal(a[PLAN_COLS], b[PLAN_COLS], check_dtype=False, check_categorical=False)
+
+
+# --- frame_delta / apply_delta / invert_delta ---
+def test_delta_round_trip_with_added_removed_and_reordered_rows():
+    old = plan_frame()
+    new = pd.concat([old.drop(index=old.index[1]).iloc[::-1],
+                     old.iloc[[0]].set_axis([100]).assign(item="Yangi")])
+    new = with_qty(new, 0, 9.0)
+    d = editlog.frame_delta(old, new, PLAN_COLS)
+    d = json.loads(json.dumps(d))  # safar jurnaliga yoziladigan ko'rinish
+    assert_same(editlog.apply_delta(old, d), new)
+    assert_same(editlog.apply_delta(new, editlog.invert_delta(d)), old)
+    assert editlog.frame_delta(old, old.copy(), PLAN_COLS) is None
+
+
+def test_cell_delta_stores_only_changed_cells():
+    old = plan_frame()
+    d = editlog.frame_delta(old, with_qty(old, 2, 7.0), PLAN_COLS)
+    assert list(d["cells"]) == ["plan_qty"]
+    assert d["cells"]["plan_qty"][0] == [old.index[2]]
+    assert editlog.delta_cells(d) == 1 and d["order"] is None
+
+
+# --- EditLog: undo / redo / goto, pending ---
+def test_undo_redo_goto():
+    base = plan_frame()
+    log = editlog.EditLog({"plan": (base, PLAN_COLS)})
+    states = [base]
+    for i in range(3):
+        states.append(with_qty(states[-1], i, 10.0 + i))
+        assert log.record({"plan": states[-1]}, f"qadam {i}")
+    assert not log.record({"plan": log.state["plan"]})  # o'sha obyekt — solishtirilmaydi
+    assert log.cursor == 3 and len(log.drain()) == 3 and log.drain() == []
+
+    assert log.undo()
+    assert_same(log.state["plan"], states[2])
+    assert log.goto(0) == 2
+    assert_same(log.state["plan"], states[0])
+    assert not log.undo()
+    assert log.redo()
+    assert_same(log.state["plan"], states[1])
+    assert [label for label, _ in log.drain()] == ["Bekor qilindi: qadam 2", "Bekor qilindi: qadam 1",
+                                                   "Bekor qilindi: qadam 0", "Qaytarildi: qadam 0"]
+
+    # Yangi tahrir redo ro'yxatini kesadi
+    assert log.record({"plan": with_qty(log.state["plan"], 5, 77.0)}, "yangi")
+    assert len(log.steps) == 2 and not log.redo()
+
+
+def test_max_steps_trims_oldest():
+    base = plan_frame()
+    log = editlog.EditLog({"plan": (base, PLAN_COLS)}, max_steps=3)
+    df = base
+    for i in range(5):
+        df = with_qty(df, 0, float(i + 1))
+        log.record({"plan": df}, str(i))
+    assert [s["label"] for s in log.steps] == ["2", "3", "4"] and log.cursor == 3
+    assert log.goto(-10) == 3
+    assert log.state["plan"]["plan_qty"].iloc[0] == 2.0  # eng eski saqlangan qadamdan oldingi holat
+    assert editlog.MAX_STEPS == 200
+
+
+def test_replay_restores_journal_without_pending():
+    base = plan_frame()
+    writer = editlog.EditLog({"plan": (base, PLAN_COLS)})
+    writer.record({"plan": with_qty(base, 1, 4.0)}, "a")
+    entries = json.loads(json.dumps(writer.drain()))
+    reader = editlog.EditLog({"plan": (base, PLAN_COLS)})
+    for label, ops in entries:
+        reader.replay(ops, label)
+    assert_same(reader.state["plan"], writer.state["plan"])
+    assert reader.cursor == 1 and reader.drain() == []
+    assert reader.undo()
+    assert_same(reader.state["plan"], base)
+
+
+@pytest.mark.parametrize("values", [[1.5, float("nan")], ["a", None]])
+def test_values_are_json_ready(values):
+    assert editlog._values(pd.Series(values)) == [values[0], None]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import io
+
+import pandas as pd
+import pytest
+
+from bozorlik import importer
+
+# Qator raqamlari: sarlavha = 1, bo'sh qator (3) sanaladi
+PLAN_CSV = (
+    "Item;Unit;Plan_qty;Category\n"
+    "Pomidor;kg;1,5;Meva-sabzavot\n"
+    "\n"
+    ";kg;1;\n"
+    "Sut;L;abc;\n"
+    "Non;dona;-2;\n"
+    "Tuxum;gallon;3;\n"
+    "Guruch;;2;Quruq oziq-ovqat\n"
+    "Olma;кг;2;Noma'lum\n"
+    "Shakar;kg;1;\n"
+    "Sovun;dona;2,5;Uy-ro'zg'or\n"
+)
+
+EXPECTED_REPORT = [
+    (4, "item", importer.REJECTED),
+    (5, "plan_qty", importer.REJECTED),
+    (6, "plan_qty", importer.REJECTED),
+    (7, "unit", importer.REJECTED),
+    (8, "unit", importer.FIXED),
+    (9, "category", importer.FIXED),
+    (10, "category", importer.FIXED),
+    (11, "plan_qty", importer.FIXED),
+]
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def csv_reader(request, monkeypatch):
+    """Ikkala CSV yo'li: pyarrow oqimli o'quvchi va pd.read_csv (pyarrow "o'rnatilmagan")."""
+    if request.param == "pyarrow":
+        pytest.importorskip("pyarrow")
+    else:
+        real = importlib.util.find_spec
+        monkeypatch.setattr(importlib.util, "find_spec", lambda name, *a: None if name == "pyarrow" else real(name, *a))
+    return request.param
+
+
+def check_result(res):
+    assert res["plan"]["item"].tolist() == ["Pomidor", "Guruch", "Olma", "Shakar", "Sovun"]
+    assert res["plan"]["unit"].tolist() == ["kg", "kg", "kg", "kg", "dona"]
+    assert res["plan"]["plan_qty"].tolist() == [1.5, 2.0, 2.0, 1.0, 2.0]
+    assert res["plan"]["category"].tolist()[2:4] == ["Meva-sabzavot", "Quruq oziq-ovqat"]
+    assert list(res["report"][["line", "column", "action"]].itertuples(index=False, name=None)) == EXPECTED_REPORT
+    assert (res["rows"], res["accepted"], res["rejected"], res["fixed"]) == (9, 5, 4, 4)
+
+
+# --- CSV: qator raqamlari, rad etish / tuzatish sabablari ---
+@pytest.mark.parametrize("chunk_rows", [3, importer.IMPORT_CHUNK_ROWS])
+def test_import_csv_lines_and_reasons(csv_reader, chunk_rows):
+    res = importer.import_plan(io.BytesIO(PLAN_CSV.encode()), "plan.csv", chunk_rows=chunk_rows)
+    check_result(res)
+    reasons = dict(zip(res["report"]["line"], res["report"]["reason"]))
+    assert reasons[5] == "miqdor son emas"
+    assert reasons[6] == "manfiy miqdor"
+    assert reasons[7] == "noma'lum birlik"
+    assert reasons[10] == "kategoriya bo'sh — nomdan aniqlandi"
+
+
+def test_import_csv_from_path_with_comma_delimiter(csv_reader, tmp_path):
+    path = tmp_path / "plan.csv"
+    path.write_text(PLAN_CSV.replace(",", ".").replace(";", ","), encoding="utf-8")
+    check_result(importer.import_plan(str(path)))
+
+
+def test_missing_required_column_raises(csv_reader):
+    with pytest.raises(ValueError, match="plan_qty"):
+        importer.import_plan(io.BytesIO(b"item,unit\nPomidor,kg\n"), "plan.csv")
+
+
+def test_report_is_capped_but_counted():
+    res = importer.import_plan(io.BytesIO(PLAN_CSV.encode()), "plan.csv", max_report=3)
+    assert len(res["report"]) == 3 and res["report_total"] == len(EXPECTED_REPORT)
+
+
+def test_missing_category_column_is_inferred_silently():
+    res = importer.import_plan(io.BytesIO("item,unit,plan_qty\nGuruch,kg,2\n".encode()), "plan.csv")
+    assert res["plan"]["category"].tolist() == ["Quruq oziq-ovqat"]
+    assert res["report"].empty and res["fixed"] == 0
+
+
+def test_unknown_format_raises():
+    with pytest.raises(ValueError, match="format"):
+        importer.import_plan(io.BytesIO(b""), "plan.pdf")
+
+
+# --- Excel va Parquet ---
+def test_import_xlsx(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for line in PLAN_CSV.splitlines():
+        cells = line.split(";") if line else []
+        ws.append([c.replace(",", ".") if i == 2 else c for i, c in enumerate(cells)])
+    path = tmp_path / "plan.xlsx"
+    wb.save(path)
+    check_result(importer.import_plan(str(path), chunk_rows=4))
+
+
+def test_import_parquet_numeric_qty(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "plan.parquet"
+    pd.DataFrame({"Item": ["Pomidor", "Sovun", "Non"], "Unit": ["kg", "dona", "dona"],
+                  "Plan_qty": [1.5, 2.5, -1.0]}).to_parquet(path)
+    res = importer.import_plan(str(path))
+    assert res["plan"]["plan_qty"].tolist() == [1.5, 2.0]
+    assert list(res["report"][["line", "action"]].itertuples(index=False, name=None)) == [
+        (3, importer.FIXED), (4, importer.REJECTED)]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from bozorlik import jobs
+
+
+def _flaky(state):
+    state["calls"] += 1
+    if state["calls"] == 1:
+        raise OSError("disk to'la")
+    return b"ok"
+
+
+def test_failed_job_is_retried_only_after_cooldown(tmp_path):
+    queue = jobs.JobQueue(max_workers=1, cache=jobs.ArtifactCache(str(tmp_path)))
+    state = {"calls": 0}
+    try:
+        job = queue.submit("k", _flaky, state)
+        queue.wait(["k"])
+        assert job.status == jobs.FAILED and "disk" in job.error
+
+        # Sovish vaqtida — o'sha xatoli vazifa (har rerunda qayta qurilmaydi)
+        assert queue.submit("k", _flaky, state) is job
+        assert state["calls"] == 1
+
+        job.finished -= jobs.RETRY_AFTER_S
+        retry = queue.submit("k", _flaky, state)
+        assert retry is not job
+        queue.wait(["k"])
+        assert retry.status == jobs.DONE and queue.result("k") == b"ok"
+        assert state["calls"] == 2
+    finally:
+        queue.shutdown()
+
+
+def test_done_job_served_from_cache(tmp_path):
+    queue = jobs.JobQueue(max_workers=1, cache=jobs.ArtifactCache(str(tmp_path)))
+    try:
+        job = queue.submit("k", bytes, 3)
+        queue.wait(["k"])
+        assert queue.submit("k", bytes, 3) is job
+        fresh = jobs.JobQueue(max_workers=1, cache=jobs.ArtifactCache(str(tmp_path)))
+        again = fresh.submit("k", bytes, 3)
+        assert again.cached and again.status == jobs.DONE and fresh.result("k") == b"\0\0\0"
+        fresh.shutdown()
+    finally:
+        queue.shutdown()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+from bozorlik import names
+
+
+# --- canonical_key: yozilish shakllari bitta kalitga ---
+@pytest.mark.parametrize("raw, key", [
+    (" Помидор ", "pomidor"),
+    ("POMIDOR", "pomidor"),
+    ("Go‘sht", "go'sht"),
+    ("Goʻsht", "go'sht"),
+    ("Ўрик", "o'rik"),
+    ("Sut 2,5%", "sut 2.5%"),
+    ("Non (issiq)!", "non issiq"),
+    (None, ""),
+])
+def test_canonical_key(raw, key):
+    assert names.canonical_key(raw) == key
+
+
+@pytest.mark.parametrize("a, b, limit, expected", [
+    ("pomidor", "pamidor", 2, 1),
+    ("kartoshka", "kartoshka", 2, 0),
+    ("kartoshka", "kartofel", 2, 3),   # limit dan oshsa limit + 1
+    ("olma", "", 4, 4),
+])
+def test_edit_distance(a, b, limit, expected):
+    assert names.edit_distance(a, b, limit) == expected
+
+
+# --- NameIndex.match: aynan, translit va xato yozilgan nomlar ---
+def test_name_index_match():
+    idx = names.NameIndex(["Pomidor", "Kartoshka", "Sut", "Suv", "Sut 2.5%", "Sut 3.2%"])
+    assert idx.match("помидор") == "Pomidor"
+    assert idx.match("pamidor") == "Pomidor"          # 1 tahrir
+    assert idx.match("kartoshkka") == "Kartoshka"
+    assert idx.match("sat") is None                   # qisqa nom — faqat aynan
+    assert idx.match("Sut 3.5%") is None              # raqamlar farq qiladi
+    assert idx.match("sut 2,5%") == "Sut 2.5%"
+    assert idx.match("banan") is None
+    assert len(idx) == 6 and idx.add("POMIDOR") == 0  # takror kalit qo'shilmaydi
+
+
+# --- dedupe_names / merge_plan_duplicates ---
+def test_dedupe_names_prefers_catalog_then_most_frequent():
+    catalog = names.NameIndex(["Kartoshka"])
+    got = names.dedupe_names(["pamidor", "Pomidor", "Pomidor", "помидор", "kartoshkka", None, "  "], catalog)
+    assert got == {"pamidor": "Pomidor", "Pomidor": "Pomidor", "помидор": "Pomidor", "kartoshkka": "Kartoshka"}
+    assert len(catalog) == 1  # katalog o'zgartirilmaydi
+    weighted = names.dedupe_names(["pamidor", "Pomidor"], weights=[10, 1])
+    assert weighted["Pomidor"] == "pamidor"
+
+
+def test_merge_plan_duplicates_sums_quantities():
+    plan = pd.DataFrame({
+        "item": ["Pomidor", "pamidor", "Помидор", "Olma"],
+        "category": ["Sabzavotlar", "Boshqa", "Sabzavotlar", "Mevalar"],
+        "unit": ["kg", "kg", "dona", "kg"],
+        "plan_qty": [1.0, 0.5, 3.0, 2.0],
+    }, index=[10, 11, 12, 13])
+    out, n = names.merge_plan_duplicates(plan)
+    assert n == 1
+    assert list(out.index) == [10, 12, 13]
+    assert out.loc[10, "plan_qty"] == 1.5 and out.loc[10, "category"] == "Sabzavotlar"
+    assert out.loc[12, "item"] == "Pomidor" and out.loc[12, "unit"] == "dona"  # boshqa birlik — alohida
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from bozorlik import profiling
+
+
+# --- _percentile: eng yaqin rang (nearest-rank) ---
+@pytest.mark.parametrize("n, q, expected", [
+    (100, 50, 50), (100, 95, 95), (100, 99, 99), (100, 100, 100),
+    (20, 50, 10), (20, 95, 19), (20, 99, 20),
+    (1, 99, 1), (5, 0, 1),
+])
+def test_percentile_nearest_rank(n, q, expected):
+    assert profiling._percentile(list(range(1, n + 1)), q) == expected
+
+
+def test_percentile_empty():
+    assert profiling._percentile([], 95) == 0.0
+
+
+def test_rolling_stats_percentiles():
+    stats = profiling.RollingStats(window=100)
+    for ms in range(1, 151):  # oyna faqat oxirgi 100 tasini saqlaydi: 51..150
+        stats.add({"total_ms": float(ms), "spans": [{"name": "recompute", "ms": float(ms) / 2}]})
+    rows = {r["span"]: r for r in stats.percentiles()}
+    assert rows["total"] == {"span": "total", "n": 100, "p50_ms": 100.0, "p95_ms": 145.0, "p99_ms": 149.0}
+    assert rows["recompute"]["p95_ms"] == 72.5
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from bozorlik import core, shared
+from bozorlik.core import BUY_COLS
+
+RATE = 12.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = shared.SharedStore(str(tmp_path / "shared.db"))
+    yield s
+    s.close()
+
+
+def buy_frame(n: int = 60, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cats = np.array(core.DEFAULT_CATEGORIES)
+    df = pd.DataFrame({
+        "item": [f"Mahsulot {i}" for i in range(n)],
+        "category": cats[rng.integers(0, len(cats), n)],
+        "unit": "kg",
+        "plan_qty": 1.0,
+        "bought": rng.random(n) < 0.7,
+        "actual_qty": rng.integers(1, 5, n) * 0.5,
+        "unit_price_gross": rng.integers(1, 5000, n) * 10.0 + 0.37,
+    })
+    return core.recompute_buy_df(df, RATE)
+
+
+def assert_same_calc(got: pd.DataFrame, expected: pd.DataFrame) -> None:
+    for c in ["line_gross", "line_net", "line_vat"]:
+        np.testing.assert_array_equal(got[c].to_numpy(), expected.loc[got.index, c].to_numpy(), err_msg=c)
+
+
+# --- apply_changes: lenta qatorlari va QQS faqat tegilgan kategoriyalarda ---
+def test_apply_changes_matches_snapshot(store):
+    list_id = store.create_list("Oila", buy_frame(), RATE)
+    local, version = store.snapshot(list_id)
+    totals = core.buy_totals(local)
+
+    other, other_version = store.snapshot(list_id)
+    res = store.commit(list_id, other_version, edits=[
+        (3, "unit_price_gross", shared._py(other.loc[3, "unit_price_gross"]), 1234.56),
+        (7, "category", str(other.loc[7, "category"]), "Ichimliklar"),
+        (8, "bought", bool(other.loc[8, "bought"]), True),
+    ], added=other.loc[[0], shared.SHARED_COLS].assign(item="Yangi"), deleted=[11])
+    assert res["conflicts"] == 0
+
+    feed, version = store.changes(list_id, version)
+    out = shared.apply_changes(local, feed, RATE, totals)
+
+    expected, _ = store.snapshot(list_id)
+    assert list(out.index) == list(expected.index)
+    assert_same_calc(out, expected)
+    assert totals == core.buy_totals(expected)
+
+
+# --- commit: katak darajasidagi optimistik yozish ---
+def test_parallel_edits_to_different_cells_merge(store):
+    df = buy_frame(10)
+    list_id = store.create_list("Oila", df, RATE)
+    _, seen = store.snapshot(list_id)
+    a = store.commit(list_id, seen, edits=[(2, "actual_qty", shared._py(df.loc[2, "actual_qty"]), 4.0)], editor="ona")
+    b = store.commit(list_id, seen, edits=[(2, "unit_price_gross", shared._py(df.loc[2, "unit_price_gross"]), 900.0)],
+                     editor="ota")
+    assert (a["applied"], a["conflicts"]) == (1, 0)
+    assert (b["applied"], b["conflicts"]) == (1, 0)  # qator o'zgargan, lekin boshqa katak
+    snap, version = store.snapshot(list_id)
+    assert snap.loc[2, "actual_qty"] == 4.0 and snap.loc[2, "unit_price_gross"] == 900.0
+    assert version == b["version"] == seen + 2
+
+
+def test_same_cell_conflict_keeps_server_value(store):
+    df = buy_frame(10)
+    list_id = store.create_list("Oila", df, RATE)
+    _, seen = store.snapshot(list_id)
+    old = shared._py(df.loc[4, "unit_price_gross"])
+    store.commit(list_id, seen, edits=[(4, "unit_price_gross", old, 100.0)])
+    res = store.commit(list_id, seen, edits=[(4, "unit_price_gross", old, 200.0)])
+    assert (res["applied"], res["conflicts"]) == (0, 1)
+    assert res["version"] == seen + 1  # hech narsa yozilmadi — versiya o'smaydi
+    # Xuddi shu yangi qiymat — to'qnashuv emas
+    same = store.commit(list_id, seen, edits=[(4, "unit_price_gross", old, 100.0)])
+    assert same["conflicts"] == 0
+    assert store.snapshot(list_id)[0].loc[4, "unit_price_gross"] == 100.0
+    with pytest.raises(ValueError):
+        store.commit(list_id, seen, edits=[(4, "line_gross", 0, 1)])
+
+
+def test_delete_refused_after_concurrent_edit(store):
+    df = buy_frame(10)
+    list_id = store.create_list("Oila", df, RATE)
+    _, seen = store.snapshot(list_id)
+    store.commit(list_id, seen, edits=[(5, "bought", bool(df.loc[5, "bought"]), not df.loc[5, "bought"])])
+    res = store.commit(list_id, seen, deleted=[5, 6])
+    assert res["deleted"] == 1 and res["conflicts"] == 1
+    snap, _ = store.snapshot(list_id)
+    assert 5 in snap.index and 6 not in snap.index
+
+
+def test_changes_feed_since_version(store):
+    list_id = store.create_list("Oila", buy_frame(10), RATE)
+    v1 = store.version(list_id)
+    feed, v = store.changes(list_id, v1)
+    assert feed.empty and v == v1
+    added = buy_frame(2, seed=5)[shared.SHARED_COLS]
+    res = store.commit(list_id, v1, added=added, deleted=[0])
+    feed, v = store.changes(list_id, v1)
+    assert v == res["version"]
+    assert list(feed.index) == [0, 10, 11]  # server ID lari ro'yxat oxiridan
+    assert feed["deleted"].tolist() == [True, False, False]
+    full, _ = store.changes(list_id, 0)
+    assert 0 not in full.index and len(full) == 11
+    with pytest.raises(KeyError):
+        store.changes(999)
+
+
+def test_diff_rows_round_trip(store):
+    df = buy_frame(8)
+    list_id = store.create_list("Oila", df, RATE)
+    local, seen = store.snapshot(list_id)
+    new = local.copy()
+    new.loc[1, "actual_qty"] = 9.5
+    new = pd.concat([new.drop(index=3), local.loc[[0]].set_axis([-1]).assign(item="Yangi")])
+    edits, added, deleted = shared.diff_rows(local, new)
+    assert edits == [(1, "actual_qty", shared._py(local.loc[1, "actual_qty"]), 9.5)]
+    assert list(added.index) == [-1] and list(deleted) == [3]
+    store.commit(list_id, seen, edits, added, deleted)
+    feed, _ = store.changes(list_id, seen)
+    out = shared.apply_changes(new, feed, RATE, drop=added.index)
+    expected, _ = store.snapshot(list_id)
+    assert list(out.index) == list(expected.index)
+    pd.testing.assert_frame_equal(out[BUY_COLS].astype(object), expected[BUY_COLS].astype(object),
+                                  check_dtype=False)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from bozorlik import core, storage
+from bozorlik.editlog import EditLog
+
+RATE = 12.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = storage.TripStore(str(tmp_path / "bozorlik.db"))
+    yield s
+    s.close()
+
+
+def trip_frames(n_bought: int = 3):
+    plan = core.apply_plan_schema(core.example_plan_df().head(8))
+    buy = core.apply_buy_schema(core.buy_frame_from_plan(plan))
+    pos = np.arange(n_bought)
+    buy["bought"] = core.replace_at(buy["bought"], pos, [True] * n_bought)
+    buy["actual_qty"] = core.replace_at(buy["actual_qty"], pos, [1.0] * n_bought)
+    buy["unit_price_gross"] = core.replace_at(buy["unit_price_gross"], pos, [10_000.0 * (i + 1) for i in pos])
+    return plan, core.recompute_buy_df(buy, RATE)
+
+
+def month_gross(store) -> float:
+    return float(store.rollup("month")["gross"].sum())
+
+
+# --- Jurnal (snapshotsiz) yozuvlari: rollup va o'qish joriy ---
+def test_journaled_edits_reach_rollups_and_readers(store):
+    plan, buy = trip_frames()
+    trip = store.create_trip("Haftalik", RATE)
+    store.save_trip(trip, plan, buy, RATE)
+    assert month_gross(store) == 60_000.0
+
+    log = EditLog({"plan": (plan, core.PLAN_COLS), "buy": (buy, core.BUY_INPUT_COLS)})
+    edited = buy.copy()
+    edited["unit_price_gross"] = core.replace_at(buy["unit_price_gross"], [0], [15_000.0])
+    edited = core.recompute_buy_df(edited, RATE)
+    log.record({"buy": edited}, "Narx")
+    n_ops = store.append_ops(trip, log.drain(), edited)
+
+    assert n_ops < 20  # SNAPSHOT_EVERY gacha — snapshot yo'q
+    assert month_gross(store) == 65_000.0
+    loaded = store.load_buy(trip)
+    assert loaded.loc[buy.index[0], "unit_price_gross"] == 15_000.0
+    assert loaded["line_gross"].sum() == 65_000.0
+    assert store.load_buy(trip, replay=False).loc[buy.index[0], "unit_price_gross"] == 10_000.0
+
+    # Keyingi snapshot yig'indini ikki marta qo'shmaydi
+    store.save_trip(trip, plan, edited, RATE)
+    assert month_gross(store) == 65_000.0
+    assert store.load_ops(trip) == []
+
+
+def test_trip_contribution_matches_saved_rows(store):
+    plan, buy = trip_frames(5)
+    buy.loc[buy.index[1], "category"] = np.nan
+    trip = store.create_trip("Oylik", RATE)
+    store.save_trip(trip, plan, buy, RATE)
+    with store._lock:
+        from_sql = store._trip_contribution(store.conn.cursor(), trip)
+    assert storage.trip_contribution(buy) == pytest.approx(from_sql)
+    assert set(from_sql) == set(storage.trip_contribution(buy))
+
+
+# --- Sxema migratsiyalari: v0 (dastlabki) fayldan joriy versiyaga ---
+V0_SCHEMA = """
+CREATE TABLE trips (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL, qqs_rate REAL NOT NULL, plan_hash TEXT NOT NULL DEFAULT '',
+                    buy_hash TEXT NOT NULL DEFAULT '');
+CREATE TABLE plan_lines (trip_id INTEGER NOT NULL REFERENCES trips(id) ON DELETE CASCADE, pos INTEGER NOT NULL,
+                         item TEXT, category TEXT, unit TEXT, plan_qty REAL,
+                         PRIMARY KEY (trip_id, pos)) WITHOUT ROWID;
+CREATE TABLE purchase_lines (trip_id INTEGER NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+                             pos INTEGER NOT NULL, item TEXT, category TEXT, unit TEXT, plan_qty REAL,
+                             bought INTEGER, actual_qty REAL, unit_price_gross REAL, line_gross REAL,
+                             line_net REAL, line_vat REAL, PRIMARY KEY (trip_id, pos)) WITHOUT ROWID;
+CREATE TABLE price_history (item TEXT NOT NULL, unit TEXT NOT NULL, date TEXT NOT NULL,
+                            unit_price_gross REAL NOT NULL, trip_id INTEGER,
+                            PRIMARY KEY (item, unit, date)) WITHOUT ROWID;
+CREATE INDEX idx_price_date ON price_history(date);
+"""
+
+
+def test_migrate_v0_database(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "eski.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(V0_SCHEMA)
+    conn.execute("INSERT INTO trips VALUES (1, 'Eski', '2026-02-10T09:00:00', '2026-02-10T09:00:00', 12, '', '')")
+    conn.executemany(
+        "INSERT INTO purchase_lines VALUES (1, ?, ?, ?, 'kg', ?, ?, ?, ?, ?, ?, ?)",
+        [(0, "Pomidor", "Sabzavotlar", 2.0, 1, 1.5, 10000.0, 15000.0, 13392.86, 1607.14),
+         (1, "Olma", "Mevalar", 1.0, 0, None, None, 0.0, 0.0, 0.0)],
+    )
+    conn.executemany(
+        "INSERT INTO price_history VALUES (?, 'kg', ?, ?, 1)",
+        [("помидор", "2026-02-01", 9000.0), ("pomidor", "2026-02-10", 10000.0)],
+    )
+    conn.commit()
+    conn.close()
+
+    store = storage.TripStore(path)
+    try:
+        assert store.conn.execute("PRAGMA user_version").fetchone()[0] == storage.SCHEMA_VERSION
+        # v1: do'kon ustuni va narx indeksi; v3: kirill/lotin kalitlari birlashgan
+        hist = store.price_history("Помидор", "kg")
+        assert hist["unit_price_gross"].tolist() == [9000.0, 10000.0]
+        stat = store.price_lookup([("POMIDOR", "kg")])[("pomidor", "kg")]
+        assert stat["n"] == 2 and stat["last_price"] == 10000.0
+        # v2: rollup saqlangan safardan qurilgan
+        month = store.rollup("month")
+        assert month["period"].tolist() == ["2026-02", "2026-02"]
+        pom = month.set_index("category").loc["Sabzavotlar"]
+        assert (pom["trips"], pom["gross"], pom["plan_hit"]) == (1, 15000.0, 1)
+        assert month.set_index("category").loc["Mevalar", "hit_rate"] == 0.0
+        # v4: qator ID = pozitsiya
+        assert list(store.load_buy(1).index) == [0, 1]
+    finally:
+        store.close()
+
+    again = storage.TripStore(path)  # qayta ochish — migratsiya takrorlanmaydi
+    try:
+        assert again.rollup("month")["gross"].sum() == 15000.0
+    finally:
+        again.close()
+
+
+def test_save_and_load_trip_round_trip(store):
+    plan, buy = trip_frames()
+    buy = buy.set_axis(buy.index + 100)  # qator ID lari saqlanadi
+    trip = store.create_trip("Haftalik", RATE)
+    assert store.save_trip(trip, plan, buy, RATE)
+    assert not store.save_trip(trip, plan, buy, RATE)  # xesh o'zgarmagan — yozuv yo'q
+    loaded = core.apply_buy_schema(store.load_buy(trip))
+    assert list(loaded.index) == list(buy.index)
+    pd.testing.assert_frame_equal(loaded[core.BUY_COLS], buy[core.BUY_COLS], check_dtype=False,
+                                  check_categorical=False)
+    assert list(store.load_plan(trip)["item"]) == list(plan["item"])
+    assert [t["id"] for t in store.list_trips()] == [trip]
+
+
+# --- Davriy yig'indilar: hafta/oy/yil, o'chirish, reja aniqligi ---
+def dated_trip(store, date: str) -> int:
+    trip = store.create_trip(f"Safar {date}", RATE)
+    with store._lock:
+        store.conn.execute("UPDATE trips SET created_at = ? WHERE id = ?", (f"{date}T10:00:00", trip))
+    return trip
+
+
+def test_rollup_sums_per_grain_and_delete_subtracts(store):
+    plan, buy_a = trip_frames(3)
+    buy_a["actual_qty"] = core.replace_at(buy_a["actual_qty"], [0], [3.0])  # reja 1, fakt 3
+    buy_a = core.recompute_buy_df(buy_a, RATE)
+    _, buy_b = trip_frames(5)
+    _, buy_c = trip_frames(2)
+    buy_c.loc[buy_c.index[7], "category"] = np.nan  # olinmagan reja qatori -> "Boshqa"
+    trips = {}
+    for date, buy in [("2026-01-05", buy_a), ("2026-01-28", buy_b), ("2026-02-03", buy_c)]:
+        trips[date] = dated_trip(store, date)
+        store.save_trip(trips[date], plan, buy, RATE)
+
+    week = store.rollup("week").groupby("period")["gross"].sum()
+    assert week.to_dict() == {"2026-W02": 80_000.0, "2026-W05": 150_000.0, "2026-W06": 30_000.0}
+    year = store.rollup("year")
+    assert year["period"].unique().tolist() == ["2026"]
+    assert year["gross"].sum() == 260_000.0
+    assert year.set_index("category").loc["Meva-sabzavot", "trips"] == 3
+
+    month = store.rollup("month").set_index(["period", "category"])
+    jan = month.loc[("2026-01", "Meva-sabzavot")]
+    assert (jan["trips"], jan["gross"], jan["plan_lines"], jan["plan_hit"]) == (2, 230_000.0, 16, 8)
+    # |3 - 1| + 5 ta olinmagan (A) + 3 ta olinmagan (B) = 10
+    assert jan["accuracy"] == pytest.approx(1 - 10 / 16)
+    assert jan["hit_rate"] == 0.5
+    other = month.loc[("2026-02", "Boshqa")]
+    assert (other["trips"], other["gross"], other["hit_rate"]) == (1, 0.0, 0.0)
+    assert store.rollup("month", since="2026-02")["period"].unique().tolist() == ["2026-02"]
+    assert store.rollup("month", until="2026-01")["period"].unique().tolist() == ["2026-01"]
+
+    assert store.period_trips("month") == {
+        "2026-01": [(trips["2026-01-05"], RATE), (trips["2026-01-28"], RATE)],
+        "2026-02": [(trips["2026-02-03"], RATE)],
+    }
+    assert list(store.period_trips("week", since="2026-W05", until="2026-W05")) == ["2026-W05"]
+
+    store.delete_trip(trips["2026-01-28"])
+    assert "2026-W05" not in set(store.rollup("week")["period"])  # trips <= 0 qatorlar o'chiriladi
+    jan = store.rollup("month", until="2026-01").iloc[0]
+    assert (jan["trips"], jan["gross"], jan["plan_abs_diff"]) == (1, 80_000.0, 7.0)
+    store.delete_trip(trips["2026-01-05"])
+    store.delete_trip(trips["2026-02-03"])
+    assert store.rollup("year").empty
+    assert store.period_trips("year") == {}
+
+
+def test_rollup_rejects_unknown_grain(store):
+    with pytest.raises(ValueError):
+        store.rollup("day")
+    with pytest.raises(ValueError):
+        store.period_trips("day")
+
+
+# --- Narx indeksi: oxirgi narx, mediana, EWMA, do'kon qatori ---
+def prices(*rows):
+    return pd.DataFrame(rows, columns=["item", "unit", "bought", "unit_price_gross"])
+
+
+def test_next_stat_same_day_replaces_and_old_dates_ignored():
+    s = storage._next_stat(None, "2026-03-01", 100.0)
+    s = storage._next_stat(s, "2026-03-02", 200.0)
+    assert s["n"] == 2 and s["ewma"] == pytest.approx(0.3 * 200 + 0.7 * 100)
+    same = storage._next_stat(s, "2026-03-02", 150.0)
+    assert same["n"] == 2 and same["recent"] == [100.0, 150.0]
+    assert same["ewma"] == pytest.approx(0.3 * 150 + 0.7 * 100)
+    assert storage._next_stat(s, "2026-02-01", 999.0) is None
+
+
+def test_price_index_per_store_with_overall_fallback(store):
+    store.record_prices(prices(("Pomidor", "kg", True, 10000.0), ("Olma", "kg", False, 5000.0)), store="Chorsu")
+    store.record_prices(prices(("pomidor", "kg", True, 14000.0)), store="Korzinka")
+    refs = store.price_lookup([("Помидор", "kg"), ("Olma", "kg")], store="Chorsu")
+    assert refs == {("pomidor", "kg"): pytest.approx({"last_price": 10000.0, "median": 10000.0, "ewma": 10000.0,
+                                                      "n": 1, "last_date": storage._now()[:10]})}
+    overall = store.price_lookup([("pomidor", "kg")], store="Yangi do'kon")[("pomidor", "kg")]
+    assert overall["last_price"] == overall["median"] == 14000.0  # shu kun — oxirgi kuzatuv almashadi
+    assert overall["n"] == 1
+
+
+def test_price_window_median():
+    stat = None
+    for day, price in enumerate([100.0] * storage.PRICE_WINDOW + [500.0, 500.0], start=1):
+        stat = storage._next_stat(stat, f"2026-01-{day:02d}", price)
+    assert stat["n"] == storage.PRICE_WINDOW + 2 and len(stat["recent"]) == storage.PRICE_WINDOW
+    assert stat["recent"][-2:] == [500.0, 500.0]
+
+
+def test_price_deviation_flags_outliers():
+    dev, flag = core.price_deviation([150.0, 160.0, 60.0, 0.0, 100.0], [100.0, 100.0, 100.0, 100.0, np.nan])
+    assert flag.tolist() == [False, True, True, False, False]
+    assert dev[0] == pytest.approx(0.5) and np.isnan(dev[3]) and np.isnan(dev[4])
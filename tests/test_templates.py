@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from bozorlik import core, storage, templates
+
+
+@pytest.fixture
+def tpl():
+    return templates.freeze(core.example_plan_df().head(12))
+
+
+def qty(df) -> np.ndarray:
+    return df["plan_qty"].to_numpy()
+
+
+# --- freeze / attach: umumiy shablon o'zgarmaydi ---
+def test_freeze_is_independent_of_source():
+    src = core.example_plan_df().head(5).set_axis([10, 11, 12, 13, 14])
+    frozen = templates.freeze(src)
+    assert isinstance(frozen.index, pd.RangeIndex)
+    src.loc[10, "plan_qty"] = 99.0
+    assert frozen.loc[0, "plan_qty"] == 1.0
+
+
+def test_attach_shares_until_first_edit(tpl):
+    plan = templates.attach(tpl)
+    assert np.shares_memory(qty(plan), qty(tpl))
+    plan.loc[0, "plan_qty"] = 7.0
+    assert tpl.loc[0, "plan_qty"] == 1.0
+
+
+# --- Miqdorlarni yaxlitlash va miqyoslash ---
+@pytest.mark.parametrize("q, unit, expected", [
+    (1.23456, "kg", 1.235),
+    (0.5, "litr", 0.5),
+    (0.2, "dona", 1.0),
+    (2.3, "dona", 3.0),
+    (2.0000000001, "dona", 2.0),
+    (0.0, "dona", 0.0),
+    (np.nan, "dona", 0.0),
+])
+def test_round_qty(q, unit, expected):
+    assert templates._round_qty([q], pd.Series([unit]))[0] == pytest.approx(expected)
+
+
+def test_scale_plan(tpl):
+    assert np.shares_memory(qty(templates.scale_plan(tpl, 1)), qty(tpl))
+    half = templates.scale_plan(tpl, 0.5)
+    assert half.loc[0, "plan_qty"] == 0.5          # kg
+    assert half.loc[3, "plan_qty"] == 1.0          # dona — kamida 1
+    assert half["item"].tolist() == tpl["item"].tolist()
+    assert (qty(tpl) == 1.0).all()
+
+
+def test_apply_history_overrides_known_items(tpl):
+    typical = pd.Series([2.5, 4.0], index=pd.MultiIndex.from_tuples([("pomidor", "kg"), ("karam", "dona")]))
+    plan = templates.apply_history(tpl, typical, factor=2.0)
+    by_item = plan.set_index("item")["plan_qty"]
+    assert by_item["Pomidor"] == 5.0
+    assert by_item["Karam"] == 8.0
+    assert by_item["Piyoz"] == 2.0                 # tarixda yo'q — shablon miqdori
+    empty = templates.apply_history(tpl, pd.Series(dtype="float64"))
+    np.testing.assert_array_equal(qty(empty), qty(tpl))
+
+
+def test_generate_plans_shares_one_table_per_size(tpl):
+    households = [{"name": "a", "size": 2}, {"name": "b", "size": 4}, {"name": "c", "size": 2}, {"name": "d"}]
+    plans = dict(templates.generate_plans(tpl, households, base_size=2.0))
+    assert list(plans) == ["a", "b", "c", "d"]
+    assert np.shares_memory(qty(plans["a"]), qty(plans["c"]))
+    assert plans["b"].loc[0, "plan_qty"] == 2.0
+    assert plans["d"].loc[0, "plan_qty"] == 1.0    # hajm berilmagan — base_size
+
+
+# --- TripStore: shablon versiyalari va iste'mol tarixi ---
+def test_template_versions_are_immutable(tmp_path, tpl):
+    store = storage.TripStore(str(tmp_path / "bozorlik.db"))
+    try:
+        assert store.save_template("Haftalik", tpl, household=2.0) == 1
+        assert store.save_template("Haftalik", templates.scale_plan(tpl, 2.0), household=4.0) == 2
+        assert store.save_template("Bayram", tpl.head(3)) == 1
+        latest = {t["name"]: t for t in store.list_templates()}
+        assert (latest["Haftalik"]["version"], latest["Haftalik"]["household"]) == (2, 4.0)
+        assert latest["Bayram"]["lines"] == 3
+        assert store.load_template("Haftalik", 1)["plan_qty"].tolist() == qty(tpl).tolist()
+        assert store.load_template("Haftalik", 2).loc[0, "plan_qty"] == 2.0
+        assert store.load_template("Haftalik", 3).empty
+    finally:
+        store.close()
+
+
+def test_typical_quantities_feed_apply_history(tmp_path, tpl):
+    store = storage.TripStore(str(tmp_path / "bozorlik.db"))
+    try:
+        for n in (1.0, 3.0, 2.0):
+            buy = core.apply_buy_schema(core.buy_frame_from_plan(tpl))
+            buy["bought"] = core.replace_at(buy["bought"], [8], [True])
+            buy["actual_qty"] = core.replace_at(buy["actual_qty"], [8], [n])
+            trip = store.create_trip("Haftalik", core.DEFAULT_QQS)
+            store.save_trip(trip, tpl, core.recompute_buy_df(buy, core.DEFAULT_QQS), core.DEFAULT_QQS)
+        typical = store.typical_quantities()
+        assert typical.to_dict() == {("pomidor", "kg"): 2.0}
+        assert templates.apply_history(tpl, typical).set_index("item").loc["Pomidor", "plan_qty"] == 2.0
+    finally:
+        store.close()